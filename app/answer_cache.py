@@ -0,0 +1,263 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from sklearn.feature_extraction.text import HashingVectorizer
+from .knowledge_service import KnowledgeService
+from .ingredient_index import split_ingredients
+from .models import ChatLog, Product
+
+# 缓存的问答条数上限（按最近使用淘汰）/ Max cached answers before LRU eviction
+MAX_ENTRIES = getattr(settings, 'ANSWER_CACHE_MAX_ENTRIES', 2000)
+# 相似问题命中阈值（余弦相似度），默认 0 仅精确匹配 / Cosine threshold for similar questions, 0 (default) is exact-match only
+SIMILARITY = getattr(settings, 'ANSWER_CACHE_SIMILARITY', 0)
+# 从 ChatLog 同步人工纠偏结果的间隔（秒）/ How often corrections are re-read from ChatLog (seconds)
+SYNC_INTERVAL = getattr(settings, 'ANSWER_CACHE_SYNC_INTERVAL', 30)
+
+# Stateless character n-gram vectors (no vocabulary to fit) / 无需训练词表的字符 n-gram 向量
+_vectorizer = HashingVectorizer(analyzer='char', ngram_range=(1, 3), n_features=2 ** 18,
+                                alternate_sign=False, norm='l2')
+
+# 问题中提到的肤质关键词 / Skin-type words of a question
+SKIN_TERMS = {
+    'oil': ('油性', '油皮', '出油', '油痘'),
+    'dry': ('干性', '干皮', '干燥'),
+    'sensitive': ('敏感', '敏感肌'),
+    'combination': ('混合', '混油', '混干'),
+    'normal': ('中性',),
+}
+
+_lock = threading.RLock()
+_answers = OrderedDict()   # key -> (answer, total_tokens)
+_corrections = {}          # key -> (corrected answer, total_tokens of the original call)
+_vectors = {}              # key -> 1 x n sparse row
+_terms = {}                # key -> (skin types, ingredients) mentioned in it
+_vocabulary = []           # (normalised term, canonical ingredient), longest first
+_matrix = {'answers': None, 'corrections': None}
+_state = {'loaded': False, 'synced_at': 0.0, 'syncing': False}
+_stats = {'lookups': 0, 'hits_corrected': 0, 'hits_exact': 0, 'hits_similar': 0, 'misses': 0, 'tokens_saved': 0,
+          'writes': 0, 'evictions': 0}
+
+
+def normalize_question(text):
+    """
+    Cache key of a question: NFKC, lower-case, punctuation and whitespace removed.
+    问题的缓存键：NFKC 归一化、转小写并去除标点与空白。
+    """
+    return re.sub(r'[\W_]+', '', unicodedata.normalize('NFKC', text or '').lower())
+
+
+def _vector(key):
+    vec = _vectors.get(key)
+    if vec is None:
+        vec = _vectors[key] = _vectorizer.transform([key])
+    return vec
+
+
+def _stacked(name, store):
+    """Stacked vectors of one store, rebuilt only after it changed / 按需重建的向量矩阵"""
+    if _matrix[name] is None:
+        keys = list(store)
+        rows = sp.vstack([_vector(k) for k in keys]).tocsr() if keys else None
+        _matrix[name] = (keys, rows)
+    return _matrix[name]
+
+
+def question_terms(key):
+    """
+    Skin types and ingredients (knowledge-base names, aliases resolved) mentioned in a normalised question.
+    规范化问题中提到的肤质与成分（知识库名称，别名已归一）。
+    """
+    skins = frozenset(skin for skin, words in SKIN_TERMS.items() if any(w in key for w in words))
+    ingredients, rest = set(), key
+    # Longest terms first, so 变性酒精 is not also read as 酒精 / 先匹配长词，避免“变性酒精”同时计为“酒精”
+    for term, name in _vocabulary:
+        if term in rest:
+            ingredients.add(name)
+            rest = rest.replace(term, '\0')
+    return skins, frozenset(ingredients)
+
+
+def _question_terms(key):
+    terms = _terms.get(key)
+    if terms is None:
+        terms = _terms[key] = question_terms(key)
+    return terms
+
+
+def _similar(name, store, query_vec, terms):
+    """
+    Most similar cached question above SIMILARITY that mentions the same skin types and ingredients.
+    相似度不低于 SIMILARITY、且提到的肤质与成分完全相同的最相似缓存问题。
+    """
+    keys, rows = _stacked(name, store)
+    if rows is None:
+        return None
+    scores = (rows @ query_vec.T).toarray().ravel()
+    above = np.flatnonzero(scores >= SIMILARITY)
+    for i in above[np.argsort(-scores[above], kind='stable')]:
+        if _question_terms(keys[i]) == terms:
+            return keys[i]
+    return None
+
+
+def _load_vocabulary():
+    """Ingredient terms of the knowledge base and of the product catalog / 知识库与商品成分中的成分词"""
+    terms = {}
+    for entry in KnowledgeService().iter_entries():
+        for alias in [entry['name'], *entry.get('aliases', [])]:
+            terms.setdefault(normalize_question(alias), entry['name'])
+    for text in Product.objects.values_list('ingredients', flat=True).iterator(chunk_size=5000):
+        for name in split_ingredients(text):
+            terms.setdefault(normalize_question(name), name)
+    # Single characters match too much free text / 单字会误匹配大量普通文本
+    return sorted(((t, n) for t, n in terms.items() if len(t) > 1), key=lambda item: -len(item[0]))
+
+
+def _load():
+    """
+    Warm the cache from recent LLM-answered ChatLog rows and refresh the corrections.
+    从最近由大模型回答的 ChatLog 预热缓存，并刷新人工纠偏结果。
+
+    Chat prompts carry no conversation history, so each logged answer depends only on its question
+    and can be served to any user.
+    对话 Prompt 不带入历史对话，每条日志中的回答只取决于其问题本身，可以提供给任何用户。
+
+    The queries run without the lock; only the swap of the results holds it, so lookups never wait on the database.
+    查询在锁外执行，仅替换结果时持锁，查找不会等待数据库。
+    """
+    recent = None
+    if not _state['loaded']:
+        recent = list(ChatLog.objects.filter(total_tokens__gt=0, is_corrected=False).order_by('-created_at')
+                      .values_list('user_input', 'ai_response', 'total_tokens')[:MAX_ENTRIES])
+    corrections = {}
+    for question, answer, tokens in (ChatLog.objects.filter(is_corrected=True).exclude(corrected_response='')
+                                     .order_by('created_at')
+                                     .values_list('user_input', 'corrected_response', 'total_tokens')):
+        if answer:
+            corrections[normalize_question(question)] = (answer, tokens)
+    vocabulary = _load_vocabulary() if SIMILARITY else []
+
+    with _lock:
+        if recent is not None:
+            for question, answer, tokens in reversed(recent):
+                key = normalize_question(question)
+                # Answers stored while the query ran are newer / 查询期间写入的回答更新，保留
+                if key not in _answers:
+                    _put(key, answer, tokens)
+            _state['loaded'] = True
+        if corrections.keys() != _corrections.keys():
+            _matrix['corrections'] = None
+        _corrections.clear()
+        _corrections.update(corrections)
+        if vocabulary != _vocabulary:
+            _vocabulary[:] = vocabulary
+            _terms.clear()
+        _state['synced_at'] = time.monotonic()
+
+
+def _maybe_sync():
+    """Run a due sync; one thread at a time, the others keep serving / 到期时同步，仅一个线程执行，其余照常查找"""
+    with _lock:
+        if _state['syncing'] or (_state['loaded'] and time.monotonic() - _state['synced_at'] < SYNC_INTERVAL):
+            return
+        _state['syncing'] = True
+    try:
+        _load()
+    finally:
+        _state['syncing'] = False
+
+
+def _put(key, answer, tokens):
+    if key in _answers:
+        _answers.move_to_end(key)
+    else:
+        _matrix['answers'] = None
+    _answers[key] = (answer, tokens)
+    while len(_answers) > MAX_ENTRIES:
+        evicted, _ = _answers.popitem(last=False)
+        if evicted not in _corrections:
+            _vectors.pop(evicted, None)
+            _terms.pop(evicted, None)
+        _stats['evictions'] += 1
+
+
+def lookup(question):
+    """
+    Find a cached answer: exact correction, exact answer, then similar correction / answer.
+    查找缓存答案：优先精确匹配的人工纠偏，其次精确匹配的模型回答，最后是相似问题。
+
+    A similar question only matches when it mentions the same skin types and ingredients.
+    相似问题须提到相同的肤质与成分才会命中。
+
+    Returns:
+        (answer, match) with match in {'corrected', 'exact', 'similar'}, or (None, None) on a miss.
+    """
+    key = normalize_question(question)
+    if not key:
+        return None, None
+    _maybe_sync()
+    with _lock:
+        _stats['lookups'] += 1
+        hit, match = None, None
+        if key in _corrections:
+            hit, match = _corrections[key], 'corrected'
+        elif key in _answers:
+            _answers.move_to_end(key)
+            hit, match = _answers[key], 'exact'
+        elif SIMILARITY:
+            query_vec = _vectorizer.transform([key])
+            terms = question_terms(key)
+            for name, store in (('corrections', _corrections), ('answers', _answers)):
+                similar_key = _similar(name, store, query_vec, terms)
+                if similar_key is not None:
+                    hit, match = store[similar_key], 'corrected' if name == 'corrections' else 'similar'
+                    break
+
+        if hit is None:
+            _stats['misses'] += 1
+            return None, None
+        _stats['hits_' + match] += 1
+        _stats['tokens_saved'] += hit[1]
+        return hit[0], match
+
+
+def store(question, answer, total_tokens):
+    """Cache an LLM answer / 缓存一条大模型回答"""
+    key = normalize_question(question)
+    if not key or not answer:
+        return
+    with _lock:
+        _put(key, answer, total_tokens)
+        _stats['writes'] += 1
+
+
+def record_correction(log):
+    """
+    Apply an admin correction immediately in this process (others pick it up on their next sync).
+    在当前进程立即生效人工纠偏结果（其他进程在下次同步时生效）。
+    """
+    key = normalize_question(log.user_input)
+    if not key or not log.corrected_response:
+        return
+    with _lock:
+        if key not in _corrections:
+            _matrix['corrections'] = None
+        _corrections[key] = (log.corrected_response, log.total_tokens)
+
+
+def stats():
+    """
+    Hit rates by match type and the LLM tokens saved in this process.
+    当前进程按匹配类型统计的命中率，以及节省的大模型 Token 数。
+    """
+    with _lock:
+        snapshot = dict(_stats, entries=len(_answers), corrections=len(_corrections),
+                        max_entries=MAX_ENTRIES, similarity_threshold=SIMILARITY)
+    hits = snapshot['hits_corrected'] + snapshot['hits_exact'] + snapshot['hits_similar']
+    snapshot['hit_ratio'] = round(hits / snapshot['lookups'], 4) if snapshot['lookups'] else 0.0
+    return snapshot
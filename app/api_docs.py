@@ -25,8 +25,50 @@ def generate_api_docs():
                     "parameters": [{"name": "message", "in": "body", "required": True}]
                 }
             },
+            "/api/chat/stream/": {
+                "post": {
+                    "summary": "AI 美妆顾问流式对话，SSE 逐 Token 返回 (Streaming Chat via Server-Sent Events)",
+                    "produces": ["text/event-stream"],
+                    "parameters": [{"name": "message", "in": "body", "required": True}]
+                }
+            },
+            "/api/async/recommend/": {
+                "get": {
+                    "summary": "获取个性化推荐，异步版本，需 ASGI 部署 (Async Recommendations, ASGI)",
+                    "parameters": [{"name": "user_id", "in": "query", "required": True}]
+                }
+            },
+            "/api/async/chat/": {
+                "post": {
+                    "summary": "AI 美妆顾问对话，异步版本，需 ASGI 部署 (Async Chat, ASGI)",
+                    "parameters": [{"name": "message", "in": "body", "required": True}]
+                }
+            },
+            "/api/async/chat/stream/": {
+                "post": {
+                    "summary": "AI 美妆顾问流式对话，异步版本，需 ASGI 部署 (Async Streaming Chat, ASGI)",
+                    "produces": ["text/event-stream"],
+                    "parameters": [{"name": "message", "in": "body", "required": True}]
+                }
+            },
+            "/api/product/{id}/similar/": {
+                "get": {
+                    "summary": "相似商品，按成分/功效/品类/价格带向量近邻检索 (Similar Products via ANN Index)",
+                    "parameters": [{"name": "id", "in": "path", "required": True},
+                                   {"name": "top_k", "in": "query", "required": False}]
+                }
+            },
+            "/api/events/": {
+                "post": {
+                    "summary": "批量上报浏览/点击/收藏/评分/购买事件，异步批量落库 (Batched Interaction Events)",
+                    "parameters": [{"name": "events", "in": "body", "required": True}]
+                }
+            },
             "/api/admin/stats/": {
-                "get": { "summary": "全平台运营数据大屏 (System Analytics Dashboard)" }
+                "get": {
+                    "summary": "全平台运营数据大屏，读取按小时/天预聚合的汇总 (System Analytics Dashboard)",
+                    "parameters": [{"name": "period", "in": "query", "required": False}]
+                }
             }
         }
     }
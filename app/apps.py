@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class BeautyAppConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'app'
+    verbose_name = "美妆推荐"
+
+    def ready(self):
+        # 注册模型信号（缓存失效、看板汇总等）
+        from . import signals  # noqa: F401
@@ -0,0 +1,174 @@
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from .models import UserProfile
+from . import answer_cache, chat_log_writer, llm_gateway, prompt_builder
+from .views import CHAT_PROMPT_LOGIC, OFFLINE_REPLY, ChatStreamAPIView, chat_user_id, get_recommendations
+
+# Async (ASGI) versions of the chat and recommendation endpoints.
+# DRF's APIView cannot be async, so these are plain Django views returning the same JSON.
+# 对话与推荐接口的异步（ASGI）版本。DRF 的 APIView 不支持异步，因此使用原生 Django 视图，返回相同的 JSON 结构。
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _read_body(request):
+    """The JSON object of the request body; None if it is not valid JSON or not an object / 请求体中的 JSON 对象"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class AsyncRecommendView(View):
+    """
+    Bilingual: Async variant of RecommendAPIView; the recall engine runs in a worker thread.
+    双语注释：RecommendAPIView 的异步版本，召回引擎在线程中执行，不阻塞事件循环。
+    """
+    async def get(self, request):
+        user_id = request.GET.get('user_id')
+        if not user_id:
+            return _json({"error": "请提供 user_id 参数"}, status=400)
+
+        user = await UserProfile.objects.filter(id=user_id).afirst()
+        if user is None:
+            return _json({"error": "用户不存在"}, status=404)
+
+        recommend_list, source = await sync_to_async(get_recommendations)(user, top_k=5)
+        return _json({
+            "user": {
+                "id": user.id, "username": user.username, "skin_type": user.skin_type
+            },
+            "recommendations": recommend_list,
+            "source": source
+        })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatView(View):
+    """
+    Bilingual: Async variant of ChatAPIView; awaiting the LLM frees the worker for other requests.
+    双语注释：ChatAPIView 的异步版本，等待大模型期间 worker 可继续处理其他请求。
+    """
+    async def post(self, request):
+        data = _read_body(request)
+        if data is None:
+            return _json({"error": "请求体必须是 JSON 对象"}, status=400)
+        user_message = data.get('message')
+        if not user_message:
+            return _json({"error": "内容不能为空"}, status=400)
+        user_id, error = await sync_to_async(chat_user_id)(data)
+        if error:
+            return _json({"error": error[0]}, status=error[1])
+
+        start_time = time.time()
+        # Serve repeated / corrected questions from the answer cache / 重复问题与人工纠偏优先走问答缓存
+        ai_reply, match = await sync_to_async(answer_cache.lookup)(user_message)
+        usage, prompt = None, None
+        if ai_reply is None:
+            try:
+                prompt = await sync_to_async(prompt_builder.build_chat_prompt)(user_message)
+                response = await llm_gateway.async_chat_completion(
+                    prompt['messages'], max_tokens=prompt_builder.CHAT_MAX_TOKENS)
+                ai_reply = response.choices[0].message.content.strip()
+                usage = response.usage
+                prompt_builder.record_usage('chat', prompt['estimated_tokens'], usage)
+                answer_cache.store(user_message, ai_reply, usage.total_tokens)
+            except Exception as e:
+                # Fallback for Offline Mode (API failure or open breaker) / 离线模式回退机制（调用失败或已熔断）
+                ai_reply, usage = OFFLINE_REPLY, None
+        latency = int((time.time() - start_time) * 1000)
+
+        await chat_log_writer.alog_chat(
+            user_id=user_id,
+            user_input=user_message,
+            ai_response=ai_reply,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            total_tokens=usage.total_tokens if usage else 0,
+            estimated_prompt_tokens=prompt['estimated_tokens'] if prompt else 0,
+            latency_ms=latency
+        )
+        return _json({"reply": ai_reply, "prompt_used": CHAT_PROMPT_LOGIC, "cached": match})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatStreamView(View):
+    """
+    Bilingual: Async variant of ChatStreamAPIView emitting the same SSE events.
+    双语注释：ChatStreamAPIView 的异步版本，输出相同的 SSE 事件。
+    """
+    async def post(self, request):
+        data = _read_body(request)
+        if data is None:
+            return _json({"error": "请求体必须是 JSON 对象"}, status=400)
+        user_message = data.get('message')
+        if not user_message:
+            return _json({"error": "内容不能为空"}, status=400)
+        user_id, error = await sync_to_async(chat_user_id)(data)
+        if error:
+            return _json({"error": error[0]}, status=error[1])
+
+        response = StreamingHttpResponse(self._stream(user_id, user_message), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # 关闭 Nginx 缓冲，保证逐 Token 下发
+        return response
+
+    async def _stream(self, user_id, user_message):
+        event = ChatStreamAPIView._event
+        yield event({"prompt_used": CHAT_PROMPT_LOGIC}, event='meta')
+
+        start_time = time.time()
+        first_token_ms = 0
+        chunks, usage, prompt = [], None, None
+        # Serve repeated / corrected questions from the answer cache / 重复问题与人工纠偏优先走问答缓存
+        ai_reply, match = await sync_to_async(answer_cache.lookup)(user_message)
+        if ai_reply is not None:
+            first_token_ms = int((time.time() - start_time) * 1000)
+            yield event({"delta": ai_reply})
+        else:
+            try:
+                prompt = await sync_to_async(prompt_builder.build_chat_prompt)(user_message)
+                async for chunk in llm_gateway.async_stream_chat_completion(
+                        prompt['messages'], max_tokens=prompt_builder.CHAT_MAX_TOKENS,
+                        stream_options={"include_usage": True}):
+                    if chunk.usage:
+                        usage = chunk.usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not first_token_ms:
+                        first_token_ms = int((time.time() - start_time) * 1000)
+                    chunks.append(delta)
+                    yield event({"delta": delta})
+                ai_reply = "".join(chunks).strip()
+                prompt_builder.record_usage('chat', prompt['estimated_tokens'], usage)
+                answer_cache.store(user_message, ai_reply, usage.total_tokens if usage else 0)
+            except Exception as e:
+                # Fallback for Offline Mode (API failure or open breaker) / 离线模式回退机制（调用失败或已熔断）
+                ai_reply, usage = OFFLINE_REPLY, None
+                if not chunks:
+                    first_token_ms = int((time.time() - start_time) * 1000)
+                    yield event({"delta": ai_reply})
+
+        # Log once the stream has ended / 流结束后记录日志
+        latency = int((time.time() - start_time) * 1000)
+        await chat_log_writer.alog_chat(
+            user_id=user_id,
+            user_input=user_message,
+            ai_response=ai_reply,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            total_tokens=usage.total_tokens if usage else 0,
+            estimated_prompt_tokens=prompt['estimated_tokens'] if prompt else 0,
+            latency_ms=latency,
+            first_token_ms=first_token_ms
+        )
+        yield event({"latency_ms": latency, "first_token_ms": first_token_ms, "cached": match}, event='done')
@@ -0,0 +1,216 @@
+import gc
+import multiprocessing
+import os
+import time
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import connections
+from .models import Product, UserInteraction, UserProfile
+from .candidate_pools import get_pools
+from .cf_engine import cf_scores, similarity_matrix, topk_rows
+from .ingredient_index import ingredient_tokens, match_tokens, split_ingredients
+from .item_similarity import neighbor_arrays
+from .recommend_algo import (
+    BEHAVIOR_WEIGHT, CONTENT_WEIGHT, EMBEDDING_WEIGHT, RECALL_TOP_N, banned_terms_for, cached_ai_reason, ks, result_item
+)
+from . import product_embeddings
+from .recommend_store import save_recommendations
+
+# 默认进程数（默认为 CPU 核数）与每个任务包含的用户数 / Default worker processes and users per task
+BATCH_WORKERS = getattr(settings, 'RECOMMEND_BATCH_WORKERS', None) or os.cpu_count() or 1
+BATCH_CHUNK_SIZE = getattr(settings, 'RECOMMEND_BATCH_CHUNK_SIZE', 200)
+
+# Snapshot shared with forked workers (copy-on-write) / 通过 fork 以写时复制方式共享给子进程的快照
+_snapshot = None
+
+
+class Snapshot:
+    """
+    Read-only inputs of recommend_products for every user as sparse matrices over one product axis,
+    loaded with a few full-table queries.
+    以少量全表查询一次性加载、全部用户计算推荐所需的只读数据，均为同一商品轴上的稀疏矩阵。
+
+    Attributes:
+        product_ids: Sorted product ids; column j of every matrix is product_ids[j].
+        users: {user_id: (row in interactions, row in content, row in unsafe)}.
+        skin_types: {user_id: skin_type}.
+        interactions: CSR (users x P), 1 where the user interacted positively with the product.
+        similarity: CSR (P x P) Top-N item similarity index.
+        embedding: CSR (P x P) similar products from the embedding ANN index, for interacted products only.
+        content: CSR (skin types x P) content recall scores of each skin type's candidate pool.
+        unsafe: CSR (groups x P), 1 for products banned for a distinct (skin type, allergens) combination.
+    """
+    def __init__(self):
+        products = Product.objects.only('id', 'title', 'brand', 'price', 'ingredients')
+        # Kept in the parent only, to build the result rows / 仅父进程使用，用于组装结果
+        self.products = {p.id: p for p in products.iterator(chunk_size=2000)}
+        self.product_ids = np.array(sorted(self.products), dtype=np.int64)
+        product_index = {int(pid): idx for idx, pid in enumerate(self.product_ids)}
+        size = len(product_index)
+        tokens = [ingredient_tokens(self.products[int(pid)]) for pid in self.product_ids]
+        vocabulary = set().union(*tokens) if tokens else set()
+
+        pools = get_pools()
+        skins = {skin: idx for idx, (skin, _) in enumerate(UserProfile.SKIN_TYPE_CHOICES)}
+        self.content = self._matrix(
+            ((skins[skin], product_index[pid], score) for skin in skins
+             for pid, score in pools.get(skin, [])[:RECALL_TOP_N * 2] if pid in product_index),
+            (len(skins), size))
+
+        # Users with the same skin type and allergens share one banned row / 肤质与过敏源相同的用户共用一行禁用商品
+        self.users, self.skin_types, groups, unsafe = {}, {}, {}, []
+        for uid, skin_type, allergens in UserProfile.objects.values_list('id', 'skin_type', 'allergens').iterator():
+            key = (skin_type, tuple(split_ingredients(allergens)))
+            if key not in groups:
+                terms = banned_terms_for(UserProfile(skin_type=skin_type, allergens=allergens))
+                banned = match_tokens(terms, vocabulary) if terms else set()
+                groups[key] = len(groups)
+                unsafe.extend((groups[key], col, 1.0) for col, t in enumerate(tokens) if not t.isdisjoint(banned))
+            # Unknown skin types get an empty content row / 未知肤质对应空的内容召回行
+            self.users[uid] = (len(self.users), skins.get(skin_type, len(skins)), groups[key])
+            self.skin_types[uid] = skin_type
+        self.content.resize((len(skins) + 1, size))
+        self.unsafe = self._matrix(unsafe, (len(groups), size))
+
+        user_rows = {uid: row for uid, (row, _, _) in self.users.items()}
+        positive = UserInteraction.objects.filter(score__gt=0).values_list('user_id', 'product_id')
+        self.interactions = self._matrix(
+            ((user_rows[uid], product_index[pid], 1.0) for uid, pid in positive.iterator(chunk_size=10000)
+             if uid in user_rows and pid in product_index),
+            (len(user_rows), size))
+        # Duplicated (user, product) pairs of different interaction types count once / 不同类型的重复交互只计一次
+        self.interactions.data[:] = 1.0
+
+        self.similarity = similarity_matrix(*neighbor_arrays(top_n=RECALL_TOP_N), self.product_ids)
+
+        index = product_embeddings.get_index()
+        interacted = self.product_ids[np.unique(self.interactions.indices)].tolist()
+        self.embedding = (similarity_matrix(*index.neighbor_arrays(interacted, RECALL_TOP_N), self.product_ids)
+                          if index is not None else sparse.csr_matrix((size, size)))
+
+    @staticmethod
+    def _matrix(entries, shape):
+        entries = list(entries)
+        rows, cols, data = zip(*entries) if entries else ((), (), ())
+        matrix = sparse.csr_matrix((np.array(data, dtype=np.float64), (rows, cols)), shape=shape)
+        matrix.sum_duplicates()
+        return matrix
+
+    def score_users(self, user_ids, top_k):
+        """
+        The same ranking as recommend_products for a batch of users, without any query.
+        与 recommend_products 相同的排序逻辑，批量计算且不执行任何查询。
+
+        merged = w_b * (U_batch x S) + w_c * content[skin] + w_e * (U_batch x E), banned products
+        removed, then the top_k of every row with argpartition.
+        合并分 = 行为权重 x (U_batch x S) + 内容权重 x 肤质候选分 + 向量权重 x (U_batch x E)，
+        去除禁用商品后以 argpartition 取每行 top_k。
+
+        Returns:
+            {user_id: [(product_id, score), ...]}; unknown users get an empty list.
+        """
+        known = [uid for uid in user_ids if uid in self.users]
+        results = {uid: [] for uid in user_ids}
+        if not known:
+            return results
+        rows, skins, groups = (list(v) for v in zip(*(self.users[uid] for uid in known)))
+        user_items = self.interactions[rows]
+        merged = (BEHAVIOR_WEIGHT * cf_scores(user_items, self.similarity)
+                  + CONTENT_WEIGHT * self.content[skins]
+                  + EMBEDDING_WEIGHT * cf_scores(user_items, self.embedding)).tocsr()
+        merged = (merged - merged.multiply(self.unsafe[groups])).tocsr()
+        merged.eliminate_zeros()
+        for uid, (cols, vals) in zip(known, topk_rows(merged, top_k)):
+            results[uid] = [(int(pid), float(v)) for pid, v in zip(self.product_ids[cols], vals)]
+        return results
+
+
+def _score_chunk(args):
+    user_ids, top_k = args
+    return _snapshot.score_users(user_ids, top_k)
+
+
+class _Reasons:
+    """Reasons of ranked products, memoised for the whole run / 整个批次内复用的推荐理由"""
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self._ai = {}
+
+    def results(self, user_id, ranked):
+        skin_type = self.snapshot.skin_types.get(user_id)
+        results = []
+        for i, (pid, score) in enumerate(ranked):
+            product = self.snapshot.products[pid]
+            ai_reason = None
+            if i == 0:
+                if (pid, skin_type) not in self._ai:
+                    self._ai[(pid, skin_type)] = cached_ai_reason(product, skin_type)
+                ai_reason = self._ai[(pid, skin_type)]
+            reason = ai_reason or ks.get_professional_reason(split_ingredients(product.ingredients))
+            results.append(result_item(product, score, reason, ai_reason is not None))
+        return results
+
+
+def iter_results(user_ids, top_k=5, workers=None, chunk_size=None, snapshot=None):
+    """
+    Score users in chunks on a process pool and yield {user_id: [result dict, ...]} per chunk.
+    在进程池中按块为用户打分，每完成一块产出 {user_id: [结果, ...]}。
+
+    The snapshot is loaded once in the parent and inherited by the forked workers, so workers
+    run no queries and score a whole chunk with a few sparse matrix operations; result rows (reasons, AI reason cache lookups) are assembled in the parent.
+    Chunks are yielded in completion order. Without fork support (e.g. Windows) users are scored in-process.
+    快照只在父进程加载一次，由 fork 出的子进程继承，子进程不执行任何查询，每块仅需少量稀疏矩阵运算；结果行（理由、AI 理由缓存查询）
+    在父进程组装。各块按完成顺序产出；不支持 fork 的平台（如 Windows）在当前进程内计算。
+    """
+    global _snapshot
+    workers = workers or BATCH_WORKERS
+    chunk_size = chunk_size or BATCH_CHUNK_SIZE
+    _snapshot = snapshot or Snapshot()
+    reasons = _Reasons(_snapshot)
+    chunks = [(user_ids[i:i + chunk_size], top_k) for i in range(0, len(user_ids), chunk_size)]
+    workers = min(workers, len(chunks))
+
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        scored = map(_score_chunk, chunks)
+        pool = None
+    else:
+        # Children must not share the parent's DB connections / 子进程不能共用父进程的数据库连接
+        connections.close_all()
+        # Keep the GC from touching (and copying) the snapshot pages in every child / 避免子进程的 GC 触碰快照页面导致复制
+        gc.freeze()
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        scored = pool.imap_unordered(_score_chunk, chunks)
+    try:
+        for ranked in scored:
+            yield {uid: reasons.results(uid, items) for uid, items in ranked.items()}
+    finally:
+        if pool is not None:
+            pool.terminate()
+            gc.unfreeze()
+
+
+def precompute(user_ids, top_k=5, workers=None, chunk_size=None, progress=None):
+    """
+    Parallel batch precompute: score all users and bulk-write their RecommendationResult rows.
+    并行批量预计算：为全部用户打分，并批量写入 RecommendationResult。
+
+    Args:
+        progress: Optional callable(done_users, total_users, results_of_chunk) called after each chunk is written.
+
+    Returns:
+        dict with users, rows, workers and timings (load_s, seconds, users_per_s).
+    """
+    start = time.perf_counter()
+    snapshot = Snapshot()
+    load_s = time.perf_counter() - start
+    workers = workers or BATCH_WORKERS
+    done = rows = 0
+    for results in iter_results(user_ids, top_k, workers, chunk_size, snapshot=snapshot):
+        rows += save_recommendations(results)
+        done += len(results)
+        if progress:
+            progress(done, len(user_ids), results)
+    elapsed = time.perf_counter() - start
+    return {'users': len(user_ids), 'rows': rows, 'workers': workers, 'load_s': round(load_s, 2),
+            'seconds': round(elapsed, 2), 'users_per_s': round(len(user_ids) / elapsed, 1) if elapsed else 0.0}
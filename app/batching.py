@@ -0,0 +1,208 @@
+import atexit
+import queue
+import threading
+import time
+from django.db import close_old_connections
+
+
+class BufferFull(Exception):
+    """Raised when a BatchBuffer is full, so callers can shed load / 缓冲队列已满，调用方应限流"""
+
+
+class BatchBuffer:
+    """
+    Bounded in-memory queue drained by a background thread in batches.
+    有界内存队列，由后台线程按批次写出。
+
+    Items are handed to flush_fn(list_of_items) once max_batch items are queued or the oldest
+    queued item has waited max_delay seconds. Pending items are flushed when the process exits.
+    队列积累到 max_batch 条，或最早的一条已等待 max_delay 秒时，交给 flush_fn 批量写出；进程退出前会写出剩余数据。
+
+    A failed batch (e.g. a transient "database is locked") is retried with exponential backoff, then
+    written item by item; only items that still fail are dropped, and they are counted in stats()['dropped'].
+    写出失败的批次（如短暂的“database is locked”）按指数退避重试，仍失败时逐条写入；只有逐条写入仍失败的数据才会被丢弃，并计入 stats()['dropped']。
+
+    Args:
+        name: Name of the writer thread and of the metrics entry.
+        flush_fn: Callable receiving a non-empty list of items; runs in the writer thread.
+        max_batch: Most items handed to one flush_fn call.
+        max_delay: Longest time (seconds) an item waits before being flushed.
+        max_queue: Queue capacity; put() blocks up to its timeout and then raises BufferFull.
+        retries: Retries of a failed batch before falling back to item-by-item writes.
+        retry_delay: Wait (seconds) before the first retry, doubled for each further one.
+    """
+    def __init__(self, name, flush_fn, max_batch=500, max_delay=1.0, max_queue=10000, retries=3, retry_delay=0.2):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._put_lock = threading.Lock()
+        self._batch = []
+        self._thread = None
+        self._closed = False
+        self._stats = {'enqueued': 0, 'rejected': 0, 'flushed': 0, 'retries': 0, 'dropped': 0, 'flushes': 0,
+                       'flush_ms_total': 0.0, 'flush_ms_max': 0.0, 'last_flush_ms': 0.0, 'max_depth': 0}
+
+    def _ensure_started(self):
+        # The thread starts on first use, so management commands that never write start none
+        # 写线程在首次写入时启动，未写入数据的管理命令不会创建线程
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def put(self, item, timeout=0.0):
+        """
+        Queue one item, waiting up to timeout seconds for room.
+        写入一条数据，队列已满时最多等待 timeout 秒。
+
+        Raises:
+            BufferFull: the queue stayed full (backpressure).
+        """
+        if self._closed:
+            raise BufferFull(f"{self.name} buffer is closed")
+        self._ensure_started()
+        try:
+            with self._put_lock:
+                self._queue.put(item, timeout=timeout) if timeout else self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise BufferFull(f"{self.name} buffer is full ({self._queue.maxsize} items)")
+        with self._lock:
+            self._stats['enqueued'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+
+    def put_many(self, items):
+        """
+        Queue all items or none of them, without waiting.
+        全部写入或全部拒绝（不等待）。
+
+        Raises:
+            BufferFull: there is not enough room for every item (backpressure).
+        """
+        if self._closed:
+            raise BufferFull(f"{self.name} buffer is closed")
+        self._ensure_started()
+        with self._put_lock:
+            # Only producers take this lock and the writer only frees room, so the check holds
+            # 仅写入方持有此锁，而写线程只会腾出空间，因此检查结果在写入期间保持有效
+            if self._queue.maxsize - self._queue.qsize() < len(items):
+                with self._lock:
+                    self._stats['rejected'] += len(items)
+                raise BufferFull(f"{self.name} buffer is full ({self._queue.maxsize} items)")
+            for item in items:
+                self._queue.put_nowait(item)
+        with self._lock:
+            self._stats['enqueued'] += len(items)
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+
+    def _take_batch(self, limit):
+        """The batch being collected by the writer plus queued items, up to limit / 取出写线程正在收集的批次及队列中的数据"""
+        with self._lock:
+            items, self._batch = self._batch, []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, items, retries):
+        """Call flush_fn, retrying with exponential backoff; returns the last error, or None / 调用 flush_fn 并按指数退避重试"""
+        for attempt in range(retries + 1):
+            try:
+                self.flush_fn(items)
+                return None
+            except Exception as e:
+                error = e
+            if attempt < retries:
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(self.retry_delay * 2 ** attempt)
+        return error
+
+    def _flush_items(self, items):
+        start = time.perf_counter()
+        error = self._write(items, self.retries)
+        dropped = []
+        if error is not None:
+            # Write item by item so one bad item does not take the batch with it / 逐条写入，避免一条坏数据拖垮整批
+            dropped = items if len(items) == 1 else [item for item in items if self._write([item], 0) is not None]
+            if dropped:
+                print(f"{self.name} dropped {len(dropped)} of {len(items)} items after {self.retries} retries: {error}")
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats['flushed'] += len(items) - len(dropped)
+            self._stats['dropped'] += len(dropped)
+            self._stats['flushes'] += 1
+            self._stats['flush_ms_total'] += elapsed
+            self._stats['flush_ms_max'] = max(self._stats['flush_ms_max'], elapsed)
+            self._stats['last_flush_ms'] = elapsed
+
+    def _collect(self, item):
+        with self._lock:
+            self._batch.append(item)
+            return len(self._batch)
+
+    def _run(self):
+        while True:
+            try:
+                size = self._collect(self._queue.get(timeout=1.0))
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            # Collected items stay visible to flush(), so nothing is lost at shutdown
+            # 收集中的数据对 flush() 可见，进程退出时不会丢失
+            deadline = time.monotonic() + self.max_delay
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    size = self._collect(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self._flush_lock:
+                items = self._take_batch(0)
+                if items:
+                    # The writer thread has its own DB connection / 写线程使用独立的数据库连接
+                    close_old_connections()
+                    self._flush_items(items)
+                    close_old_connections()
+
+    def flush(self):
+        """
+        Synchronously write everything queued so far (e.g. before reading it back).
+        同步写出当前队列中的全部数据（如在读取前确保已落库）。
+        """
+        with self._flush_lock:
+            while True:
+                items = self._take_batch(self.max_batch)
+                if not items:
+                    return
+                self._flush_items(items)
+
+    def close(self):
+        """Stop accepting items and flush the rest / 停止接收新数据并写出剩余数据"""
+        self._closed = True
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        total = snapshot.pop('flush_ms_total')
+        snapshot['avg_flush_ms'] = round(total / snapshot['flushes'], 2) if snapshot['flushes'] else 0.0
+        snapshot['flush_ms_max'] = round(snapshot['flush_ms_max'], 2)
+        snapshot['last_flush_ms'] = round(snapshot['last_flush_ms'], 2)
+        snapshot.update({'depth': self._queue.qsize(), 'capacity': self._queue.maxsize,
+                         'max_batch': self.max_batch, 'max_delay': self.max_delay})
+        return snapshot
@@ -0,0 +1,121 @@
+import math
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from .models import Product, UserProfile
+
+# 每个肤质（及肤质 + 品类）候选池保留的商品数 / Products kept per skin type (and skin type + category) pool
+POOL_SIZE = getattr(settings, 'CANDIDATE_POOL_SIZE', 200)
+# 构建候选池时按评分、销量预取的商品数 / Products pre-fetched by rating and sales when building a pool
+POOL_PREFETCH = getattr(settings, 'CANDIDATE_POOL_PREFETCH', 1000)
+# 候选池缓存有效期（秒）；商品保存或删除时失效，多进程部署需共享缓存后端，否则其他进程最长在 TTL 后更新
+# Pool cache lifetime; product saves invalidate it, in other processes only with a shared cache backend (else after the TTL)
+POOL_TTL = getattr(settings, 'CANDIDATE_POOL_TTL', 600)
+# 各肤质重点需要的功效，命中的商品排序靠前 / Efficacy tags each skin type needs most
+SKIN_EFFICACY_NEEDS = getattr(settings, 'SKIN_EFFICACY_NEEDS', {
+    'oil': ['控油', '祛痘'],
+    'dry': ['保湿', '修护'],
+    'sensitive': ['舒缓', '修护'],
+    'combination': ['控油', '保湿'],
+    'normal': ['保湿'],
+})
+# Base score of an exact skin match vs a product for all skin types (same as the old fixed scores)
+# 肤质精确匹配与通用商品的基础分（与原固定分值一致）
+EXACT_MATCH, ALL_MATCH = 0.8, 0.5
+# Share of the quality bonus; rating, sales and efficacy weights within it / 质量加分的上限及其中评分、销量、功效的权重
+QUALITY_WEIGHT = 0.2
+RATING_WEIGHT, SALES_WEIGHT, EFFICACY_WEIGHT = 0.5, 0.3, 0.2
+
+CACHE_KEY = 'candidate_pools:v1'
+
+_lock = threading.Lock()
+_stats = {'lookups': 0, 'builds': 0, 'invalidations': 0}
+
+
+def _efficacy_match(efficacy, needs):
+    if not needs:
+        return 0.0
+    tags = {t.strip() for t in (efficacy or '').split(',')}
+    return len(tags.intersection(needs)) / len(needs)
+
+
+def build_pools():
+    """
+    Ranked candidate pools for every skin type and every (skin type, category) pair.
+    为每个肤质以及每个（肤质, 品类）组合构建排好序的候选池。
+
+    Products suitable for the skin type (or for all skin types) are pre-fetched best-rated first
+    through product_skin_rank_idx, then scored by skin match, rating, sales and efficacy match.
+    先通过 product_skin_rank_idx 按评分、销量预取适合该肤质（或全部肤质）的商品，再按肤质匹配、评分、销量与功效匹配打分。
+
+    Returns:
+        dict {skin_type or 'skin_type:category': [(product_id, score), ...]} sorted by score.
+    """
+    pools = {}
+    for skin, _ in UserProfile.SKIN_TYPE_CHOICES:
+        rows = list(Product.objects.filter(suitable_skin__in=[skin, 'all'])
+                    .order_by('-rating_avg', '-sales_count')
+                    .values_list('id', 'suitable_skin', 'category', 'efficacy', 'rating_avg', 'sales_count')
+                    [:POOL_PREFETCH])
+        max_sales = math.log1p(max((r[5] for r in rows), default=0)) or 1.0
+        needs = SKIN_EFFICACY_NEEDS.get(skin, [])
+        scored = []
+        for pid, suitable, category, efficacy, rating, sales in rows:
+            quality = (RATING_WEIGHT * min(rating / 5.0, 1.0)
+                       + SALES_WEIGHT * math.log1p(max(sales, 0)) / max_sales
+                       + EFFICACY_WEIGHT * _efficacy_match(efficacy, needs))
+            base = EXACT_MATCH if suitable == skin else ALL_MATCH
+            scored.append((round(base + QUALITY_WEIGHT * quality, 4), pid, category))
+        scored.sort(key=lambda s: (-s[0], s[1]))
+
+        pools[skin] = [(pid, score) for score, pid, _ in scored[:POOL_SIZE]]
+        for score, pid, category in scored:
+            pool = pools.setdefault(f"{skin}:{category}", [])
+            if len(pool) < POOL_SIZE:
+                pool.append((pid, score))
+    with _lock:
+        _stats['builds'] += 1
+    return pools
+
+
+def get_pools():
+    """
+    The cached pools, rebuilt on a miss (first use, expiry or invalidation).
+    返回缓存中的候选池，未命中（首次使用、过期或已失效）时重建。
+    """
+    pools = cache.get(CACHE_KEY)
+    if pools is None:
+        pools = build_pools()
+        cache.set(CACHE_KEY, pools, POOL_TTL)
+    return pools
+
+
+def get_candidates(skin_type, top_n, category=None):
+    """
+    The best top_n (product_id, score) pairs for a skin type, optionally within one category.
+    返回某肤质（可限定品类）得分最高的 top_n 个（商品ID, 分数）。
+    """
+    with _lock:
+        _stats['lookups'] += 1
+    key = f"{skin_type}:{category}" if category else skin_type
+    return get_pools().get(key, [])[:top_n]
+
+
+def invalidate():
+    """
+    Drop the cached pools, e.g. after a product was saved. Other processes see this only with a shared
+    cache backend; with locmem they rebuild their own pools once POOL_TTL expires.
+    使候选池缓存失效（如商品保存后）；仅共享缓存后端下其他进程立即可见，locmem 下其他进程在 POOL_TTL 到期后重建。
+    """
+    cache.delete(CACHE_KEY)
+    with _lock:
+        _stats['invalidations'] += 1
+
+
+def stats():
+    with _lock:
+        snapshot = dict(_stats)
+    pools = cache.get(CACHE_KEY)
+    snapshot.update({'cached': pools is not None, 'pools': len(pools) if pools else 0,
+                     'pool_size': POOL_SIZE, 'ttl': POOL_TTL})
+    return snapshot
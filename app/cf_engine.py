@@ -0,0 +1,213 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from .models import UserInteraction
+
+
+class InteractionMatrix:
+    """
+    Sparse user x product interaction matrix backed by scipy CSR, with integer id <-> index maps.
+    基于 scipy CSR 的稀疏用户-商品交互矩阵，附带 id <-> 行列下标映射。
+
+    Multiple interactions of one user on one product (view/click/buy...) are averaged,
+    matching the previous pandas pivot_table semantics.
+    同一用户对同一商品的多条交互（浏览/点击/购买等）取平均值，与原 pandas pivot_table 语义一致。
+    """
+
+    def __init__(self, user_ids, product_ids, scores):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float32)
+
+        # id -> index maps / id 与下标的映射
+        self.user_ids, user_rows = np.unique(user_ids, return_inverse=True)
+        self.product_ids, product_cols = np.unique(product_ids, return_inverse=True)
+        self.product_index = {int(pid): idx for idx, pid in enumerate(self.product_ids)}
+
+        # Average duplicated (user, product) cells before building the CSR matrix / 先对重复的 (用户, 商品) 单元格取平均
+        n_products = len(self.product_ids)
+        cells, cell_index = np.unique(user_rows * n_products + product_cols, return_inverse=True)
+        means = np.bincount(cell_index, weights=scores) / np.bincount(cell_index)
+        self.matrix = sparse.csr_matrix(
+            (means.astype(np.float32), (cells // n_products, cells % n_products)),
+            shape=(len(self.user_ids), n_products))
+        self.matrix.eliminate_zeros()
+
+    @classmethod
+    def from_db(cls, queryset=None):
+        """
+        Stream interactions from the database without building intermediate DataFrames.
+        直接从数据库流式读取交互记录，不构建中间 DataFrame。
+        """
+        queryset = queryset if queryset is not None else UserInteraction.objects.all()
+        rows = queryset.values_list('user_id', 'product_id', 'score').iterator(chunk_size=10000)
+        data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+        return cls(data[:, 0], data[:, 1], data[:, 2])
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def item_vectors(self):
+        """
+        L2-normalised item column vectors (CSC), so that a dot product equals cosine similarity.
+        L2 归一化后的商品列向量（CSC），点积即余弦相似度。
+        """
+        return normalize(self.matrix.tocsc(), norm='l2', axis=0)
+
+
+def positive_pairs(user_ids):
+    """
+    Distinct (user_id, product_id) pairs with a positive interaction, as an (n, 2) int64 array.
+    有正向交互的去重（用户ID, 商品ID）对，返回 (n, 2) 的 int64 数组。
+    """
+    pairs = UserInteraction.objects.filter(user_id__in=list(user_ids), score__gt=0).values_list('user_id', 'product_id')
+    # Several interaction types on one product count once / 同一商品的多种交互只计一次
+    return np.unique(np.array(list(pairs), dtype=np.int64).reshape(-1, 2), axis=0)
+
+
+def cosine_block(item_vectors, item_indices):
+    """
+    Sparse cosine similarity between the given items and all items (|items| x P, CSR).
+    计算给定商品与全部商品之间的稀疏余弦相似度（|items| x P，CSR 格式）。
+    """
+    block = item_vectors[:, item_indices].T.tocsr() @ item_vectors
+    return block.tocsr()
+
+
+def topk_rows(block, top_n, self_indices=None):
+    """
+    Extract the top-k positive entries of every row of a sparse block without densifying it.
+    在不稠密化的前提下，提取稀疏矩阵每一行中前 k 个正值。
+
+    Args:
+        block: CSR matrix of similarities.
+        top_n: Neighbours kept per row.
+        self_indices: Optional column index per row to exclude (the item itself).
+
+    Returns:
+        list of (columns, scores) arrays, one pair per row, sorted by score; ties are broken by
+        column index, also at the top_n boundary, so the result does not depend on storage order.
+        每行一对（列下标, 分数）数组，按分数降序；分数相同时按列下标升序（包括第 top_n 名处的并列），结果与存储顺序无关。
+    """
+    results = []
+    for row in range(block.shape[0]):
+        start, end = block.indptr[row], block.indptr[row + 1]
+        cols, vals = block.indices[start:end], block.data[start:end]
+        mask = vals > 0
+        if self_indices is not None:
+            mask &= cols != self_indices[row]
+        cols, vals = cols[mask], vals[mask]
+        if len(vals) > top_n:
+            # Keep everything tied with the top_n-th score, then cut after ordering / 保留与第 top_n 名并列的全部元素，排序后再截断
+            kth = -np.partition(-vals, top_n - 1)[top_n - 1]
+            keep = vals >= kth
+            cols, vals = cols[keep], vals[keep]
+        order = np.lexsort((cols, -vals))[:top_n]
+        results.append((cols[order], vals[order]))
+    return results
+
+
+def item_topk(item_vectors, top_n, item_indices=None, chunk_size=1024):
+    """
+    Top-k neighbours for many items, computed chunk by chunk to bound peak memory.
+    分块计算多个商品的 Top-k 近邻，以限制峰值内存。
+
+    Yields:
+        (item_index, neighbour_indices, scores) triples.
+    """
+    if item_indices is None:
+        item_indices = np.arange(item_vectors.shape[1])
+    item_indices = np.asarray(item_indices)
+    for start in range(0, len(item_indices), chunk_size):
+        chunk = item_indices[start:start + chunk_size]
+        block = cosine_block(item_vectors, chunk)
+        for item, (cols, vals) in zip(chunk, topk_rows(block, top_n, self_indices=chunk)):
+            yield int(item), cols, vals
+
+
+def csr_from_pairs(rows, cols, data, shape):
+    """
+    CSR matrix from (row, column, value) triples, built directly from sorted arrays.
+    由（行, 列, 值）三元组直接构建 CSR 矩阵（排序后生成 indptr，开销低于 COO 转换）。
+
+    Duplicated (row, column) pairs must be removed by the caller.
+    重复的（行, 列）需由调用方去除。
+    """
+    order = np.lexsort((cols, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    indptr = np.searchsorted(rows, np.arange(shape[0] + 1))
+    return sparse.csr_matrix((data, cols, indptr), shape=shape)
+
+
+def cf_scores(user_items, similarity):
+    """
+    Item-CF scores of a batch of users in one sparse product U_batch x S_topk, seen items masked.
+    以一次稀疏矩阵乘法 U_batch x S_topk 计算一批用户的物品协同过滤得分，并屏蔽用户已交互的商品。
+
+    Each user's score for an item is the sum of its similarities to the items the user interacted with.
+    用户对某商品的得分为该商品与用户交互过的各商品的相似度之和。
+
+    Args:
+        user_items: CSR (users x P) with 1 for every interacted item.
+        similarity: CSR (P x P) Top-N neighbour similarities, one row per item.
+
+    Returns:
+        CSR (users x P) scores without the items each user already interacted with.
+    """
+    # Sorted columns fix the summation order / 列下标有序，保证求和顺序确定
+    user_items.sort_indices()
+    scores = (user_items @ similarity).tocsr()
+    width = scores.shape[1]
+    rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+    seen_rows = np.repeat(np.arange(user_items.shape[0]), np.diff(user_items.indptr))
+    scores.data[np.isin(rows * width + scores.indices, seen_rows * width + user_items.indices)] = 0
+    scores.eliminate_zeros()
+    return scores
+
+
+def similarity_matrix(products, neighbors, scores, product_ids):
+    """
+    Sparse Top-N similarity matrix over a sorted product id axis.
+    在按 id 排序的商品轴上构建稀疏 Top-N 相似度矩阵。
+
+    Args:
+        products, neighbors, scores: Parallel arrays of neighbour rows (e.g. item_similarity.neighbor_arrays).
+        product_ids: Sorted numpy array of product ids; rows and columns outside it are dropped.
+
+    Returns:
+        CSR (P x P) matrix, row = product, column = neighbour.
+    """
+    size = len(product_ids)
+    rows, cols = np.searchsorted(product_ids, products), np.searchsorted(product_ids, neighbors)
+    known = (rows < size) & (cols < size)
+    known[known] = (product_ids[rows[known]] == products[known]) & (product_ids[cols[known]] == neighbors[known])
+    return csr_from_pairs(rows[known], cols[known], scores[known], (size, size))
+
+
+def user_neighbor_scores(user_ids, pairs, products, neighbors, scores):
+    """
+    Neighbour-sum scores of a batch of users over just the products involved.
+    仅在涉及的商品上，计算一批用户的近邻得分之和。
+
+    Args:
+        user_ids: Users of the batch.
+        pairs: Their interacted (user_id, product_id) pairs, see positive_pairs.
+        products, neighbors, scores: Neighbour rows of the interacted products.
+
+    Returns:
+        dict {user_id: {product_id: score}} for every user, interacted products excluded.
+    """
+    product_ids = np.unique(np.concatenate([pairs[:, 1], neighbors]))
+    batch_ids = np.array(user_ids, dtype=np.int64)
+    order = np.argsort(batch_ids, kind='stable')
+    rows = order[np.searchsorted(batch_ids, pairs[:, 0], sorter=order)]
+    user_items = csr_from_pairs(rows, np.searchsorted(product_ids, pairs[:, 1]), np.ones(len(pairs)),
+                                (len(user_ids), len(product_ids)))
+
+    cf = cf_scores(user_items, similarity_matrix(products, neighbors, scores, product_ids))
+    results = {}
+    for row, uid in enumerate(user_ids):
+        start, end = cf.indptr[row], cf.indptr[row + 1]
+        results[uid] = dict(zip(product_ids[cf.indices[start:end]].tolist(), cf.data[start:end].tolist()))
+    return results
@@ -0,0 +1,91 @@
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .batching import BatchBuffer, BufferFull
+from .models import ChatLog
+from . import metrics_rollup
+
+# 每批写入的日志条数、最长等待时间（秒）与队列容量 / Batch size, max wait (seconds) and queue capacity
+BATCH_SIZE = getattr(settings, 'CHAT_LOG_BATCH_SIZE', 200)
+FLUSH_INTERVAL = getattr(settings, 'CHAT_LOG_FLUSH_INTERVAL', 0.5)
+QUEUE_SIZE = getattr(settings, 'CHAT_LOG_QUEUE_SIZE', 5000)
+# 队列满时同步视图最多等待的时间（秒），超时后直接写库 / How long a sync view waits for room before writing directly
+PUT_TIMEOUT = getattr(settings, 'CHAT_LOG_PUT_TIMEOUT', 0.2)
+
+_lock = threading.Lock()
+_stats = {'direct_writes': 0, 'dropped': 0}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def write_logs(logs):
+    """
+    Insert a batch of ChatLog rows and add them to the dashboard rollups.
+    批量插入对话日志，并累加到看板汇总中。
+
+    If the batch violates a constraint (e.g. an unknown user_id), rows are retried one by one
+    so a single bad row does not lose the others.
+    整批写入违反约束（如不存在的 user_id）时逐条重试，避免一条坏数据导致整批丢失。
+    """
+    try:
+        with transaction.atomic():
+            ChatLog.objects.bulk_create(logs)
+            # bulk_create sends no post_save signals / bulk_create 不触发信号，需手动累加汇总
+            metrics_rollup.record_chat_logs(logs)
+        return
+    except IntegrityError:
+        pass
+    for log in logs:
+        log.pk = None
+        try:
+            with transaction.atomic():
+                log.save()
+        except IntegrityError as e:
+            _count('dropped')
+            print(f"Dropping chat log of user {log.user_id}: {e}")
+
+
+buffer = BatchBuffer('chat-log', write_logs, max_batch=BATCH_SIZE, max_delay=FLUSH_INTERVAL, max_queue=QUEUE_SIZE)
+
+
+def _write_now(log):
+    _count('direct_writes')
+    log.save()
+
+
+def log_chat(**fields):
+    """
+    Queue a ChatLog row for the background writer; the request does not wait for the database.
+    将对话日志交给后台写线程，请求无需等待数据库写入。
+
+    When the queue is full the caller waits up to PUT_TIMEOUT, then writes the row itself
+    (backpressure instead of dropping logs).
+    队列已满时最多等待 PUT_TIMEOUT 秒，仍无空间则由调用方直接写库（以背压代替丢弃日志）。
+    """
+    log = ChatLog(**fields)
+    try:
+        buffer.put(log, timeout=PUT_TIMEOUT)
+    except BufferFull:
+        _write_now(log)
+
+
+async def alog_chat(**fields):
+    """Async variant of log_chat that never blocks the event loop / log_chat 的异步版本，不阻塞事件循环"""
+    log = ChatLog(**fields)
+    try:
+        buffer.put(log)
+    except BufferFull:
+        await sync_to_async(_write_now)(log)
+
+
+def stats():
+    with _lock:
+        extra = dict(_stats)
+    snapshot = buffer.stats()
+    # Rows the buffer gave up on plus rows write_logs rejected / 缓冲队列放弃的数据与 write_logs 拒绝的数据
+    snapshot['dropped'] += extra.pop('dropped')
+    return dict(snapshot, **extra)
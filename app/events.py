@@ -0,0 +1,113 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .batching import BatchBuffer
+from .models import Product, RecommendationResult, UserInteraction, UserProfile
+from . import item_similarity, metrics_rollup, response_cache
+
+# 写入批次大小、最长等待时间（秒）与内存队列容量 / Batch size, max wait (seconds) and queue capacity
+BATCH_SIZE = getattr(settings, 'EVENT_BATCH_SIZE', 500)
+FLUSH_INTERVAL = getattr(settings, 'EVENT_FLUSH_INTERVAL', 1.0)
+QUEUE_SIZE = getattr(settings, 'EVENT_QUEUE_SIZE', 50000)
+# 单次请求最多上报的事件数 / Most events accepted in one request
+MAX_PER_REQUEST = getattr(settings, 'EVENT_MAX_PER_REQUEST', 1000)
+# 各交互类型写入 UserInteraction.score 的默认权重（评分事件使用上报的分数）/ Implicit feedback weights
+EVENT_SCORES = getattr(settings, 'EVENT_SCORES', {'view': 1.0, 'click': 2.0, 'fav': 4.0, 'buy': 5.0})
+
+EVENT_TYPES = dict(UserInteraction.INTERACTION_TYPES)
+# Pairs per OR-ed counter update, well below SQLite's expression depth limit / 单条计数更新语句包含的（用户, 商品）对数
+_PAIRS_PER_UPDATE = 200
+
+
+def parse_event(raw):
+    """
+    Validate one reported event.
+    校验一条上报的事件。
+
+    Returns:
+        (event, None) with event = (user_id, product_id, type, score), or (None, error message).
+    """
+    if not isinstance(raw, dict):
+        return None, "事件必须是对象"
+    try:
+        user_id, product_id = int(raw['user_id']), int(raw['product_id'])
+    except (KeyError, TypeError, ValueError):
+        return None, "缺少或非法的 user_id / product_id"
+    event_type = raw.get('type')
+    if event_type not in EVENT_TYPES:
+        return None, f"未知的事件类型: {event_type}"
+    if event_type == 'rate':
+        try:
+            score = float(raw['score'])
+        except (KeyError, TypeError, ValueError):
+            return None, "评分事件缺少 score"
+        if not 1 <= score <= 5:
+            return None, "score 必须在 1-5 之间"
+    else:
+        score = EVENT_SCORES.get(event_type, 1.0)
+    return (user_id, product_id, event_type, score), None
+
+
+def write_events(events):
+    """
+    Write a batch of parsed events with a handful of statements.
+    以少量 SQL 语句批量写入一批事件。
+
+    - Events are coalesced per (user, product, type) and upserted into UserInteraction with one
+      bulk_create(update_conflicts=True); created_at moves to the latest occurrence so the
+      stale-result check sees repeat interactions; the written pairs are recorded for the
+      incremental similarity refresh in the same transaction.
+    - Views and clicks of recommended products bump RecommendationResult counters with F()
+      expressions, grouped so pairs with the same increments share one UPDATE.
+    - 按（用户, 商品, 类型）合并后通过一次 bulk_create(update_conflicts=True) 写入 UserInteraction，
+      created_at 更新为最近一次发生时间，使离线结果过期判断能感知重复交互，写入的（用户, 商品）在同一事务中记为相似度增量刷新的变更；
+      对推荐商品的浏览与点击以 F() 表达式累加 RecommendationResult 计数，增量相同的记录合并为一条 UPDATE。
+    """
+    interactions = {}
+    counters = defaultdict(lambda: [0, 0])
+    for user_id, product_id, event_type, score in events:
+        key = (user_id, product_id, event_type)
+        # Ratings keep the latest score, implicit events the highest weight / 评分保留最新值，隐式反馈保留最高权重
+        interactions[key] = score if event_type == 'rate' else max(score, interactions.get(key, 0.0))
+        if event_type in ('view', 'click'):
+            counters[(user_id, product_id)][event_type == 'click'] += 1
+
+    # Drop events of unknown users / products instead of failing the whole batch / 丢弃不存在的用户或商品的事件
+    user_ids = set(UserProfile.objects.filter(id__in={k[0] for k in interactions}).values_list('id', flat=True))
+    product_ids = set(Product.objects.filter(id__in={k[1] for k in interactions}).values_list('id', flat=True))
+    now = timezone.now()
+    rows = [UserInteraction(user_id=u, product_id=p, type=t, score=score, created_at=now)
+            for (u, p, t), score in interactions.items() if u in user_ids and p in product_ids]
+
+    groups = defaultdict(list)
+    for (u, p), (views, clicks) in counters.items():
+        if u in user_ids and p in product_ids:
+            groups[(views, clicks)].append(Q(user_id=u, product_id=p))
+
+    views_total = clicks_total = 0
+    with transaction.atomic():
+        UserInteraction.objects.bulk_create(rows, batch_size=BATCH_SIZE, update_conflicts=True,
+                                            unique_fields=['user', 'product', 'type'],
+                                            update_fields=['score', 'created_at'])
+        item_similarity.record_changes((row.user_id, row.product_id) for row in rows)
+        for (views, clicks), pairs in groups.items():
+            for i in range(0, len(pairs), _PAIRS_PER_UPDATE):
+                matched = RecommendationResult.objects.filter(reduce(or_, pairs[i:i + _PAIRS_PER_UPDATE])).update(
+                    view_count=F('view_count') + views, click_count=F('click_count') + clicks)
+                views_total += matched * views
+                clicks_total += matched * clicks
+        metrics_rollup.record_recommendation_events(views=views_total, clicks=clicks_total, at=now)
+    # bulk_create sends no post_save signals / bulk_create 不触发信号，需手动使缓存失效
+    response_cache.bump('interaction')
+    return len(rows)
+
+
+buffer = BatchBuffer('events', write_events, max_batch=BATCH_SIZE, max_delay=FLUSH_INTERVAL, max_queue=QUEUE_SIZE)
+
+
+def stats():
+    return dict(buffer.stats(), max_per_request=MAX_PER_REQUEST)
@@ -0,0 +1,98 @@
+import re
+import numpy as np
+from .knowledge_service import KnowledgeService
+
+# 成分字段的分隔符（兼容中英文逗号、顿号、分号）/ Separators used in Product.ingredients
+_SPLIT_PATTERN = re.compile(r'[,，、;；\n]+')
+
+# product_id -> (ingredients text, frozenset of tokens)
+_token_cache = {}
+
+
+def split_ingredients(text):
+    """
+    Tokenise a comma-separated ingredients string into a list of ingredient names.
+    将逗号分隔的成分字符串切分为成分名称列表。
+    """
+    return [t.strip() for t in _SPLIT_PATTERN.split(text or '') if t.strip()]
+
+
+def ingredient_tokens(product):
+    """
+    Tokenised ingredient set of a product, memoised per product and refreshed when the text changes.
+    商品的成分集合，按商品缓存，成分文本变化时自动重新切分。
+    """
+    cached = _token_cache.get(product.id)
+    if cached is not None and cached[0] == product.ingredients:
+        return cached[1]
+    tokens = frozenset(split_ingredients(product.ingredients))
+    _token_cache[product.id] = (product.ingredients, tokens)
+    return tokens
+
+
+def match_tokens(terms, vocabulary):
+    """
+    Resolve banned terms to the ingredient tokens that contain them.
+    将禁用词解析为包含该词的成分名称集合。
+
+    Substring semantics are kept (e.g. "酒精" also bans "变性酒精"), but the scan runs once
+    over the batch vocabulary instead of once per product.
+    保留子串匹配语义（如“酒精”同样命中“变性酒精”），但只需扫描一次批次词表，而非逐个商品扫描。
+    """
+    return {tok for tok in vocabulary if any(term in tok for term in terms)}
+
+
+def unsafe_ids(token_sets, terms):
+    """
+    Set-based check: ids whose ingredient set intersects the banned tokens.
+    基于集合运算的检查：返回成分集合与禁用成分有交集的商品 id。
+
+    Args:
+        token_sets: dict {product_id: frozenset of ingredient tokens}.
+        terms: Banned ingredient terms (allergens and contraindications).
+    """
+    if not terms:
+        return set()
+    vocabulary = set().union(*token_sets.values()) if token_sets else set()
+    banned = match_tokens(terms, vocabulary)
+    return {pid for pid, tokens in token_sets.items() if not tokens.isdisjoint(banned)}
+
+
+def unsafe_ids_vectorized(token_sets, terms):
+    """
+    Vectorised check: multi-hot (products x vocabulary) matrix times a banned-token mask.
+    向量化检查：以多热编码的（商品 x 词表）矩阵与禁用成分掩码相乘。
+    """
+    if not terms or not token_sets:
+        return set()
+    vocabulary = sorted(set().union(*token_sets.values()))
+    vocab_index = {tok: idx for idx, tok in enumerate(vocabulary)}
+    product_ids = np.fromiter(token_sets.keys(), dtype=np.int64, count=len(token_sets))
+
+    rows, cols = [], []
+    for row, tokens in enumerate(token_sets.values()):
+        rows.extend([row] * len(tokens))
+        cols.extend(vocab_index[t] for t in tokens)
+    multi_hot = np.zeros((len(product_ids), len(vocabulary)), dtype=np.uint8)
+    multi_hot[rows, cols] = 1
+
+    mask = np.zeros(len(vocabulary), dtype=np.uint8)
+    banned = match_tokens(terms, vocabulary)
+    mask[[vocab_index[t] for t in banned]] = 1
+    return set(product_ids[(multi_hot @ mask) > 0].tolist())
+
+
+def expand_terms(terms):
+    """
+    Expand ingredient terms with their canonical name and aliases from the knowledge base.
+    使用知识库将成分词扩展为标准名称及其全部别名（如“玻尿酸”同时排除“透明质酸”）。
+    """
+    ks = KnowledgeService()
+    expanded = set()
+    for term in terms:
+        expanded.add(term)
+        info = ks.get_ingredient_info(term)
+        if info:
+            expanded.add(info['name'])
+            expanded.update(info['aliases'])
+    return expanded
@@ -0,0 +1,208 @@
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from .models import UserInteraction, ItemSimilarity, IndexBuildState, InteractionChange, Product
+from .cf_engine import InteractionMatrix, cosine_block, item_topk, positive_pairs, topk_rows, user_neighbor_scores
+
+# 每个商品保留的近邻数量 / Number of neighbours kept per product
+DEFAULT_TOP_N = getattr(settings, 'ITEM_SIM_TOP_N', 20)
+INDEX_NAME = 'item_similarity'
+
+
+def _save_state(watermark):
+    IndexBuildState.objects.update_or_create(name=INDEX_NAME, defaults={'watermark': watermark})
+
+
+def record_changes(pairs):
+    """
+    Record changed (user_id, product_id) interactions for the next refresh_index; call it in the
+    transaction that writes the interactions, so the record commits with them.
+    记录发生变更的（用户ID, 商品ID）交互，供下次增量刷新读取；须在写入交互的同一事务中调用，使记录与交互一并提交。
+    """
+    InteractionChange.objects.bulk_create(
+        [InteractionChange(user_id=u, product_id=p) for u, p in set(pairs)], batch_size=2000)
+
+
+def _clear_changes(change_ids):
+    # Only the records that were read: a write committing meanwhile keeps its record for the next refresh
+    # 只删除已读取的记录：期间提交的写入保留其记录，由下次刷新处理
+    for start in range(0, len(change_ids), 2000):
+        InteractionChange.objects.filter(id__in=change_ids[start:start + 2000]).delete()
+
+
+def build_full_index(top_n=None):
+    """
+    Offline full build: recompute the Top-N neighbours of every product.
+    离线全量构建：重新计算所有商品的 Top-N 近邻。
+
+    Returns:
+        Number of similarity rows written.
+    """
+    top_n = top_n or DEFAULT_TOP_N
+    change_ids = list(InteractionChange.objects.values_list('id', flat=True))
+    watermark = UserInteraction.objects.aggregate(m=Max('created_at'))['m']
+
+    interactions = InteractionMatrix.from_db()
+    product_ids = interactions.product_ids
+
+    rows = []
+    if interactions.shape[1]:
+        for item, cols, vals in item_topk(interactions.item_vectors(), top_n):
+            pid = int(product_ids[item])
+            rows.extend(ItemSimilarity(product_id=pid, neighbor_id=int(product_ids[c]), score=float(v))
+                        for c, v in zip(cols, vals))
+
+    with transaction.atomic():
+        ItemSimilarity.objects.all().delete()
+        ItemSimilarity.objects.bulk_create(rows, batch_size=2000)
+        _clear_changes(change_ids)
+        _save_state(watermark)
+    return len(rows)
+
+
+def _load_neighborhood(product_ids, user_ids=()):
+    """
+    Interaction matrix with the full columns of every product sharing a user with the given products
+    (or interacted with by user_ids), i.e. of every product that can have a non-zero similarity to them.
+    加载与给定商品有共同用户（或被 user_ids 交互过）的全部商品的完整交互列，即可能与给定商品相似度非零的全部商品。
+    """
+    users = UserInteraction.objects.filter(product_id__in=list(product_ids)).values('user_id')
+    linked = UserInteraction.objects.filter(Q(user_id__in=users) | Q(user_id__in=list(set(user_ids))))
+    return InteractionMatrix.from_db(UserInteraction.objects.filter(product_id__in=linked.values('product_id')))
+
+
+def _order_key(neighbor):
+    # Same order as topk_rows: score descending, then lower product id / 与 topk_rows 相同：分数降序，再按商品 ID 升序
+    return -neighbor[1], neighbor[0]
+
+
+def refresh_index(top_n=None):
+    """
+    Incremental refresh from the interaction changes recorded since the last build (inserts,
+    updates and deletes, see record_changes). Only the interactions of the changed products'
+    neighbourhood are loaded. The result equals a full rebuild.
+    根据上次构建以来记录的交互变更（新增、修改与删除，见 record_changes）增量刷新，
+    只加载变更商品邻域内的交互，结果与全量构建一致。
+
+    - Changed ("dirty") products get their whole row recomputed from their neighbourhood's columns.
+    - Any other product's similarities only change towards dirty products, so its stored list is
+      merged with its new dirty-product scores. A full stored list is cut at top_n; when the merge
+      ends below the old cut-off (a dirty neighbour fell away) the product that used to rank
+      top_n + 1 is unknown, so such rows are recomputed in full from their own neighbourhood.
+    - Lists that lost a deleted product through the foreign-key cascade are recomputed in full too.
+    - 变更（“脏”）商品根据其邻域的交互列整行重算；
+    - 其他商品只与脏商品之间的相似度会变化，将已存列表与新的脏商品相似度合并。已存列表已截断为 top_n，
+      合并后末位低于原截断位置（脏近邻掉出）时无法得知原第 top_n + 1 名，此类行根据自身邻域整行重算；
+    - 因外键级联删除而失去已删除商品的列表同样整行重算。
+
+    Returns:
+        Number of products whose neighbour lists were rewritten.
+    """
+    top_n = top_n or DEFAULT_TOP_N
+    if not IndexBuildState.objects.filter(name=INDEX_NAME).exists():
+        build_full_index(top_n)
+        return ItemSimilarity.objects.values('product_id').distinct().count()
+
+    changes = list(InteractionChange.objects.values_list('id', 'user_id', 'product_id'))
+    if not changes:
+        return 0
+    dirty_ids = {pid for _, _, pid in changes}
+    deleted_ids = dirty_ids - set(Product.objects.filter(id__in=list(dirty_ids)).values_list('id', flat=True))
+
+    # Dirty products left without interactions end up with an empty list / 已无交互的脏商品列表置空
+    new_lists = {pid: [] for pid in dirty_ids - deleted_ids}
+    dirty_sims = defaultdict(list)
+    interactions = _load_neighborhood(dirty_ids, {uid for _, uid, _ in changes})
+    if interactions.shape[1]:
+        product_ids = interactions.product_ids
+        item_vectors = interactions.item_vectors()
+        is_dirty = np.isin(product_ids, list(dirty_ids))
+        dirty_idx = np.flatnonzero(is_dirty)
+        for start in range(0, len(dirty_idx), 1024):
+            chunk = dirty_idx[start:start + 1024]
+            block = cosine_block(item_vectors, chunk)
+            for item, (cols, vals) in zip(chunk, topk_rows(block, top_n, self_indices=chunk)):
+                new_lists[int(product_ids[item])] = [(int(product_ids[c]), float(v)) for c, v in zip(cols, vals)]
+            # Similarities of the other products to dirty ones / 其他商品与脏商品的相似度
+            block = block.tocoo()
+            keep = (block.data > 0) & ~is_dirty[block.col]
+            for row, col, score in zip(block.row[keep], block.col[keep], block.data[keep]):
+                dirty_sims[int(product_ids[col])].append((int(product_ids[chunk[row]]), float(score)))
+
+    stale = set(ItemSimilarity.objects.filter(neighbor_id__in=list(dirty_ids)).values_list('product_id', flat=True))
+    candidates = (set(dirty_sims) | stale) - dirty_ids
+    stored = defaultdict(list)
+    lists = ItemSimilarity.objects.filter(product_id__in=list(candidates)).order_by('product_id', '-score', 'neighbor_id')
+    for pid, nid, score in lists.values_list('product_id', 'neighbor_id', 'score'):
+        stored[pid].append((nid, score))
+
+    deleted_users = [uid for _, uid, pid in changes if pid in deleted_ids]
+    full = set(UserInteraction.objects.filter(user_id__in=deleted_users).values_list('product_id', flat=True))
+    full -= dirty_ids
+    for pid in candidates - full:
+        old = stored[pid]
+        merged = sorted([n for n in old if n[0] not in dirty_ids] + dirty_sims[pid], key=_order_key)[:top_n]
+        if len(old) >= top_n and (len(merged) < top_n or _order_key(merged[-1]) > _order_key(old[-1])):
+            full.add(pid)
+        elif merged != old:
+            new_lists[pid] = merged
+
+    if full:
+        interactions = _load_neighborhood(full)
+        product_ids = interactions.product_ids
+        new_lists.update((pid, []) for pid in full)
+        full_idx = [interactions.product_index[pid] for pid in sorted(full) if pid in interactions.product_index]
+        for item, cols, vals in item_topk(interactions.item_vectors(), top_n, full_idx):
+            new_lists[int(product_ids[item])] = [(int(product_ids[c]), float(v)) for c, v in zip(cols, vals)]
+
+    rows = [ItemSimilarity(product_id=pid, neighbor_id=nid, score=score)
+            for pid, neighbors in new_lists.items() for nid, score in neighbors]
+    with transaction.atomic():
+        ItemSimilarity.objects.filter(product_id__in=list(new_lists)).delete()
+        ItemSimilarity.objects.bulk_create(rows, batch_size=2000)
+        _clear_changes([change_id for change_id, _, _ in changes])
+    return len(new_lists)
+
+
+def neighbor_arrays(product_ids=None, top_n=None):
+    """
+    Top-N neighbour rows as parallel numpy arrays, read with one query.
+    以一次查询读取 Top-N 近邻，返回并列的 numpy 数组。
+
+    Args:
+        product_ids: Optional products to read the rows of (default: the whole index).
+
+    Returns:
+        (products, neighbours, scores) arrays, grouped by product and sorted by score.
+    """
+    top_n = top_n or DEFAULT_TOP_N
+    rows = ItemSimilarity.objects.order_by('product_id', '-score', 'neighbor_id').values_list(
+        'product_id', 'neighbor_id', 'score')
+    # Stream the full index; a filtered lookup is small enough to fetch at once / 全量读取时流式获取，按商品查询时一次取出
+    rows = rows.filter(product_id__in=list(product_ids)) if product_ids is not None else rows.iterator(chunk_size=10000)
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    products = data[:, 0].astype(np.int64)
+    # Rank of every row within its product, to keep the first top_n / 每行在其商品内的名次，仅保留前 top_n 个
+    starts = np.flatnonzero(np.r_[True, products[1:] != products[:-1]])
+    rank = np.arange(len(products)) - np.repeat(starts, np.diff(np.r_[starts, len(products)]))
+    keep = rank < top_n
+    return products[keep], data[keep, 1].astype(np.int64), data[keep, 2]
+
+
+def behavior_scores(user_ids, top_n=None):
+    """
+    Online batch API: Item-CF scores of several users with two queries and one sparse multiply.
+    在线批量接口：两次查询加一次稀疏矩阵乘法，计算多个用户的物品协同过滤得分。
+
+    Only the neighbour rows of the batch's interacted items are loaded, so the matrices span just
+    the products involved; a single user is a batch of one.
+    仅加载本批用户交互过的商品的近邻行，矩阵只覆盖涉及的商品；单个用户即大小为 1 的批次。
+
+    Returns:
+        dict {user_id: {product_id: score}} for every requested user (empty for users without interactions).
+    """
+    user_ids = list(user_ids)
+    pairs = positive_pairs(user_ids)
+    return user_neighbor_scores(user_ids, pairs, *neighbor_arrays(np.unique(pairs[:, 1]).tolist(), top_n))
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_JSON_PATH = os.path.join(os.path.dirname(__file__), 'knowledge_base.json')
+POINTER_NAME = 'CURRENT'
+
+
+def kb_setting(name, default):
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return default
+
+
+def snapshot_dir():
+    return str(kb_setting('KNOWLEDGE_SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), 'kb_snapshots')))
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def build_snapshot(json_path=None, out_dir=None, keep=3):
+    """
+    Compile knowledge_base.json into a versioned, read-only sqlite snapshot and atomically publish it.
+    将 knowledge_base.json 编译为带版本号的只读 sqlite 快照，并原子地切换 CURRENT 指针。
+
+    Workers open the snapshot read-only with mmap, so all processes share it through the OS page cache.
+    各 worker 以只读 + mmap 方式打开快照，通过操作系统页缓存共享同一份数据。
+
+    Returns:
+        Build report dict (version, path, entries, keys, file_bytes, build_ms).
+    """
+    start = time.perf_counter()
+    json_path = json_path or DEFAULT_JSON_PATH
+    out_dir = out_dir or snapshot_dir()
+    os.makedirs(out_dir, exist_ok=True)
+
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    entries = json.loads(raw.decode('utf-8'))
+    version = time.strftime('%Y%m%d%H%M%S') + '-' + hashlib.sha1(raw).hexdigest()[:8]
+    filename = f"kb-{version}.sqlite"
+    path = os.path.join(out_dir, filename)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+        CREATE TABLE entries (id INTEGER PRIMARY KEY, payload TEXT NOT NULL);
+        CREATE TABLE lookup (key TEXT PRIMARY KEY, entry_id INTEGER NOT NULL) WITHOUT ROWID;
+    """)
+    keys = 0
+    for entry_id, item in enumerate(entries):
+        conn.execute("INSERT INTO entries VALUES (?, ?)", (entry_id, json.dumps(item, ensure_ascii=False)))
+        for key in [item['name']] + list(item.get('aliases', [])):
+            # First entry wins, same as the in-memory index / 与内存索引一致，先出现的条目优先
+            keys += conn.execute("INSERT OR IGNORE INTO lookup VALUES (?, ?)", (key, entry_id)).rowcount
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ('version', version), ('entries', str(len(entries))), ('source', os.path.abspath(json_path)),
+    ])
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, path)
+
+    # Publish the new version atomically / 原子地发布新版本
+    _write_atomic(os.path.join(out_dir, POINTER_NAME), filename)
+    _prune(out_dir, keep, current=filename)
+    return {
+        'version': version, 'path': path, 'entries': len(entries), 'keys': keys,
+        'file_bytes': os.path.getsize(path), 'build_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def _prune(out_dir, keep, current):
+    """
+    Remove old snapshots; workers still holding them open keep reading the unlinked file.
+    清理旧快照；仍打开旧文件的 worker 可继续读取已删除的文件，直到切换版本。
+    """
+    snapshots = sorted(f for f in os.listdir(out_dir) if f.startswith('kb-') and f.endswith('.sqlite'))
+    for name in snapshots[:-keep] if keep else []:
+        if name != current:
+            os.remove(os.path.join(out_dir, name))
+
+
+def current_snapshot(out_dir=None):
+    """
+    Path of the published snapshot, or None if no snapshot has been built.
+    返回当前发布的快照路径；尚未构建快照时返回 None。
+    """
+    out_dir = out_dir or snapshot_dir()
+    try:
+        with open(os.path.join(out_dir, POINTER_NAME), 'r', encoding='utf-8') as f:
+            filename = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(out_dir, filename)
+    return path if os.path.exists(path) else None
+
+
+class SnapshotReader:
+    """
+    Read-only, memory-mapped view over one knowledge base snapshot.
+    单个知识库快照的只读、内存映射视图。
+    """
+
+    def __init__(self, path):
+        start = time.perf_counter()
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size={kb_setting('KNOWLEDGE_SNAPSHOT_MMAP_BYTES', 64 * 1024 * 1024)}")
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self.version = meta['version']
+        self.entries = int(meta['entries'])
+        self.load_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT e.payload FROM lookup l JOIN entries e ON e.id = l.entry_id WHERE l.key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_entries(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT payload FROM entries ORDER BY id").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+def json_load_report(json_path=None):
+    """
+    Load time and Python heap usage of the plain JSON knowledge base, for comparison.
+    统计直接加载 JSON 知识库的耗时与 Python 堆内存占用，用于对比。
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(json_path or DEFAULT_JSON_PATH, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    load_ms = (time.perf_counter() - start) * 1000
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'entries': len(data), 'load_ms': round(load_ms, 2), 'heap_bytes': current, 'peak_heap_bytes': peak}
+
+
+def snapshot_load_report(path):
+    """
+    Open time and Python heap usage of a snapshot reader (data itself lives in the shared page cache).
+    统计打开快照的耗时与 Python 堆内存占用（数据本身位于共享页缓存中）。
+    """
+    tracemalloc.start()
+    reader = SnapshotReader(path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report = {
+        'version': reader.version, 'entries': reader.entries, 'load_ms': reader.load_ms,
+        'heap_bytes': current, 'peak_heap_bytes': peak, 'file_bytes': os.path.getsize(path),
+    }
+    reader.close()
+    return report
@@ -1,9 +1,20 @@
+import hashlib
 import json
 import os
+import time
+from functools import lru_cache
+from .kb_snapshot import SnapshotReader, current_snapshot, kb_setting
+
+# 推荐理由缓存的最大条目数 / Max number of memoised reason strings
+REASON_CACHE_SIZE = 4096
+
 
 class KnowledgeService:
     _instance = None
     _kb_data = None
+    _index = None
+    _snapshot = None
+    version = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -12,30 +23,114 @@ class KnowledgeService:
         return cls._instance
 
     def _load_kb(self):
+        """
+        Prefer the published sqlite snapshot; fall back to reading knowledge_base.json.
+        优先加载已发布的 sqlite 快照，不存在时回退为读取 knowledge_base.json。
+        """
+        self._next_check = time.monotonic() + kb_setting('KNOWLEDGE_RELOAD_INTERVAL', 30)
+        path = current_snapshot()
+        if path:
+            try:
+                self._use_snapshot(SnapshotReader(path))
+                return
+            except Exception as e:
+                print(f"Error loading knowledge base snapshot {path}: {e}")
+
         kb_path = os.path.join(os.path.dirname(__file__), 'knowledge_base.json')
         try:
-            with open(kb_path, 'r', encoding='utf-8') as f:
-                self._kb_data = json.load(f)
+            with open(kb_path, 'rb') as f:
+                raw = f.read()
+            self._kb_data = json.loads(raw.decode('utf-8'))
+            self.version = 'json-' + hashlib.sha1(raw).hexdigest()[:8]
         except Exception as e:
             print(f"Error loading knowledge base: {e}")
             self._kb_data = []
+            self.version = 'empty'
+        self._build_index()
 
-    def get_ingredient_info(self, ingredient_name):
-        if not self._kb_data:
-            return None
+    def _build_index(self):
+        """
+        Compile the knowledge base into a hash index covering names and aliases.
+        将知识库编译为覆盖名称与别名的哈希索引，查询耗时与条目数量无关。
+        """
+        index = {}
         for item in self._kb_data:
-            if item['name'] == ingredient_name or ingredient_name in item['aliases']:
-                return item
-        return None
+            # First entry wins, same as the previous linear scan / 与原线性扫描一致，先出现的条目优先
+            index.setdefault(item['name'], item)
+            for alias in item.get('aliases', []):
+                index.setdefault(alias, item)
+        self._index = index
+        self._lookup = index.get
+        self._cached_reason = lru_cache(maxsize=REASON_CACHE_SIZE)(self._compose_reason)
+
+    def _use_snapshot(self, reader):
+        """
+        Swap in a new snapshot; lookups are served from sqlite with a small per-process LRU.
+        切换到新快照；查询由 sqlite 提供，并在进程内保留一个小型 LRU 缓存。
+        """
+        self._lookup = lru_cache(maxsize=REASON_CACHE_SIZE)(reader.get)
+        self._cached_reason = lru_cache(maxsize=REASON_CACHE_SIZE)(self._compose_reason)
+        self._snapshot, self.version = reader, reader.version
+        # The previous reader is closed once in-flight lookups release it / 旧快照在进行中的查询释放后自动关闭
+        self._kb_data = self._index = None
+
+    def _maybe_reload(self):
+        """
+        Pick up a newly published snapshot version without restarting the process.
+        定期检查 CURRENT 指针，无需重启进程即可切换到新发布的快照版本。
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + kb_setting('KNOWLEDGE_RELOAD_INTERVAL', 30)
+        path = current_snapshot()
+        if path and (self._snapshot is None or path != self._snapshot.path):
+            try:
+                self._use_snapshot(SnapshotReader(path))
+            except Exception as e:
+                print(f"Error reloading knowledge base snapshot {path}: {e}")
+
+    def get_ingredient_info(self, ingredient_name):
+        self._maybe_reload()
+        return self._lookup(ingredient_name)
+
+    def iter_entries(self):
+        """
+        All knowledge base entries (used by offline index builders).
+        返回全部知识库条目（供离线索引构建使用）。
+        """
+        self._maybe_reload()
+        return self._snapshot.iter_entries() if self._snapshot else list(self._kb_data)
+
+    def report(self):
+        """
+        Version, storage mode and load statistics of the active knowledge base.
+        当前知识库的版本、存储模式与加载统计。
+        """
+        if self._snapshot:
+            return {
+                'mode': 'snapshot', 'version': self.version, 'path': self._snapshot.path,
+                'entries': self._snapshot.entries, 'load_ms': self._snapshot.load_ms,
+                'lookup_cache': self._lookup.cache_info()._asdict(),
+                'reason_cache': self._cached_reason.cache_info()._asdict(),
+            }
+        return {
+            'mode': 'json', 'version': self.version, 'entries': len(self._kb_data),
+            'reason_cache': self._cached_reason.cache_info()._asdict(),
+        }
 
     def get_professional_reason(self, ingredient_list):
+        self._maybe_reload()
+        return self._cached_reason(tuple(ingredient_list))
+
+    def _compose_reason(self, ingredients):
         reasons = []
-        for ing in ingredient_list:
-            info = self.get_ingredient_info(ing)
+        for ing in ingredients:
+            info = self._lookup(ing)
             if info:
                 reasons.append(f"{info['name']}（{info['benefits']}）")
-        
+
         if not reasons:
             return "该产品含有多种有效成分，能满足您的护肤需求。"
-        
+
         return "含有" + "、".join(reasons) + "，非常适合您的肤质。"
@@ -0,0 +1,96 @@
+import hashlib
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .models import LLMResponseCache
+
+# 缓存有效期（秒）与最大条目数 / Cache TTL (seconds) and max entries before LRU eviction
+CACHE_TTL = getattr(settings, 'LLM_CACHE_TTL', 7 * 24 * 3600)
+CACHE_MAX_ENTRIES = getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 10000)
+# 每写入多少次检查一次容量 / How often (in writes) the size limit is enforced
+EVICT_EVERY = 50
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+        return _stats[name]
+
+
+def reason_cache_key(product, skin_type, kb_version, prompt):
+    """
+    Cache key for a recommendation reason; the prompt hash also covers product edits.
+    推荐理由的缓存键；Prompt 哈希同时覆盖商品信息变更。
+    """
+    raw = f"reason|{product.id}|{skin_type}|{kb_version}|{prompt}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get(cache_key):
+    """
+    Return the cached response or None on a miss / expiry; refreshes the LRU timestamp on a hit.
+    返回缓存的模型输出，未命中或已过期时返回 None；命中时刷新 LRU 访问时间。
+    """
+    now = timezone.now()
+    entry = LLMResponseCache.objects.filter(
+        cache_key=cache_key, created_at__gte=now - timedelta(seconds=CACHE_TTL)
+    ).values('id', 'response').first()
+    if entry is None:
+        _count('misses')
+        return None
+    LLMResponseCache.objects.filter(id=entry['id']).update(hit_count=F('hit_count') + 1, last_accessed_at=now)
+    _count('hits')
+    return entry['response']
+
+
+def set(cache_key, response, product=None, skin_type='', kb_version='', usage=None, estimated_prompt_tokens=0):
+    """
+    Store a response, replacing any expired entry with the same key.
+    写入缓存，同键的过期条目会被覆盖；同时记录生成该响应的估算与实际 Token。
+    """
+    now = timezone.now()
+    LLMResponseCache.objects.update_or_create(cache_key=cache_key, defaults={
+        'response': response, 'product': product, 'skin_type': skin_type, 'kb_version': kb_version,
+        'hit_count': 0, 'created_at': now, 'last_accessed_at': now,
+        'estimated_prompt_tokens': estimated_prompt_tokens,
+        'prompt_tokens': usage.prompt_tokens if usage else 0,
+        'completion_tokens': usage.completion_tokens if usage else 0,
+    })
+    if _count('writes') % EVICT_EVERY == 0:
+        evict()
+
+
+def evict():
+    """
+    Drop expired entries, then the least recently used ones above CACHE_MAX_ENTRIES.
+    删除过期条目，再按最近访问时间淘汰超出 CACHE_MAX_ENTRIES 的部分。
+
+    Returns:
+        Number of entries removed.
+    """
+    removed, _ = LLMResponseCache.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=CACHE_TTL)).delete()
+    overflow = LLMResponseCache.objects.count() - CACHE_MAX_ENTRIES
+    if overflow > 0:
+        lru_ids = list(LLMResponseCache.objects.order_by('last_accessed_at').values_list('id', flat=True)[:overflow])
+        removed += LLMResponseCache.objects.filter(id__in=lru_ids).delete()[0]
+    _count('evictions', removed)
+    return removed
+
+
+def stats():
+    """
+    Process-local hit/miss counters plus the persisted cache size.
+    进程内的命中/未命中计数，以及持久化缓存的条目数。
+    """
+    with _lock:
+        snapshot = dict(_stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_ratio'] = round(snapshot['hits'] / lookups, 4) if lookups else 0.0
+    snapshot['entries'] = LLMResponseCache.objects.count()
+    return snapshot
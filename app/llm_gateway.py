@@ -0,0 +1,313 @@
+import asyncio
+import threading
+import time
+import weakref
+from django.conf import settings
+from openai import APITimeoutError, AsyncOpenAI, OpenAI, Timeout
+
+
+class LLMUnavailable(Exception):
+    """
+    Raised when the LLM is not called at all (breaker open, no free slot, no API key).
+    大模型未被调用时抛出（熔断打开、无空闲并发槽位或未配置 API 密钥），调用方应走离线/知识库回退。
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker: closed -> open after N failures -> half-open after a cool-down.
+    连续失败熔断器：连续失败 N 次后打开，冷却期结束后进入半开状态放行一次试探请求。
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.open_count = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            # Half-open: let a single trial request through / 半开：仅放行一次试探请求
+            self._state, self._trial_in_flight = self.HALF_OPEN, True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state, self._failures, self._trial_in_flight = self.CLOSED, 0, False
+
+    def release_trial(self):
+        """Give back a half-open trial that never reached upstream / 归还未真正发出的半开试探名额"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.open_count += 1
+                self._state, self._opened_at = self.OPEN, time.monotonic()
+
+
+# === Configuration / 配置区域 ===
+API_KEY = getattr(settings, 'LLM_API_KEY', '')
+BASE_URL = getattr(settings, 'LLM_BASE_URL', 'https://api.deepseek.com')
+MODEL = getattr(settings, 'LLM_MODEL', 'deepseek-chat')
+TIMEOUT = getattr(settings, 'LLM_TIMEOUT', 20)
+MAX_CONCURRENCY = getattr(settings, 'LLM_MAX_CONCURRENCY', 8)
+ACQUIRE_TIMEOUT = getattr(settings, 'LLM_ACQUIRE_TIMEOUT', 2)
+# Per event loop; async calls only hold a coroutine, not a thread / 每个事件循环的上限；异步调用只占用协程而非线程，上限可以高得多
+ASYNC_MAX_CONCURRENCY = getattr(settings, 'LLM_ASYNC_MAX_CONCURRENCY', 256)
+
+_client = None
+# Event loop -> (AsyncOpenAI client, semaphore); entries go away with their loop / 事件循环 -> (异步客户端, 信号量)，随事件循环回收
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_stats_lock = threading.Lock()
+_stats = {'calls': 0, 'succeeded': 0, 'failed': 0, 'timeouts': 0, 'abandoned': 0, 'rejected_busy': 0,
+          'rejected_open': 0, 'in_flight': 0, 'peak_in_flight': 0}
+breaker = CircuitBreaker(getattr(settings, 'LLM_BREAKER_FAILURES', 5), getattr(settings, 'LLM_BREAKER_RESET', 30))
+
+
+def llm_enabled():
+    """Whether a usable LLM API key is configured / 是否配置了可用的大模型 API 密钥"""
+    return bool(API_KEY) and "sk-XXX" not in API_KEY
+
+
+def get_client():
+    """
+    Process-wide OpenAI client whose keep-alive connection pool is reused (no per-call TLS setup).
+    进程级共享的 OpenAI 客户端，底层为带连接池与长连接的 httpx 客户端，避免每次调用重新建连。
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(api_key=API_KEY, base_url=BASE_URL, timeout=Timeout(TIMEOUT, connect=5.0), max_retries=0)
+    return _client
+
+
+def _async_state():
+    loop = asyncio.get_running_loop()
+    state = _async_clients.get(loop)
+    if state is None:
+        with _client_lock:
+            state = _async_clients.get(loop)
+            if state is None:
+                client = AsyncOpenAI(api_key=API_KEY, base_url=BASE_URL, timeout=Timeout(TIMEOUT, connect=5.0),
+                                     max_retries=0)
+                state = _async_clients[loop] = (client, asyncio.Semaphore(ASYNC_MAX_CONCURRENCY))
+    return state
+
+
+def get_async_client():
+    """
+    AsyncOpenAI client of the running event loop, with its own connection pool.
+    当前事件循环专用的 AsyncOpenAI 客户端（连接池绑定在该事件循环上）。
+
+    Connections and the async concurrency semaphore are bound to the loop that created them. An ASGI
+    worker runs one loop, so it shares one client; under WSGI / runserver Django runs each async view
+    on a new loop, which then gets its own client instead of reusing one tied to a closed loop.
+    连接与异步并发信号量绑定在创建它们的事件循环上。ASGI worker 只有一个事件循环，共用一个客户端；
+    WSGI / runserver 下 Django 为每个异步视图新建事件循环，各自创建客户端，不会复用绑定在已关闭事件循环上的客户端。
+    """
+    return _async_state()[0]
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+        if name == 'in_flight':
+            _stats['peak_in_flight'] = max(_stats['peak_in_flight'], _stats['in_flight'])
+
+
+def _acquire():
+    _check_allowed()
+    if not _slots.acquire(timeout=ACQUIRE_TIMEOUT):
+        raise _busy()
+    _count('calls')
+    _count('in_flight')
+
+
+async def _aacquire():
+    """Take an async slot of the running loop; returns (client, slots) / 占用当前事件循环的异步并发槽位"""
+    client, slots = _async_state()
+    _check_allowed()
+    try:
+        await asyncio.wait_for(slots.acquire(), ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _busy()
+    _count('calls')
+    _count('in_flight')
+    return client, slots
+
+
+def _check_allowed():
+    if not llm_enabled():
+        raise LLMUnavailable("LLM API key is not configured")
+    if not breaker.allow():
+        _count('rejected_open')
+        raise LLMUnavailable("LLM circuit breaker is open")
+
+
+def _busy():
+    _count('rejected_busy')
+    # Not an upstream failure: release a half-open trial without tripping / 非上游故障，不计入熔断
+    breaker.release_trial()
+    return LLMUnavailable("LLM concurrency limit reached")
+
+
+def _release(error=None, slots=None, abandoned=False):
+    (slots or _slots).release()
+    _count('in_flight', -1)
+    if abandoned:
+        # The client went away mid-stream, which says nothing about upstream health / 客户端中途断开，无法说明上游是否健康
+        _count('abandoned')
+        breaker.release_trial()
+    elif error is None:
+        _count('succeeded')
+        breaker.record_success()
+    else:
+        _count('failed')
+        if isinstance(error, (APITimeoutError, TimeoutError)):
+            _count('timeouts')
+        breaker.record_failure()
+
+
+def chat_completion(messages, timeout=None, **kwargs):
+    """
+    Blocking chat completion with a per-call deadline, bounded concurrency and the circuit breaker.
+    带单次调用超时、并发上限与熔断保护的同步对话补全。
+
+    Raises:
+        LLMUnavailable: The call was not attempted; use the offline fallback.
+        Exception: The upstream call failed (counted towards the breaker).
+    """
+    _acquire()
+    try:
+        response = get_client().chat.completions.create(
+            model=kwargs.pop('model', MODEL), messages=messages, stream=False,
+            timeout=timeout or TIMEOUT, **kwargs)
+    except Exception as e:
+        _release(e)
+        raise
+    _release()
+    return response
+
+
+def stream_chat_completion(messages, timeout=None, deadline=None, **kwargs):
+    """
+    Streaming chat completion; the concurrency slot is held until the stream is exhausted or closed.
+    流式对话补全；并发槽位在流结束或被关闭前一直占用。
+
+    Args:
+        timeout: Per-read timeout in seconds. 单次读取超时（秒）。
+        deadline: Total time budget for the whole stream in seconds. 整个流的总时长上限（秒）。
+    """
+    _acquire()
+    start = time.monotonic()
+    deadline = deadline or getattr(settings, 'LLM_STREAM_DEADLINE', 120)
+    stream, error, abandoned = None, None, False
+    try:
+        stream = get_client().chat.completions.create(
+            model=kwargs.pop('model', MODEL), messages=messages, stream=True,
+            timeout=timeout or TIMEOUT, **kwargs)
+        for chunk in stream:
+            if time.monotonic() - start > deadline:
+                raise TimeoutError(f"LLM stream exceeded {deadline}s deadline")
+            yield chunk
+    except GeneratorExit:
+        # Client went away; neither a failure nor a success / 客户端断开，既不计为失败也不计为成功
+        abandoned = True
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+        _release(error, abandoned=abandoned)
+
+
+async def async_chat_completion(messages, timeout=None, **kwargs):
+    """
+    Awaitable counterpart of chat_completion(); shares the circuit breaker and metrics.
+    chat_completion() 的异步版本，与同步调用共用熔断器和指标。
+    """
+    client, slots = await _aacquire()
+    try:
+        response = await client.chat.completions.create(
+            model=kwargs.pop('model', MODEL), messages=messages, stream=False,
+            timeout=timeout or TIMEOUT, **kwargs)
+    except Exception as e:
+        _release(e, slots)
+        raise
+    _release(slots=slots)
+    return response
+
+
+async def async_stream_chat_completion(messages, timeout=None, deadline=None, **kwargs):
+    """
+    Async-generator counterpart of stream_chat_completion().
+    stream_chat_completion() 的异步生成器版本。
+    """
+    client, slots = await _aacquire()
+    start = time.monotonic()
+    deadline = deadline or getattr(settings, 'LLM_STREAM_DEADLINE', 120)
+    stream, error, abandoned = None, None, False
+    try:
+        stream = await client.chat.completions.create(
+            model=kwargs.pop('model', MODEL), messages=messages, stream=True,
+            timeout=timeout or TIMEOUT, **kwargs)
+        async for chunk in stream:
+            if time.monotonic() - start > deadline:
+                raise TimeoutError(f"LLM stream exceeded {deadline}s deadline")
+            yield chunk
+    except (GeneratorExit, asyncio.CancelledError):
+        # Client went away; neither a failure nor a success / 客户端断开，既不计为失败也不计为成功
+        abandoned = True
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if stream is not None:
+            await stream.close()
+        _release(error, slots, abandoned)
+
+
+def metrics():
+    """
+    Concurrency, pool and circuit-breaker metrics of this process.
+    当前进程的并发、连接池与熔断器指标。
+    """
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot.update({
+        'max_concurrency': MAX_CONCURRENCY,
+        'async_max_concurrency': ASYNC_MAX_CONCURRENCY,
+        'client_initialised': _client is not None,
+        'async_clients': len(_async_clients),
+        'breaker_state': breaker.state,
+        'breaker_open_count': breaker.open_count,
+        'timeout_s': TIMEOUT,
+    })
+    return snapshot
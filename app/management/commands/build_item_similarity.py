@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from app.item_similarity import build_full_index, refresh_index
+
+
+class Command(BaseCommand):
+    help = "构建/增量刷新 Item-CF 商品相似度索引 (Build or incrementally refresh the item similarity index)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="全量重建索引，默认仅增量刷新")
+        parser.add_argument('--top-n', type=int, default=None, help="每个商品保留的近邻数量")
+
+    def handle(self, *args, **options):
+        if options['full']:
+            count = build_full_index(options['top_n'])
+            self.stdout.write(self.style.SUCCESS(f"Full build finished: {count} similarity rows written."))
+        else:
+            count = refresh_index(options['top_n'])
+            self.stdout.write(self.style.SUCCESS(f"Incremental refresh finished: {count} products updated."))
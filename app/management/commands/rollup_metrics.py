@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from app.metrics_rollup import prune_hourly, rebuild_chat_rollups, refresh_skin_distribution
+
+
+class Command(BaseCommand):
+    help = "校准运营看板的按小时/天汇总表 (Reconcile the hourly / daily dashboard rollups)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48, help="重新计算最近多少小时的汇总，默认 48")
+        parser.add_argument('--all', action='store_true', help="根据全部对话日志重建汇总（迁移时已自动回填一次）")
+
+    def handle(self, *args, **options):
+        since = None if options['all'] else timezone.now() - timedelta(hours=options['hours'])
+        buckets = rebuild_chat_rollups(since)
+        skins = refresh_skin_distribution()
+        pruned = prune_hourly()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups reconciled: {buckets} buckets written, {len(skins)} skin types counted, "
+            f"{pruned} expired hourly buckets removed."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from app import llm_cache
+from app.models import Product, UserInteraction
+from app.recommend_algo import generate_ai_reason
+
+
+class Command(BaseCommand):
+    help = "为最热门的 商品×肤质 组合预生成 AI 推荐理由 (Warm up the LLM reason cache)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200, help="预热的 商品×肤质 组合数量")
+
+    def handle(self, *args, **options):
+        # Most popular product x skin-type pairs by interaction count / 按交互次数统计最热门的 商品×肤质 组合
+        pairs = list(UserInteraction.objects.values('product_id', 'user__skin_type')
+                     .annotate(n=Count('id')).order_by('-n')[:options['limit']])
+        products = Product.objects.in_bulk([p['product_id'] for p in pairs])
+
+        before = llm_cache.stats()
+        for i, pair in enumerate(pairs, 1):
+            generate_ai_reason(products[pair['product_id']], pair['user__skin_type'])
+            if i % 20 == 0:
+                self.stdout.write(f"Progress: {i}/{len(pairs)}...")
+        after = llm_cache.stats()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(pairs)} pairs: {after['hits'] - before['hits']} already cached, "
+            f"{after['writes'] - before['writes']} generated, {after['entries']} entries in cache."))
@@ -0,0 +1,168 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from .models import ChatLog, MetricsRollup, SkinTypeStat, UserProfile
+
+# 小时粒度汇总的保留天数，天粒度永久保留 / Days of hourly buckets kept (daily buckets are kept forever)
+HOURLY_RETENTION_DAYS = getattr(settings, 'METRICS_HOURLY_RETENTION_DAYS', 7)
+
+CHAT_FIELDS = ('chat_count', 'prompt_tokens', 'completion_tokens', 'total_tokens',
+               'estimated_prompt_tokens', 'latency_ms_sum')
+PERIODS = ('hour', 'day')
+_TRUNC = {'hour': TruncHour, 'day': TruncDay}
+_STEP = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+
+def bucket_start(period, at):
+    """Start of the local-time hour / day containing at / 时间点所在（本地时区）小时或天的起点"""
+    local = timezone.localtime(at)
+    local = local.replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        local = local.replace(hour=0)
+    return local
+
+
+def _apply(deltas):
+    """
+    Add per-bucket deltas with F() increments, creating missing bucket rows.
+    以 F() 原子累加各时间桶的增量，时间桶不存在时创建。
+
+    Args:
+        deltas: dict {(period, bucket_start): {field: delta}}.
+    """
+    for (period, start), values in deltas.items():
+        values = {k: v for k, v in values.items() if v}
+        if not values:
+            continue
+        increments = {field: F(field) + v for field, v in values.items()}
+        if MetricsRollup.objects.filter(period=period, bucket_start=start).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                MetricsRollup.objects.create(period=period, bucket_start=start, **values)
+        except IntegrityError:
+            # Another writer created the bucket first / 其他写入方已先创建该时间桶
+            MetricsRollup.objects.filter(period=period, bucket_start=start).update(**increments)
+
+
+def record_chat_logs(logs):
+    """
+    Add a batch of saved ChatLog rows to their hourly and daily buckets.
+    将一批已保存的对话日志累加到对应的小时与天汇总中。
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for log in logs:
+        for period in PERIODS:
+            entry = deltas[(period, bucket_start(period, log.created_at))]
+            entry['chat_count'] += 1
+            entry['prompt_tokens'] += log.prompt_tokens
+            entry['completion_tokens'] += log.completion_tokens
+            entry['total_tokens'] += log.total_tokens
+            entry['estimated_prompt_tokens'] += log.estimated_prompt_tokens
+            entry['latency_ms_sum'] += log.latency_ms
+    _apply(deltas)
+
+
+def record_recommendation_events(views=0, clicks=0, at=None):
+    """
+    Add recommendation impressions and clicks to the current hourly and daily buckets.
+    将推荐曝光与点击次数累加到当前的小时与天汇总中。
+    """
+    at = at or timezone.now()
+    _apply({(period, bucket_start(period, at)): {'views': views, 'clicks': clicks} for period in PERIODS})
+
+
+def adjust_skin_count(skin_type, delta):
+    """Incrementally maintain the per-skin-type user count / 增量维护各肤质用户数"""
+    if SkinTypeStat.objects.filter(skin_type=skin_type).update(user_count=F('user_count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            SkinTypeStat.objects.create(skin_type=skin_type, user_count=max(delta, 0))
+    except IntegrityError:
+        SkinTypeStat.objects.filter(skin_type=skin_type).update(user_count=F('user_count') + delta)
+
+
+def refresh_skin_distribution():
+    """Recount users per skin type from UserProfile / 根据用户表重新统计肤质分布"""
+    counts = dict(UserProfile.objects.values_list('skin_type').annotate(n=Count('id')))
+    with transaction.atomic():
+        SkinTypeStat.objects.exclude(skin_type__in=counts).delete()
+        for skin_type, n in counts.items():
+            SkinTypeStat.objects.update_or_create(skin_type=skin_type, defaults={'user_count': n})
+    return counts
+
+
+def rebuild_chat_rollups(since=None):
+    """
+    Recompute the chat columns of every bucket from ChatLog, from the bucket containing since
+    (all history when since is None). Views and clicks have no raw log and are left untouched.
+    根据 ChatLog 重新计算 since 所在时间桶之后（since 为空时为全部历史）各时间桶的对话指标；
+    曝光与点击没有原始明细，保持不变。
+
+    Returns:
+        Number of buckets written.
+    """
+    written = 0
+    tz = timezone.get_current_timezone()
+    with transaction.atomic():
+        for period in PERIODS:
+            logs = ChatLog.objects.all()
+            buckets = MetricsRollup.objects.filter(period=period)
+            if since is not None:
+                start = bucket_start(period, since)
+                logs = logs.filter(created_at__gte=start)
+                buckets = buckets.filter(bucket_start__gte=start)
+            rows = (logs.annotate(bucket=_TRUNC[period]('created_at', tzinfo=tz)).values('bucket')
+                    .annotate(chat_count=Count('id'), prompt_tokens=Sum('prompt_tokens'),
+                              completion_tokens=Sum('completion_tokens'), total_tokens=Sum('total_tokens'),
+                              estimated_prompt_tokens=Sum('estimated_prompt_tokens'),
+                              latency_ms_sum=Sum('latency_ms')))
+            # Buckets whose logs were deleted fall back to zero / 日志已删除的时间桶清零
+            buckets.update(**{field: 0 for field in CHAT_FIELDS})
+            for row in rows:
+                MetricsRollup.objects.update_or_create(
+                    period=period, bucket_start=row.pop('bucket'), defaults=row)
+                written += 1
+    return written
+
+
+def prune_hourly(days=None):
+    cutoff = timezone.now() - timedelta(days=days if days is not None else HOURLY_RETENTION_DAYS)
+    return MetricsRollup.objects.filter(period='hour', bucket_start__lt=cutoff).delete()[0]
+
+
+def series(period='day', count=7):
+    """
+    The last count buckets of a period, oldest first, with empty buckets filled with zeros.
+    返回最近 count 个时间桶（由旧到新），缺失的时间桶补零。
+    """
+    now = timezone.now()
+    starts = [bucket_start(period, now - _STEP[period] * i) for i in range(count - 1, -1, -1)]
+    rows = {r['bucket_start']: r for r in MetricsRollup.objects.filter(period=period, bucket_start__gte=starts[0])
+            .values('bucket_start', 'views', 'clicks', *CHAT_FIELDS)}
+    empty = dict.fromkeys(('views', 'clicks') + CHAT_FIELDS, 0)
+    return [dict(rows.get(start, empty), bucket_start=start) for start in starts]
+
+
+def totals():
+    """
+    All-time totals summed over the daily buckets. If there are chat logs but no daily bucket yet
+    (e.g. the backfill never ran), the buckets are rebuilt from ChatLog once.
+    基于天汇总计算的全量合计；有对话日志但尚无天汇总（如未执行回填）时，先根据 ChatLog 重建一次。
+    """
+    if not MetricsRollup.objects.filter(period='day').exists() and ChatLog.objects.exists():
+        rebuild_chat_rollups()
+    result = MetricsRollup.objects.filter(period='day').aggregate(
+        views=Sum('views'), clicks=Sum('clicks'), **{field: Sum(field) for field in CHAT_FIELDS})
+    return {k: v or 0 for k, v in result.items()}
+
+
+def skin_distribution():
+    """Per-skin-type user counts, recounted once if never computed / 各肤质用户数，首次读取时统计一次"""
+    rows = dict(SkinTypeStat.objects.values_list('skin_type', 'user_count'))
+    return rows or refresh_skin_distribution()
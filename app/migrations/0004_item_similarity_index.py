@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_alter_chatlog_options_chatlog_completion_tokens_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexBuildState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='索引名称')),
+                ('watermark', models.DateTimeField(blank=True, null=True, verbose_name='数据水位线')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='构建时间')),
+            ],
+            options={
+                'verbose_name': '索引构建状态',
+                'verbose_name_plural': '索引构建状态',
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='余弦相似度')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_items', to='app.product')),
+            ],
+            options={
+                'verbose_name': '商品相似度索引',
+                'verbose_name_plural': '商品相似度索引',
+                'unique_together': {('product', 'neighbor')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_item_similarity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationresult',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='用于判断离线结果是否过期', verbose_name='计算时间'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recommendationresult',
+            unique_together={('user', 'product')},
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_ingredient_index(apps, schema_editor):
+    """为已有商品构建成分倒排索引"""
+    Product = apps.get_model('app', 'Product')
+    Ingredient = apps.get_model('app', 'Ingredient')
+    ProductIngredient = apps.get_model('app', 'ProductIngredient')
+
+    tokens_by_product = {
+        pid: {t.strip() for t in re.split(r'[,，、;；\n]+', text or '') if t.strip()}
+        for pid, text in Product.objects.values_list('id', 'ingredients')
+    }
+    names = set().union(*tokens_by_product.values()) if tokens_by_product else set()
+    Ingredient.objects.bulk_create([Ingredient(name=n) for n in names], ignore_conflicts=True)
+    ids = dict(Ingredient.objects.values_list('name', 'id'))
+    ProductIngredient.objects.bulk_create(
+        [ProductIngredient(product_id=pid, ingredient_id=ids[n]) for pid, tokens in tokens_by_product.items() for n in tokens],
+        batch_size=2000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_recommendationresult_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='成分名称')),
+            ],
+            options={
+                'verbose_name': '成分',
+                'verbose_name_plural': '成分',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_links', to='app.ingredient')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_links', to='app.product')),
+            ],
+            options={
+                'verbose_name': '商品成分索引',
+                'verbose_name_plural': '商品成分索引',
+                'unique_together': {('ingredient', 'product')},
+            },
+        ),
+        migrations.RunPython(backfill_ingredient_index, migrations.RunPython.noop),
+    ]
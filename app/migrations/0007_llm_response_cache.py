@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_ingredient_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponseCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True, verbose_name='缓存键')),
+                ('skin_type', models.CharField(blank=True, max_length=20, verbose_name='肤质类型')),
+                ('kb_version', models.CharField(blank=True, max_length=64, verbose_name='知识库版本')),
+                ('response', models.TextField(verbose_name='模型输出')),
+                ('hit_count', models.IntegerField(default=0, verbose_name='命中次数')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='最近访问时间')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='app.product')),
+            ],
+            options={
+                'verbose_name': '大模型响应缓存',
+                'verbose_name_plural': '大模型响应缓存',
+            },
+        ),
+    ]
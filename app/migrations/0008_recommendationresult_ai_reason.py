@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_llm_response_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationresult',
+            name='ai_reason',
+            field=models.BooleanField(default=False, help_text='否则为知识库理由，等待后台升级', verbose_name='理由是否由AI生成'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_recommendationresult_ai_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatlog',
+            name='first_token_ms',
+            field=models.IntegerField(default=0, help_text='仅流式对话记录', verbose_name='首Token延迟(ms)'),
+        ),
+    ]
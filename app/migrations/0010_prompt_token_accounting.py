@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_chatlog_first_token_ms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatlog',
+            name='estimated_prompt_tokens',
+            field=models.IntegerField(default=0, help_text='发送前本地估算，用于校准预算', verbose_name='预估提示词Token'),
+        ),
+        migrations.AddField(
+            model_name='llmresponsecache',
+            name='completion_tokens',
+            field=models.IntegerField(default=0, verbose_name='生成Token'),
+        ),
+        migrations.AddField(
+            model_name='llmresponsecache',
+            name='estimated_prompt_tokens',
+            field=models.IntegerField(default=0, verbose_name='预估提示词Token'),
+        ),
+        migrations.AddField(
+            model_name='llmresponsecache',
+            name='prompt_tokens',
+            field=models.IntegerField(default=0, verbose_name='提示词Token'),
+        ),
+    ]
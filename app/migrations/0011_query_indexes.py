@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_prompt_token_accounting'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='llmresponsecache',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='chatlog',
+            index=models.Index(fields=['-created_at'], name='chatlog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatlog',
+            index=models.Index(fields=['user', '-created_at'], name='chatlog_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatlog',
+            index=models.Index(condition=models.Q(('is_corrected', True)), fields=['created_at'], name='chatlog_corrected_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_avg', '-sales_count'], name='product_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['suitable_skin', '-rating_avg', '-sales_count'], name='product_skin_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recommendationresult',
+            index=models.Index(fields=['user', '-score'], name='recresult_user_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinteraction',
+            index=models.Index(fields=['user', 'created_at'], name='interaction_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinteraction',
+            index=models.Index(fields=['created_at'], name='interaction_time_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkinTypeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('skin_type', models.CharField(max_length=20, unique=True, verbose_name='肤质类型')),
+                ('user_count', models.IntegerField(default=0, verbose_name='用户数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '肤质分布统计',
+                'verbose_name_plural': '肤质分布统计',
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', '小时'), ('day', '天')], max_length=10, verbose_name='粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='时间桶起点')),
+                ('views', models.IntegerField(default=0, verbose_name='展示次数')),
+                ('clicks', models.IntegerField(default=0, verbose_name='点击次数')),
+                ('chat_count', models.IntegerField(default=0, verbose_name='对话次数')),
+                ('prompt_tokens', models.BigIntegerField(default=0, verbose_name='提示词Token')),
+                ('completion_tokens', models.BigIntegerField(default=0, verbose_name='生成Token')),
+                ('total_tokens', models.BigIntegerField(default=0, verbose_name='总消耗Token')),
+                ('estimated_prompt_tokens', models.BigIntegerField(default=0, verbose_name='预估提示词Token')),
+                ('latency_ms_sum', models.BigIntegerField(default=0, verbose_name='累计响应延迟(ms)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '运营指标汇总',
+                'verbose_name_plural': '运营指标汇总',
+                'unique_together': {('period', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+
+def backfill_metrics_rollups(apps, schema_editor):
+    """根据已有的对话日志与用户画像回填汇总表（小时粒度仅回填保留期内的数据）"""
+    ChatLog = apps.get_model('app', 'ChatLog')
+    MetricsRollup = apps.get_model('app', 'MetricsRollup')
+    SkinTypeStat = apps.get_model('app', 'SkinTypeStat')
+    UserProfile = apps.get_model('app', 'UserProfile')
+
+    tz = timezone.get_current_timezone()
+    hourly_since = timezone.now() - timedelta(days=getattr(settings, 'METRICS_HOURLY_RETENTION_DAYS', 7))
+    for period, trunc, logs in (('day', TruncDay, ChatLog.objects.all()),
+                                ('hour', TruncHour, ChatLog.objects.filter(created_at__gte=hourly_since))):
+        rows = (logs.annotate(bucket=trunc('created_at', tzinfo=tz)).values('bucket')
+                .annotate(chat_count=Count('id'), prompt_tokens=Sum('prompt_tokens'),
+                          completion_tokens=Sum('completion_tokens'), total_tokens=Sum('total_tokens'),
+                          estimated_prompt_tokens=Sum('estimated_prompt_tokens'), latency_ms_sum=Sum('latency_ms')))
+        for row in rows:
+            MetricsRollup.objects.update_or_create(period=period, bucket_start=row.pop('bucket'), defaults=row)
+
+    counts = UserProfile.objects.values_list('skin_type').annotate(n=Count('id'))
+    for skin_type, n in counts:
+        SkinTypeStat.objects.update_or_create(skin_type=skin_type, defaults={'user_count': n})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_metrics_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_metrics_rollups, migrations.RunPython.noop),
+    ]
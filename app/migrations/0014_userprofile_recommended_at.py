@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def backfill_recommended_at(apps, schema_editor):
+    """已有离线结果的用户以其最早的计算时间作为 recommended_at"""
+    RecommendationResult = apps.get_model('app', 'RecommendationResult')
+    UserProfile = apps.get_model('app', 'UserProfile')
+    computed_at = (RecommendationResult.objects.filter(user_id=OuterRef('pk')).values('user_id')
+                   .annotate(first=Min('updated_at')).values('first'))
+    UserProfile.objects.update(recommended_at=Subquery(computed_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_backfill_metrics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='recommended_at',
+            field=models.DateTimeField(blank=True, help_text='用于判断离线结果（含空结果）是否过期', null=True, verbose_name='推荐计算时间'),
+        ),
+        migrations.RunPython(backfill_recommended_at, migrations.RunPython.noop),
+    ]
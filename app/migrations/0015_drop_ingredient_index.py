@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:13
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_userprofile_recommended_at'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ProductIngredient',
+        ),
+        migrations.DeleteModel(
+            name='Ingredient',
+        ),
+    ]
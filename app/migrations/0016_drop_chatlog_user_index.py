@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_drop_ingredient_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chatlog',
+            name='chatlog_user_created_idx',
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+def record_changes_since_watermark(apps, schema_editor):
+    """将上次构建水位线之后的交互记为变更，使升级后的首次增量刷新不遗漏这些商品"""
+    IndexBuildState = apps.get_model('app', 'IndexBuildState')
+    InteractionChange = apps.get_model('app', 'InteractionChange')
+    UserInteraction = apps.get_model('app', 'UserInteraction')
+
+    state = IndexBuildState.objects.filter(name='item_similarity').first()
+    if state is None or state.watermark is None:
+        return
+    pairs = (UserInteraction.objects.filter(created_at__gt=state.watermark)
+             .values_list('user_id', 'product_id').distinct())
+    InteractionChange.objects.bulk_create(
+        (InteractionChange(user_id=u, product_id=p) for u, p in pairs.iterator()), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_drop_chatlog_user_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(verbose_name='用户ID')),
+                ('product_id', models.IntegerField(verbose_name='商品ID')),
+            ],
+            options={
+                'verbose_name': '交互变更记录',
+                'verbose_name_plural': '交互变更记录',
+            },
+        ),
+        migrations.RunPython(record_changes_since_watermark, migrations.RunPython.noop),
+        # 增量刷新改为读取交互变更记录，不再按水位线扫描新交互
+        migrations.RemoveIndex(
+            model_name='userinteraction',
+            name='interaction_time_idx',
+        ),
+    ]
@@ -25,6 +25,10 @@ class UserProfile(AbstractUser):
     # 记录用户是否完成了初始化设置（冷启动判断依据）
     is_profile_completed = models.BooleanField(default=False, verbose_name="画像是否完善")
 
+    # 离线推荐结果的计算时间（结果为空列表时同样记录）
+    recommended_at = models.DateTimeField(null=True, blank=True, verbose_name="推荐计算时间",
+                                          help_text="用于判断离线结果（含空结果）是否过期")
+
     class Meta:
         verbose_name = "用户画像"
         verbose_name_plural = verbose_name
@@ -53,6 +57,14 @@ class Product(models.Model):
     rating_avg = models.FloatField(default=0.0, verbose_name="平均评分")
     sales_count = models.IntegerField(default=0, verbose_name="销量")
 
+    class Meta:
+        indexes = [
+            # 热门榜单：按评分、销量倒序取 Top-N，无需排序
+            models.Index(fields=['-rating_avg', '-sales_count'], name='product_rank_idx'),
+            # 内容召回：按肤质过滤后按评分、销量取 Top-N（覆盖索引）
+            models.Index(fields=['suitable_skin', '-rating_avg', '-sales_count'], name='product_skin_rank_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -81,6 +93,10 @@ class UserInteraction(models.Model):
     class Meta:
         verbose_name = "用户交互记录"
         unique_together = ('user', 'product', 'type')  # 防止重复记录
+        indexes = [
+            # 判断用户在离线结果计算后是否产生新交互
+            models.Index(fields=['user', 'created_at'], name='interaction_user_time_idx'),
+        ]
 
 
 # 4. 推荐结果缓存表：存取分离，提升响应速度
@@ -92,15 +108,22 @@ class RecommendationResult(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     score = models.FloatField(verbose_name="推荐匹配度")
     reason = models.TextField(blank=True, null=True, verbose_name="AI推荐理由")
+    ai_reason = models.BooleanField(default=False, verbose_name="理由是否由AI生成", help_text="否则为知识库理由，等待后台升级")
     
     # 运营统计字段：用于CTR分析
     view_count = models.IntegerField(default=0, verbose_name="展示次数")
     click_count = models.IntegerField(default=0, verbose_name="点击次数")
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="计算时间", help_text="用于判断离线结果是否过期")
 
     class Meta:
         ordering = ['-score']
+        unique_together = ('user', 'product')
+        indexes = [
+            # 读取单个用户按匹配度排序的离线推荐结果
+            models.Index(fields=['user', '-score'], name='recresult_user_score_idx'),
+        ]
 
 
 # 5. AI对话日志：用于记录美妆顾问的交互历史
@@ -117,6 +140,8 @@ class ChatLog(models.Model):
     completion_tokens = models.IntegerField(default=0, verbose_name="生成Token")
     total_tokens = models.IntegerField(default=0, verbose_name="总消耗Token")
     latency_ms = models.IntegerField(default=0, verbose_name="响应延迟(ms)")
+    first_token_ms = models.IntegerField(default=0, verbose_name="首Token延迟(ms)", help_text="仅流式对话记录")
+    estimated_prompt_tokens = models.IntegerField(default=0, verbose_name="预估提示词Token", help_text="发送前本地估算，用于校准预算")
     
     # 人工纠偏逻辑
     is_corrected = models.BooleanField(default=False, verbose_name="是否已纠偏")
@@ -126,4 +151,122 @@ class ChatLog(models.Model):
 
     class Meta:
         verbose_name = "AI对话日志"
-        verbose_name_plural = verbose_name
\ No newline at end of file
+        verbose_name_plural = verbose_name
+        indexes = [
+            # 对话审计：按时间倒序分页
+            models.Index(fields=['-created_at'], name='chatlog_created_idx'),
+            # 人工纠偏结果（部分索引，仅包含已纠偏的记录）
+            models.Index(fields=['created_at'], condition=models.Q(is_corrected=True), name='chatlog_corrected_idx'),
+        ]
+
+# 6. 物品相似度索引：Item-CF 的离线 Top-N 近邻表
+class ItemSimilarity(models.Model):
+    """
+    存储每个商品的 Top-N 相似商品，由离线任务构建并按交互变更增量刷新。
+    在线召回只需查表求和，无需每次请求重新计算全量相似度矩阵。
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='similar_items')
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(verbose_name="余弦相似度")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "商品相似度索引"
+        verbose_name_plural = verbose_name
+        unique_together = ('product', 'neighbor')
+
+
+# 7. 离线索引构建状态：记录各类离线索引的构建水位线与待增量刷新的交互变更
+class IndexBuildState(models.Model):
+    """
+    记录离线索引最近一次全量构建所覆盖的数据水位线。
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name="索引名称")
+    watermark = models.DateTimeField(null=True, blank=True, verbose_name="数据水位线")
+    built_at = models.DateTimeField(auto_now=True, verbose_name="构建时间")
+
+    class Meta:
+        verbose_name = "索引构建状态"
+        verbose_name_plural = verbose_name
+
+
+class InteractionChange(models.Model):
+    """
+    新增、修改或删除的用户交互，与交互在同一事务中写入；相似度索引增量刷新时读取并删除已处理的记录。
+    只保存 ID 而非外键：用户或商品删除后仍需据此找到受影响的商品。
+    """
+    user_id = models.IntegerField(verbose_name="用户ID")
+    product_id = models.IntegerField(verbose_name="商品ID")
+
+    class Meta:
+        verbose_name = "交互变更记录"
+        verbose_name_plural = verbose_name
+
+
+# 8. 大模型响应缓存：推荐理由等可复用的 LLM 输出
+class LLMResponseCache(models.Model):
+    """
+    持久化缓存大模型生成的推荐理由，键由商品、肤质、知识库版本与 Prompt 共同决定。
+    支持 TTL 过期与按最近访问时间的 LRU 淘汰。
+    """
+    cache_key = models.CharField(max_length=64, unique=True, verbose_name="缓存键")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True)
+    skin_type = models.CharField(max_length=20, blank=True, verbose_name="肤质类型")
+    kb_version = models.CharField(max_length=64, blank=True, verbose_name="知识库版本")
+    response = models.TextField(verbose_name="模型输出")
+    hit_count = models.IntegerField(default=0, verbose_name="命中次数")
+    estimated_prompt_tokens = models.IntegerField(default=0, verbose_name="预估提示词Token")
+    prompt_tokens = models.IntegerField(default=0, verbose_name="提示词Token")
+    completion_tokens = models.IntegerField(default=0, verbose_name="生成Token")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_accessed_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="最近访问时间")
+
+    class Meta:
+        verbose_name = "大模型响应缓存"
+        verbose_name_plural = verbose_name
+
+
+# 9. 运营指标汇总表：按小时/天聚合的 CTR、Token 与延迟，看板只读取少量汇总行
+class MetricsRollup(models.Model):
+    """
+    按时间桶（小时/天）预聚合的运营指标，写入对话日志与曝光点击事件时增量累加，
+    并由 rollup_metrics 命令定期根据原始表校准。
+    """
+    PERIOD_CHOICES = (
+        ('hour', '小时'),
+        ('day', '天'),
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, verbose_name="粒度")
+    bucket_start = models.DateTimeField(verbose_name="时间桶起点")
+
+    # 推荐曝光与点击（CTR）
+    views = models.IntegerField(default=0, verbose_name="展示次数")
+    clicks = models.IntegerField(default=0, verbose_name="点击次数")
+
+    # AI 对话消耗与延迟
+    chat_count = models.IntegerField(default=0, verbose_name="对话次数")
+    prompt_tokens = models.BigIntegerField(default=0, verbose_name="提示词Token")
+    completion_tokens = models.BigIntegerField(default=0, verbose_name="生成Token")
+    total_tokens = models.BigIntegerField(default=0, verbose_name="总消耗Token")
+    estimated_prompt_tokens = models.BigIntegerField(default=0, verbose_name="预估提示词Token")
+    latency_ms_sum = models.BigIntegerField(default=0, verbose_name="累计响应延迟(ms)")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "运营指标汇总"
+        verbose_name_plural = verbose_name
+        unique_together = ('period', 'bucket_start')
+
+
+class SkinTypeStat(models.Model):
+    """
+    各肤质的用户数，新增/删除用户时增量维护，并由 rollup_metrics 命令定期校准。
+    """
+    skin_type = models.CharField(max_length=20, unique=True, verbose_name="肤质类型")
+    user_count = models.IntegerField(default=0, verbose_name="用户数")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "肤质分布统计"
+        verbose_name_plural = verbose_name
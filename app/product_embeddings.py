@@ -0,0 +1,329 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from sklearn.preprocessing import normalize
+from .cf_engine import positive_pairs, user_neighbor_scores
+from .ingredient_index import split_ingredients
+from .models import Product
+from . import response_cache
+
+# 商品向量索引文件路径（由 build_product_embeddings 命令离线构建）/ Index file built by build_product_embeddings
+INDEX_PATH = str(getattr(settings, 'PRODUCT_EMBEDDING_INDEX_PATH',
+                         os.path.join(settings.BASE_DIR, 'kb_snapshots', 'product_embeddings.npz')))
+# 向量维度：特征数超过该值时以随机投影压缩 / Vector size; wider feature spaces are randomly projected down to it
+EMBEDDING_DIM = getattr(settings, 'PRODUCT_EMBEDDING_DIM', 64)
+# 成分、功效、品类与价格带各特征块的权重 / Weight of each feature block
+FEATURE_WEIGHTS = getattr(settings, 'PRODUCT_EMBEDDING_WEIGHTS',
+                          {'ingredients': 1.0, 'efficacy': 1.0, 'category': 0.6, 'price': 0.4})
+# 价格带数量（按价格分位数划分）/ Number of price bands (price quantiles)
+PRICE_BANDS = getattr(settings, 'PRODUCT_EMBEDDING_PRICE_BANDS', 5)
+# LSH 哈希表数与每表位数（None 表示按商品数自动选择，平均每桶约 32 个商品）
+# LSH tables and bits per table (None: chosen from the catalog size, about 32 products per bucket)
+LSH_TABLES = getattr(settings, 'PRODUCT_ANN_TABLES', 8)
+LSH_BITS = getattr(settings, 'PRODUCT_ANN_BITS', None)
+# 是否同时探查汉明距离为 1 的相邻桶（提高召回率）/ Also probe the buckets one bit away (higher recall)
+MULTI_PROBE = getattr(settings, 'PRODUCT_ANN_MULTI_PROBE', True)
+# 商品数低于该值时直接精确扫描全部向量（小商品库上比 LSH 更快）/ Below this catalog size every vector is scanned exactly (faster than LSH there)
+ANN_MIN_PRODUCTS = getattr(settings, 'PRODUCT_ANN_MIN_PRODUCTS', 50000)
+# 相似商品接口默认返回数量 / Default number of similar products
+SIMILAR_TOP_K = getattr(settings, 'PRODUCT_SIMILAR_TOP_K', 10)
+# 每个索引实例缓存的相似商品结果条数上限（LRU 淘汰）/ Max memoised similar-product results per index (LRU eviction)
+SIMILAR_CACHE_SIZE = getattr(settings, 'PRODUCT_SIMILAR_CACHE_SIZE', 20000)
+# 检查索引文件更新的间隔（秒）/ How often the index file is checked for a rebuild (seconds)
+RELOAD_INTERVAL = getattr(settings, 'KNOWLEDGE_RELOAD_INTERVAL', 30)
+
+# Fixed seed so a rebuild of an unchanged catalog gives the same index / 固定随机种子，商品不变时重建结果一致
+SEED = 20240611
+BUCKET_TARGET = 32
+
+_lock = threading.Lock()
+_state = {'index': None, 'next_check': 0.0}
+_stats = {'queries': 0, 'total_ms': 0.0, 'candidates': 0}
+
+
+def _multi_hot(values_per_row, n_rows):
+    """Multi-hot CSR matrix and its vocabulary / 多热编码矩阵及其词表"""
+    vocabulary = {v: i for i, v in enumerate(sorted(set().union(*values_per_row)))} if n_rows else {}
+    rows = [r for r, values in enumerate(values_per_row) for _ in values]
+    cols = [vocabulary[v] for values in values_per_row for v in values]
+    return sp.csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)), shape=(n_rows, len(vocabulary)))
+
+
+def _price_bands(prices):
+    """
+    Price band features: the product's band 1.0 and the adjacent bands 0.5, so nearby price levels stay similar.
+    价格带特征：所在价格带为 1.0、相邻价格带为 0.5，使相近的价位仍保持相似。
+    """
+    n_bands = max(1, min(PRICE_BANDS, len(prices)))
+    edges = np.quantile(prices, np.linspace(0, 1, n_bands + 1)[1:-1]) if len(prices) else np.array([])
+    bands = np.searchsorted(edges, prices, side='right')
+    features = np.zeros((len(prices), n_bands), dtype=np.float32)
+    features[np.arange(len(prices)), bands] = 1.0
+    for offset in (-1, 1):
+        near = bands + offset
+        valid = (near >= 0) & (near < n_bands)
+        features[np.flatnonzero(valid), near[valid]] = 0.5
+    return sp.csr_matrix(features)
+
+
+def product_features(products):
+    """
+    Sparse feature matrix of products: multi-hot ingredients and efficacy tags, one-hot category
+    and price band, each block L2-normalised and weighted by FEATURE_WEIGHTS.
+    商品的稀疏特征矩阵：成分与功效标签多热编码、品类独热编码与价格带，各特征块 L2 归一化后按 FEATURE_WEIGHTS 加权。
+
+    Args:
+        products: Sequence of (ingredients, efficacy, category, price).
+    """
+    n = len(products)
+    blocks = {
+        'ingredients': _multi_hot([set(split_ingredients(p[0])) for p in products], n),
+        'efficacy': _multi_hot([set(split_ingredients(p[1])) for p in products], n),
+        'category': _multi_hot([{p[2]} for p in products], n),
+        'price': _price_bands(np.array([float(p[3]) for p in products], dtype=np.float64)),
+    }
+    return sp.hstack([normalize(block) * FEATURE_WEIGHTS.get(name, 1.0) for name, block in blocks.items()]).tocsr()
+
+
+def _lsh_bits(n_products):
+    if LSH_BITS:
+        return LSH_BITS
+    return max(1, min(32, int(round(math.log2(max(n_products, 2) / BUCKET_TARGET)))))
+
+
+def index_arrays(rows):
+    """
+    Vectors and LSH tables of products, as the arrays stored in the index file.
+    计算商品向量与 LSH 哈希表，即索引文件中保存的各数组。
+
+    Vectors are L2-normalised float32, so a dot product is the cosine similarity. Feature spaces
+    wider than EMBEDDING_DIM are compressed with a Gaussian random projection (which roughly keeps cosines).
+    向量为 L2 归一化的 float32，点积即余弦相似度；特征数超过 EMBEDDING_DIM 时以高斯随机投影压缩（近似保持余弦相似度）。
+
+    Args:
+        rows: Sequence of (id, ingredients, efficacy, category, price) ordered by id.
+
+    Returns:
+        (dict of arrays, number of features)
+    """
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    features = product_features([r[1:] for r in rows])
+    rng = np.random.default_rng(SEED)
+
+    if features.shape[1] > EMBEDDING_DIM:
+        projection = rng.standard_normal((features.shape[1], EMBEDDING_DIM)).astype(np.float32)
+        vectors = np.asarray(features @ projection)
+    else:
+        vectors = features.toarray()
+    vectors = normalize(vectors).astype(np.float32)
+
+    # Each table hashes a vector to the sign pattern of `bits` random hyperplanes
+    # 每张哈希表以 bits 个随机超平面的符号模式作为桶编号
+    planes = rng.standard_normal((LSH_TABLES, _lsh_bits(len(ids)), vectors.shape[1])).astype(np.float32)
+    codes = _codes(vectors, planes)
+    order = np.argsort(codes, axis=1, kind='stable')
+    arrays = {'ids': ids, 'vectors': vectors, 'planes': planes, 'codes': codes, 'order': order,
+              'sorted_codes': np.take_along_axis(codes, order, axis=1)}
+    return arrays, features.shape[1]
+
+
+def build_index(path=None):
+    """
+    Embed every product and build the random-projection LSH index, published atomically.
+    为全部商品计算特征向量并构建随机投影 LSH 索引，原子替换索引文件。
+
+    Returns:
+        dict with product count, feature / vector sizes, LSH layout, file size and build time.
+    """
+    start = time.perf_counter()
+    path = path or INDEX_PATH
+    rows = list(Product.objects.order_by('id').values_list('id', 'ingredients', 'efficacy', 'category', 'price')
+                .iterator(chunk_size=2000))
+    arrays, n_features = index_arrays(rows)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    response_cache.bump('product_embeddings')
+    buckets = [len(np.unique(c)) for c in arrays['codes']]
+    return {
+        'path': path, 'products': len(rows), 'features': n_features, 'dim': arrays['vectors'].shape[1],
+        'tables': LSH_TABLES, 'bits': arrays['planes'].shape[1],
+        'avg_bucket': float(round(len(rows) / np.mean(buckets), 1)) if rows else 0.0,
+        'file_bytes': os.path.getsize(path), 'build_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def _codes(vectors, planes):
+    """LSH bucket code of every vector in every table, (tables x n) uint64 / 每个向量在每张表中的桶编号"""
+    signs = np.einsum('tbd,nd->tnb', planes, vectors) > 0
+    weights = np.left_shift(np.uint64(1), np.arange(planes.shape[1], dtype=np.uint64))
+    return (signs.astype(np.uint64) * weights).sum(axis=2, dtype=np.uint64)
+
+
+class EmbeddingIndex:
+    """
+    Read-only product vectors and LSH tables loaded from the .npz file.
+    从 .npz 文件加载的只读商品向量与 LSH 哈希表。
+    """
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.ids = data['ids']
+            self.vectors = data['vectors']
+            self.planes = data['planes']
+            self.codes = data['codes']
+            self.order = data['order']
+            self.sorted_codes = data['sorted_codes']
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        bits = self.planes.shape[1]
+        flips = np.left_shift(np.uint64(1), np.arange(bits, dtype=np.uint64)) if MULTI_PROBE else []
+        self.probes = np.concatenate([np.zeros(1, dtype=np.uint64), np.asarray(flips, dtype=np.uint64)])
+        # Offset of each table in the flattened order array / 各哈希表在展开后的 order 数组中的偏移
+        self.table_offsets = np.arange(self.codes.shape[0])[:, None] * len(self.ids)
+        # Neighbours only change with a rebuild, which loads a new instance / 相似商品只随重建变化（重建会加载新实例）
+        self._similar = OrderedDict()
+        self._similar_lock = threading.Lock()
+        self.exact = len(self.ids) < ANN_MIN_PRODUCTS
+
+    def row(self, product_id):
+        i = np.searchsorted(self.ids, product_id)
+        return int(i) if i < len(self.ids) and self.ids[i] == product_id else None
+
+    def candidates(self, row):
+        """
+        Rows sharing a bucket with the given row in any table (plus the buckets one bit away with multi-probe);
+        every row for an exact index.
+        在任一哈希表中与该行同桶（开启多探查时包括汉明距离为 1 的相邻桶）的全部行；精确索引返回全部行。
+        """
+        if self.exact:
+            return np.arange(len(self.ids))
+        keys = self.codes[:, row][:, None] ^ self.probes[None, :]
+        lo = np.stack([np.searchsorted(c, k, 'left') for c, k in zip(self.sorted_codes, keys)])
+        hi = np.stack([np.searchsorted(c, k, 'right') for c, k in zip(self.sorted_codes, keys)])
+        lengths = (hi - lo).ravel()
+        starts = (lo + self.table_offsets).ravel()
+        # Expand every [start, start + length) range without a Python loop / 不经 Python 循环展开各个区间
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        # A mask dedups rows found in several tables more cheaply than sorting them / 以掩码去重，比排序更快
+        found = np.zeros(len(self.ids), dtype=bool)
+        found[self.order.ravel()[positions]] = True
+        return np.flatnonzero(found)
+
+    def similar(self, product_id, top_k=SIMILAR_TOP_K):
+        """
+        Top_k most similar products: LSH candidates (all products below ANN_MIN_PRODUCTS) ranked by exact cosine similarity.
+        最相似的 top_k 个商品：LSH 候选集（商品数低于 ANN_MIN_PRODUCTS 时为全部商品）按精确余弦相似度排序。
+
+        Returns:
+            list of (product_id, similarity), best first; ties go to the lower product id.
+            Empty if the product is not in the index. The last SIMILAR_CACHE_SIZE results are memoised per (product, top_k).
+        """
+        key = (product_id, top_k)
+        with self._similar_lock:
+            if key in self._similar:
+                self._similar.move_to_end(key)
+                return self._similar[key]
+        row = self.row(product_id)
+        results = self._search(row, top_k) if row is not None else []
+        with self._similar_lock:
+            self._similar[key] = results
+            while len(self._similar) > SIMILAR_CACHE_SIZE:
+                self._similar.popitem(last=False)
+        return results
+
+    def _search(self, row, top_k):
+        rows = self.candidates(row)
+        rows = rows[rows != row]
+        scores = self.vectors[rows] @ self.vectors[row]
+        with _lock:
+            _stats['candidates'] += len(rows)
+        if len(rows) > top_k:
+            keep = np.argpartition(-scores, top_k - 1)[:top_k]
+            kth = scores[keep].min()
+            keep = scores >= kth
+            rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((self.ids[rows], -scores))[:top_k]
+        return [(int(self.ids[r]), float(s)) for r, s in zip(rows[order], scores[order])]
+
+    def neighbor_arrays(self, product_ids, top_k):
+        """
+        Similar-product rows of several products as parallel (products, neighbours, scores) arrays.
+        以并列数组（商品, 相似商品, 相似度）返回多个商品的相似商品。
+        """
+        rows = [(pid, nid, score) for pid in product_ids for nid, score in self.similar(pid, top_k) if score > 0]
+        data = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2]
+
+
+def get_index():
+    """
+    The current index, reloaded when the file is rebuilt; None if it has not been built yet.
+    返回当前索引，索引文件重建后自动重新加载；尚未构建时返回 None。
+    """
+    now = time.monotonic()
+    if now >= _state['next_check']:
+        with _lock:
+            _state['next_check'] = now + RELOAD_INTERVAL
+            index = _state['index']
+            try:
+                if os.path.exists(INDEX_PATH) and (index is None or os.path.getmtime(INDEX_PATH) != index.mtime):
+                    _state['index'] = EmbeddingIndex(INDEX_PATH)
+            except Exception as e:
+                print(f"Error loading product embedding index {INDEX_PATH}: {e}")
+    return _state['index']
+
+
+def similar_products(product_id, top_k=SIMILAR_TOP_K):
+    """
+    Content-similar products of one product (empty if the index is not built).
+    返回与某商品内容最相似的商品（索引未构建时返回空列表）。
+    """
+    index = get_index()
+    if index is None:
+        return []
+    start = time.perf_counter()
+    results = index.similar(product_id, top_k)
+    with _lock:
+        _stats['queries'] += 1
+        _stats['total_ms'] += (time.perf_counter() - start) * 1000
+    return results
+
+
+def user_scores(user_ids, top_n=SIMILAR_TOP_K):
+    """
+    Embedding recall for a batch of users: summed similarities of the top_n similar products of
+    every product each user interacted with (interacted products excluded).
+    批量向量召回：对用户交互过的每个商品取 top_n 个相似商品并累加相似度（排除已交互的商品）。
+
+    Returns:
+        dict {user_id: {product_id: score}} (empty dicts if the index is not built).
+    """
+    user_ids = list(user_ids)
+    index = get_index()
+    if index is None:
+        return {uid: {} for uid in user_ids}
+    pairs = positive_pairs(user_ids)
+    return user_neighbor_scores(user_ids, pairs, *index.neighbor_arrays(np.unique(pairs[:, 1]).tolist(), top_n))
+
+
+def stats():
+    index = _state['index']
+    with _lock:
+        snapshot = dict(_stats)
+    queries = snapshot['queries']
+    snapshot['avg_ms'] = round(snapshot.pop('total_ms') / queries, 3) if queries else 0.0
+    snapshot.update({'loaded': index is not None, 'path': INDEX_PATH,
+                     'products': len(index.ids) if index is not None else 0,
+                     'dim': int(index.vectors.shape[1]) if index is not None else 0,
+                     'exact': index.exact if index is not None else None,
+                     'tables': int(index.codes.shape[0]) if index is not None else 0,
+                     'bits': int(index.planes.shape[1]) if index is not None else 0})
+    return snapshot
@@ -0,0 +1,144 @@
+import math
+import re
+import threading
+from django.conf import settings
+from . import retrieval
+
+# 对话 Prompt 的 Token 预算（系统提示 + 检索片段 + 问题）/ Prompt token budget of a chat call
+CHAT_PROMPT_BUDGET = getattr(settings, 'CHAT_PROMPT_TOKEN_BUDGET', 800)
+# 推荐理由 Prompt 的 Token 预算 / Prompt token budget of a recommendation reason call
+REASON_PROMPT_BUDGET = getattr(settings, 'REASON_PROMPT_TOKEN_BUDGET', 250)
+# 生成长度上限，使延迟可预期 / Completion caps that keep latency predictable
+CHAT_MAX_TOKENS = getattr(settings, 'CHAT_MAX_COMPLETION_TOKENS', 600)
+REASON_MAX_TOKENS = getattr(settings, 'REASON_MAX_COMPLETION_TOKENS', 120)
+
+CHAT_SYSTEM_PROMPT = "你是一位专业的皮肤科医生和美妆顾问。"
+REASON_SYSTEM_PROMPT = "你是一个严谨且专业的护肤成分分析助手。"
+CONTEXT_HEADER = "\n参考资料（仅在与问题相关时使用）："
+
+# DeepSeek's published ratios: ~0.6 token per CJK character, ~0.3 per other character
+# 参考 DeepSeek 官方换算：1 个中文字符约 0.6 Token，1 个英文字符约 0.3 Token
+CJK_RATIO, OTHER_RATIO = 0.6, 0.3
+# Role / separator tokens added per message / 每条消息的角色与分隔符开销
+MESSAGE_OVERHEAD = 4
+_CJK = re.compile(r'[\u2e80-\u9fff\uf900-\ufaff\uff00-\uffef\u3000-\u303f]')
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def estimate_tokens(text):
+    """
+    Local token estimate of a string (no tokenizer download or API call).
+    本地估算字符串的 Token 数（无需下载分词器或调用接口）。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return math.ceil(cjk * CJK_RATIO + (len(text) - cjk) * OTHER_RATIO)
+
+
+def count_message_tokens(messages):
+    return sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD for m in messages)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Longest prefix of text whose estimate fits max_tokens / 截取估算值不超过 max_tokens 的最长前缀"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    used = 0.0
+    for i, char in enumerate(text):
+        used += CJK_RATIO if _CJK.match(char) else OTHER_RATIO
+        if used > max_tokens:
+            return text[:i]
+    return text
+
+
+def build_chat_prompt(user_message, budget=None):
+    """
+    Assemble chat messages within a token budget.
+    在 Token 预算内组装对话消息。
+
+    The system prompt and the question always go in (the question is truncated if it alone
+    exceeds the budget); retrieved snippets are added in rank order while they still fit.
+    系统提示与问题必定保留（问题本身超出预算时截断）；随后按相关度加入检索片段，超出预算的部分被裁剪。
+
+    Returns:
+        dict with messages, estimated_tokens, snippets and trimmed counts.
+    """
+    budget = budget or CHAT_PROMPT_BUDGET
+    system_prompt = CHAT_SYSTEM_PROMPT
+    used = estimate_tokens(system_prompt) + 2 * MESSAGE_OVERHEAD
+    question = truncate_to_tokens(user_message, max(budget - used, 0))
+    used += estimate_tokens(question)
+
+    snippets, trimmed_snippets = [], 0
+    for snippet in retrieval.context_snippets(question):
+        cost = estimate_tokens(f"\n- {snippet}") + (0 if snippets else estimate_tokens(CONTEXT_HEADER))
+        if used + cost > budget:
+            trimmed_snippets += 1
+            continue
+        snippets.append(snippet)
+        used += cost
+    if snippets:
+        system_prompt += CONTEXT_HEADER + "".join(f"\n- {s}" for s in snippets)
+
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": question}]
+    return {
+        'messages': messages,
+        'estimated_tokens': count_message_tokens(messages),
+        'snippets': len(snippets),
+        'trimmed_snippets': trimmed_snippets,
+        'question_truncated': question != user_message,
+    }
+
+
+def build_reason_prompt(product_title, skin_type, professional_context, budget=None):
+    """
+    Recommendation-reason prompt with the KB context trimmed to the budget.
+    推荐理由 Prompt，知识库上下文按预算截断。
+
+    Returns:
+        (prompt, estimated_tokens) where the estimate covers the system and user messages.
+    """
+    budget = budget or REASON_PROMPT_BUDGET
+    template = """
+        你是一名专业的皮肤科医生。用户肤质：{skin_type}。推荐商品：{title}。
+        专业成分分析：{context}。请生成50字以内的专业推荐理由。
+        """
+    fixed = (estimate_tokens(template.format(skin_type=skin_type, title=product_title, context=''))
+             + estimate_tokens(REASON_SYSTEM_PROMPT) + 2 * MESSAGE_OVERHEAD)
+    context = truncate_to_tokens(professional_context, max(budget - fixed, 0))
+    prompt = template.format(skin_type=skin_type, title=product_title, context=context)
+    return prompt, fixed + estimate_tokens(context)
+
+
+def record_usage(kind, estimated_tokens, usage):
+    """
+    Accumulate estimated vs actual prompt tokens per call kind ('chat', 'reason').
+    按调用类型累计估算与实际的 Prompt Token，用于校准预算。
+    """
+    if usage is None:
+        return
+    with _lock:
+        entry = _stats.setdefault(kind, {'calls': 0, 'estimated_prompt_tokens': 0, 'prompt_tokens': 0,
+                                         'completion_tokens': 0})
+        entry['calls'] += 1
+        entry['estimated_prompt_tokens'] += estimated_tokens
+        entry['prompt_tokens'] += usage.prompt_tokens
+        entry['completion_tokens'] += usage.completion_tokens
+
+
+def stats():
+    """
+    Per-kind token accounting of this process and the configured budgets.
+    当前进程按调用类型的 Token 统计，以及配置的预算。
+    """
+    with _lock:
+        snapshot = {kind: dict(entry) for kind, entry in _stats.items()}
+    for entry in snapshot.values():
+        entry['estimate_ratio'] = (round(entry['estimated_prompt_tokens'] / entry['prompt_tokens'], 3)
+                                   if entry['prompt_tokens'] else None)
+    snapshot['budgets'] = {'chat_prompt': CHAT_PROMPT_BUDGET, 'reason_prompt': REASON_PROMPT_BUDGET,
+                           'chat_completion': CHAT_MAX_TOKENS, 'reason_completion': REASON_MAX_TOKENS}
+    return snapshot
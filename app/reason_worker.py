@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from .models import Product, RecommendationResult
+from .llm_gateway import llm_enabled
+from .recommend_algo import generate_ai_reason
+
+# 后台生成 AI 推荐理由的线程数 / Threads generating AI reasons in the background
+WORKER_THREADS = getattr(settings, 'REASON_WORKER_THREADS', 2)
+
+_executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix='reason-worker')
+_lock = threading.Lock()
+_pending = set()
+_stats = {'submitted': 0, 'upgraded': 0, 'failed': 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def upgrade_reason(user_id, product_id, skin_type):
+    """
+    Generate the AI reason (through the LLM cache) and store it on the RecommendationResult row.
+    生成 AI 推荐理由（经由大模型缓存），并写回对应的 RecommendationResult 记录。
+
+    Returns:
+        The AI reason, or None if the LLM is unavailable.
+    """
+    product = Product.objects.filter(id=product_id).first()
+    reason = generate_ai_reason(product, skin_type, fallback=False) if product else None
+    if reason is None:
+        _count('failed')
+        return None
+    RecommendationResult.objects.filter(user_id=user_id, product_id=product_id).update(reason=reason, ai_reason=True)
+    _count('upgraded')
+    return reason
+
+
+def _run(key, user_id, product_id, skin_type):
+    close_old_connections()
+    try:
+        upgrade_reason(user_id, product_id, skin_type)
+    except Exception as e:
+        _count('failed')
+        print(f"Reason upgrade failed for user {user_id}, product {product_id}: {e}")
+    finally:
+        with _lock:
+            _pending.discard(key)
+        close_old_connections()
+
+
+def schedule_upgrade(user_id, product_id, skin_type):
+    """
+    Queue a background AI reason upgrade; duplicate requests for the same pair are ignored.
+    提交后台 AI 理由升级任务；同一 (用户, 商品) 的重复请求会被忽略。
+
+    Returns:
+        True if the upgrade is queued or already in flight.
+    """
+    if not llm_enabled():
+        return False
+    key = (user_id, product_id)
+    with _lock:
+        if key in _pending:
+            return True
+        _pending.add(key)
+    _count('submitted')
+    _executor.submit(_run, key, user_id, product_id, skin_type)
+    return True
+
+
+def is_pending(user_id, product_id):
+    with _lock:
+        return (user_id, product_id) in _pending
+
+
+def stats():
+    with _lock:
+        return dict(_stats, pending=len(_pending), threads=WORKER_THREADS)
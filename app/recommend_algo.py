@@ -1,20 +1,47 @@
-import pandas as pd
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from .models import UserInteraction, Product, UserProfile
+from django.conf import settings
+from .models import Product, UserProfile
 from .knowledge_service import KnowledgeService
-from openai import OpenAI
-import random
+from .item_similarity import behavior_scores
+from .candidate_pools import get_candidates
+from . import product_embeddings
+from . import llm_cache
+from .llm_gateway import chat_completion, llm_enabled
+from .prompt_builder import REASON_MAX_TOKENS, REASON_SYSTEM_PROMPT, build_reason_prompt, record_usage
+from .ingredient_index import (
+    split_ingredients, ingredient_tokens, unsafe_ids, unsafe_ids_vectorized, expand_terms
+)
 
 # === Configuration / 配置区域 ===
-# API connection details for the LLM component.
-# 大语言模型组件的 API 连接详情。
-API_KEY = "sk-edb3fee01eac43cb9ab0b695ad6bdfcc"
-BASE_URL = "https://api.deepseek.com"
-
 ks = KnowledgeService()
 
-def generate_ai_reason(product, skin_type):
+# Skin-type contraindications / 肤质禁忌成分
+SKIN_CONTRAINDICATIONS = getattr(settings, 'SKIN_CONTRAINDICATIONS', {'sensitive': ['酒精']})
+# Candidates taken from each recall path, and the weights of the behavioural / content / embedding scores
+# 每路召回的候选数量，以及行为分、内容分与向量相似分的融合权重
+RECALL_TOP_N = 20
+BEHAVIOR_WEIGHT, CONTENT_WEIGHT, EMBEDDING_WEIGHT = 0.7, 0.3, 0.2
+
+def _reason_prompt(product, skin_type):
+    """
+    Build the knowledge-base context, budgeted prompt, cache key and prompt token estimate for a reason.
+    构建推荐理由所需的知识库上下文、按预算裁剪的 Prompt、缓存键与 Prompt Token 估算值。
+    """
+    # Retrieve domain knowledge from Local KB / 从本地知识库获取领域专业知识
+    professional_context = ks.get_professional_reason(split_ingredients(product.ingredients))
+    prompt, estimated_tokens = build_reason_prompt(product.title, skin_type, professional_context)
+    cache_key = llm_cache.reason_cache_key(product, skin_type, ks.version, prompt)
+    return professional_context, prompt, cache_key, estimated_tokens
+
+def cached_ai_reason(product, skin_type):
+    """
+    Cache-only lookup of an AI reason; never calls the LLM.
+    仅查询缓存中的 AI 推荐理由，不会调用大模型。
+    """
+    if not llm_enabled():
+        return None
+    return llm_cache.get(_reason_prompt(product, skin_type)[2])
+
+def generate_ai_reason(product, skin_type, fallback=True):
     """
     RAG-Lite: Combine local knowledge base with LLM to generate professional recommendation reasons.
     双语注释：RAG-Lite模式 - 结合本地知识库与大语言模型生成专业推荐理由。
@@ -22,99 +49,128 @@ def generate_ai_reason(product, skin_type):
     Args:
         product: Product model instance.
         skin_type: User's skin type string.
+        fallback: Return the knowledge-base text when the LLM is unavailable (otherwise None).
+                  大模型不可用时返回知识库解释（否则返回 None）。
     """
-    ingredients = [i.strip() for i in product.ingredients.split(',')]
-    
     # 1. Retrieve domain knowledge from Local KB / 从本地知识库获取领域专业知识
-    professional_context = ks.get_professional_reason(ingredients)
+    professional_context, prompt, cache_key, estimated_tokens = _reason_prompt(product, skin_type)
     
     # Check if a valid API key is provided / 检查是否提供了有效的 API 密钥
-    if "sk-XXX" in API_KEY or not API_KEY:
-        return f"【专业点评】{professional_context}"
+    if not llm_enabled():
+        return f"【专业点评】{professional_context}" if fallback else None
+
+    # 2. Serve from the persistent LLM cache when possible / 优先读取持久化的大模型响应缓存
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     try:
-        client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
-        prompt = f"""
-        你是一名专业的皮肤科医生。用户肤质：{skin_type}。推荐商品：{product.title}。
-        专业成分分析：{professional_context}。请生成50字以内的专业推荐理由。
-        """
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "你是一个严谨且专业的护肤成分分析助手。"},
-                {"role": "user", "content": prompt}
-            ],
-            stream=False
-        )
-        return response.choices[0].message.content.strip()
+        response = chat_completion([
+            {"role": "system", "content": REASON_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ], max_tokens=REASON_MAX_TOKENS)
+        reason = response.choices[0].message.content.strip()
+        record_usage('reason', estimated_tokens, response.usage)
+        llm_cache.set(cache_key, reason, product=product, skin_type=skin_type, kb_version=ks.version,
+                      usage=response.usage, estimated_prompt_tokens=estimated_tokens)
+        return reason
     except Exception as e:
-        # Fallback to local KB explanation if API fails / API 调用失败时回退回本地知识库解释
-        return f"【成分解析】{professional_context}"
+        # Fallback to local KB explanation if API fails or the breaker is open / API 调用失败或已熔断时回退回本地知识库解释
+        return f"【成分解析】{professional_context}" if fallback else None
 
-def get_behavioral_recall(user_id, top_n=20):
+def get_behavioral_recall(user_id, top_n=RECALL_TOP_N):
     """
     Recall Phase 1: Item-based Collaborative Filtering.
     召回阶段1：基于物品的协同过滤。
-    Uses Cosine Similarity on user-item interaction matrix to find patterns in user preferences.
-    使用余弦相似度在用户-商品交互矩阵上挖掘用户偏好模式。
+    Sums the similarities of the user's interacted items to their Top-N neighbours from the offline
+    index, as a sparse U x S product (see item_similarity.behavior_scores); interacted items are masked.
+    将用户交互过的商品与其离线索引中 Top-N 近邻的相似度求和，以稀疏矩阵乘法 U x S 计算
+    （见 item_similarity.behavior_scores），并屏蔽已交互的商品。
     """
-    interactions = UserInteraction.objects.all().values('user_id', 'product_id', 'score')
-    if not interactions: return {}
-
-    # Convert interaction data to a DataFrame / 将交互数据转换为 DataFrame
-    df = pd.DataFrame(list(interactions))
-    user_item_matrix = df.pivot_table(index='user_id', columns='product_id', values='score').fillna(0)
-
-    if user_id not in user_item_matrix.index: return {}
+    return behavior_scores([user_id], top_n)[user_id]
 
-    # Calculate item-item similarity matrix / 计算商品-对-商品的相似度矩阵
-    item_sim = cosine_similarity(user_item_matrix.T)
-    item_sim_df = pd.DataFrame(item_sim, index=user_item_matrix.columns, columns=user_item_matrix.columns)
-
-    user_vec = user_item_matrix.loc[user_id]
-    interacted_items = user_vec[user_vec > 0].index.tolist()
-    
-    scores = {}
-    for item_id in interacted_items:
-        # Get most similar items / 获取最相似的商品
-        sim_items = item_sim_df[item_id].sort_values(ascending=False)[1:top_n+1]
-        for sim_id, score in sim_items.items():
-            if sim_id in interacted_items: continue
-            scores[sim_id] = scores.get(sim_id, 0) + score
-    return scores
-
-def get_content_recall(user_profile, top_n=20):
+def get_content_recall(user_profile, top_n=RECALL_TOP_N, category=None):
     """
     Recall Phase 2: Content-based Filtering.
     召回阶段2：基于内容属性的过滤。
     Designed to solve the "Cold Start" problem for items or users with no interaction history.
     旨在解决没有任何交互历史的商品或用户的“冷启动”问题。
+
+    Slices the precomputed per-skin-type candidate pool, ranked by skin match, rating, sales
+    and efficacy match (see candidate_pools); no product query runs on this path.
+    直接截取预先计算的肤质候选池（按肤质匹配、评分、销量与功效匹配排序，见 candidate_pools），此路径不查询商品表。
     """
-    # Filter products based on skin type compatibility / 根据肤质兼容性过滤商品
-    candidates = Product.objects.filter(suitable_skin__in=[user_profile.skin_type, 'all'])
-    scores = {prod.id: (0.8 if prod.suitable_skin == user_profile.skin_type else 0.5) for prod in candidates[:top_n*2]}
-    return scores
+    return dict(get_candidates(user_profile.skin_type, top_n * 2, category))
 
-def safety_filter(candidates, user_profile):
+def get_embedding_recall(user_id, top_n=RECALL_TOP_N):
+    """
+    Recall Phase 2b: Content-similar products.
+    召回阶段2b：内容相似商品召回。
+    Products whose embedding (ingredients, efficacy, category, price band) is close to the items the
+    user interacted with, found through the approximate nearest-neighbour index (see product_embeddings);
+    empty until the index is built.
+    通过近似最近邻索引（见 product_embeddings）找出与用户交互过的商品在成分、功效、品类与价格带上相近的商品；
+    索引构建前返回空结果。
+    """
+    return product_embeddings.user_scores([user_id], top_n)[user_id]
+
+def merge_scores(behavior_scores, content_scores, embedding_scores=None):
+    """
+    Hybrid score fusion: weighted sum of the behavioural, content and embedding recall scores.
+    混合评分融合：行为召回分、内容召回分与向量相似分加权求和。
+    """
+    merged_candidates = {}
+    for pid, score in behavior_scores.items(): merged_candidates[pid] = score * BEHAVIOR_WEIGHT
+    for pid, score in content_scores.items(): merged_candidates[pid] = merged_candidates.get(pid, 0) + score * CONTENT_WEIGHT
+    for pid, score in (embedding_scores or {}).items():
+        merged_candidates[pid] = merged_candidates.get(pid, 0) + score * EMBEDDING_WEIGHT
+    return merged_candidates
+
+def banned_terms_for(user_profile):
+    """
+    The user's allergens plus the contraindications of their skin type, expanded with knowledge-base aliases.
+    用户过敏源与其肤质禁忌成分，并通过知识库扩展别名。
+    """
+    banned_terms = split_ingredients(user_profile.allergens)
+    banned_terms += SKIN_CONTRAINDICATIONS.get(user_profile.skin_type, [])
+    return expand_terms(banned_terms)
+
+def result_item(product, score, reason, ai_reason):
+    """One entry of a recommendation list / 推荐列表中的一项"""
+    return {
+        'product_id': product.id, 
+        'title': product.title,
+        'score': round(float(score), 2) if score > 0 else 0.85,
+        'reason': reason, 
+        'ai_reason': ai_reason,
+        'brand': product.brand, 
+        'price': float(product.price)
+    }
+
+def safety_filter(candidates, user_profile, method='sets'):
     """
     Recall Phase 3: Safety Guardrails (Rule-based filtering).
     召回阶段3：安全性护栏（基于规则的过滤）。
     A mandatory security layer to prevent harmful recommendations.
     防止产生有害推荐的强制性安全层。
+
+    Banned terms are the user's allergens plus the contraindications of their skin type,
+    expanded with knowledge-base aliases. All candidates are fetched with a single in_bulk query.
+    禁用成分为用户过敏源与其肤质禁忌成分，并通过知识库扩展别名；所有候选商品通过一次 in_bulk 查询取出。
+
+    Args:
+        method: 'sets' (default) checks the ingredients text of the fetched products with set
+                intersection, 'vectorized' with a numpy multi-hot matrix; both give the same result.
+                'sets'（默认）以集合求交检查已取出商品的成分文本，'vectorized' 使用 numpy 多热矩阵，两者结果一致。
     """
-    filtered = []
-    allergens = [a.strip() for a in (user_profile.allergens or "").split(',') if a.strip()]
-    
-    for product_id, score in candidates.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            # Sensitive skin check for alcohol / 敏感肌检查是否含酒精
-            if user_profile.skin_type == 'sensitive' and '酒精' in product.ingredients: continue
-            # Check for specific user allergens / 检查用户特定的过敏源
-            if any(a in product.ingredients for a in allergens): continue
-            filtered.append((product, score))
-        except Product.DoesNotExist: continue
-    return filtered
+    banned_terms = banned_terms_for(user_profile)
+
+    products = Product.objects.in_bulk(list(candidates))
+    token_sets = {pid: ingredient_tokens(product) for pid, product in products.items()}
+    excluded = (unsafe_ids_vectorized if method == 'vectorized' else unsafe_ids)(token_sets, banned_terms)
+
+    return [(products[pid], score) for pid, score in candidates.items()
+            if pid in products and pid not in excluded]
 
 def recommend_products(user_id, top_k=5):
     """
@@ -123,6 +179,11 @@ def recommend_products(user_id, top_k=5):
     
     Strategy: Combines statistical behaviors with semantic content.
     策略：将统计行为与语义内容相结合。
+
+    The LLM is never called on this path: the top item uses a cached AI reason when one exists,
+    otherwise the knowledge-base reason ('ai_reason': False) until the background worker upgrades it.
+    此路径不会同步调用大模型：首个商品优先使用已缓存的 AI 理由，否则先返回知识库理由
+    （'ai_reason': False），由后台任务异步升级。
     """
     try:
         user = UserProfile.objects.get(id=user_id)
@@ -131,32 +192,23 @@ def recommend_products(user_id, top_k=5):
     # 1. Multi-path Recall Execution / 执行多路召回
     behavior_scores = get_behavioral_recall(user_id)
     content_scores = get_content_recall(user)
+    embedding_scores = get_embedding_recall(user_id)
     
     # 2. Hybrid Score Fusion (Weighted Merge) / 混合评分融合（加权合并）
-    merged_candidates = {}
-    for pid, score in behavior_scores.items(): merged_candidates[pid] = score * 0.7
-    for pid, score in content_scores.items(): merged_candidates[pid] = merged_candidates.get(pid, 0) + score * 0.3
+    merged_candidates = merge_scores(behavior_scores, content_scores, embedding_scores)
         
     # 3. Apply Safety and Logic Filter / 应用安全与逻辑过滤
     safe_candidates = safety_filter(merged_candidates, user)
     
     # 4. Final Ranking / 最终排序
-    sorted_candidates = sorted(safe_candidates, key=lambda x: x[1], reverse=True)[:top_k]
+    # Ties go to the lower product id, same as the batch precompute / 同分时按商品 ID 升序，与离线批量计算一致
+    sorted_candidates = sorted(safe_candidates, key=lambda x: (-x[1], x[0].id))[:top_k]
     
     # 5. Populate Results with AI-assisted Reasons / 使用 AI 辅助生成的理由填充结果
     results = []
     for i, (product, score) in enumerate(sorted_candidates):
-        # AI generate reason only for the top item to optimize latency / 仅对顶部商品生成 AI 理由以优化延迟
-        is_val_key = API_KEY and not API_KEY.startswith("sk-XXX")
-        reason = generate_ai_reason(product, user.skin_type) if (i == 0 and is_val_key) else \
-                 ks.get_professional_reason([i.strip() for i in product.ingredients.split(',')])
-             
-        results.append({
-            'product_id': product.id, 
-            'title': product.title,
-            'score': round(float(score), 2) if score > 0 else 0.85,
-            'reason': reason, 
-            'brand': product.brand, 
-            'price': float(product.price)
-        })
+        # AI reason only for the top item, served from cache if ready / 仅首个商品使用 AI 理由，已缓存时直接返回
+        ai_reason = cached_ai_reason(product, user.skin_type) if i == 0 else None
+        reason = ai_reason or ks.get_professional_reason(split_ingredients(product.ingredients))
+        results.append(result_item(product, score, reason, ai_reason is not None))
     return results
\ No newline at end of file
@@ -0,0 +1,83 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import RecommendationResult, UserInteraction, UserProfile
+
+# 离线推荐结果的有效期（秒）/ Time-to-live of precomputed recommendations (seconds)
+RESULT_TTL = getattr(settings, 'RECOMMEND_RESULT_TTL', 6 * 3600)
+
+
+def save_recommendations(results_by_user):
+    """
+    Bulk-upsert precomputed recommendation lists and drop products that fell out of each list.
+    批量写入（upsert）离线推荐结果，并删除已不在推荐列表中的旧商品。
+
+    Each user's recommended_at is stamped too, so an empty list is a stored result rather than a miss.
+    同时记录每个用户的 recommended_at，空列表也作为有效结果保存，而不是视为未命中。
+
+    Args:
+        results_by_user: dict {user_id: [result dict from recommend_products, ...]}.
+    """
+    if not results_by_user:
+        return 0
+    batch_start = timezone.now()
+    rows = [
+        RecommendationResult(user_id=user_id, product_id=r['product_id'], score=r['score'],
+                             reason=r['reason'], ai_reason=r.get('ai_reason', False))
+        for user_id, results in results_by_user.items() for r in results
+    ]
+    with transaction.atomic():
+        # Keep view/click counters of rows that are recommended again / 再次入选的商品保留其展示/点击计数
+        RecommendationResult.objects.bulk_create(
+            rows, batch_size=1000, update_conflicts=True,
+            unique_fields=['user', 'product'], update_fields=['score', 'reason', 'ai_reason', 'updated_at'])
+        RecommendationResult.objects.filter(
+            user_id__in=list(results_by_user), updated_at__lt=batch_start).delete()
+        UserProfile.objects.filter(id__in=list(results_by_user)).update(recommended_at=batch_start)
+    return len(rows)
+
+
+def load_recommendations(user, top_k=5, ttl=None):
+    """
+    Read precomputed recommendations for one user.
+    读取单个用户的离线推荐结果。
+
+    Args:
+        user: UserProfile whose recommended_at tells when the stored list was computed.
+
+    Returns:
+        list of result dicts (empty when nothing safe was found), or None on a miss
+        (never computed, older than the TTL, or the user has interacted with products since).
+    """
+    ttl = RESULT_TTL if ttl is None else ttl
+    computed_at = user.recommended_at
+    if computed_at is None or computed_at < timezone.now() - timedelta(seconds=ttl):
+        return None
+    if UserInteraction.objects.filter(user_id=user.id, created_at__gt=computed_at).exists():
+        return None
+    rows = RecommendationResult.objects.filter(user_id=user.id).select_related('product')[:top_k]
+
+    return [{
+        'product_id': r.product_id,
+        'title': r.product.title,
+        'score': r.score,
+        'reason': r.reason,
+        'ai_reason': r.ai_reason,
+        'brand': r.product.brand,
+        'price': float(r.product.price)
+    } for r in rows]
+
+
+def stale_user_ids(ttl=None):
+    """
+    Users whose precomputed results are missing, expired, or older than their latest interaction.
+    离线结果缺失、过期或早于最新交互行为的用户。
+    """
+    ttl = RESULT_TTL if ttl is None else ttl
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    newer_interaction = UserInteraction.objects.filter(user_id=OuterRef('pk'), created_at__gt=OuterRef('recommended_at'))
+    return (UserProfile.objects
+            .filter(Q(recommended_at__isnull=True) | Q(recommended_at__lt=cutoff) | Exists(newer_interaction))
+            .values_list('id', flat=True))
@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import json
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# 各接口的响应缓存时间（秒），数据变更时通过版本号提前失效 / Per-endpoint TTLs; data changes invalidate earlier
+RESPONSE_CACHE_TTL = getattr(settings, 'RESPONSE_CACHE_TTL', {})
+DEFAULT_TTL = 60
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def _version_key(name):
+    return f"response_cache:version:{name}"
+
+
+def _version(name):
+    return cache.get_or_set(_version_key(name), 1, None)
+
+
+def bump(name):
+    """
+    Invalidate every cached response that depends on name ('product', 'interaction').
+    使依赖该数据（'product'、'interaction'）的所有缓存响应失效。
+
+    Cached entries are never deleted: the version becomes part of the key, so old entries just
+    stop being read and expire with their TTL.
+    不逐条删除缓存：版本号是缓存键的一部分，旧条目不再被读取，到期后自然淘汰。
+
+    Versions live in the default cache, so a bump only reaches other processes when that cache is
+    shared (CACHE_BACKEND=file, redis or memcached). With the per-process locmem default, other
+    workers, and bumps made by management commands, are only seen once the TTL expires.
+    版本号保存在默认缓存中，只有共享缓存后端（CACHE_BACKEND=file、redis 或 memcached）才能让其他进程立即看到；
+    默认的进程内 locmem 下，其他 worker（以及管理命令中的 bump）最长要等到 TTL 到期才生效。
+    """
+    try:
+        cache.incr(_version_key(name))
+    except ValueError:
+        cache.set(_version_key(name), 2, None)
+
+
+def _record(endpoint, outcome):
+    with _lock:
+        entry = _stats.setdefault(endpoint, {'hits': 0, 'misses': 0, 'not_modified': 0})
+        entry[outcome] += 1
+
+
+def _etag(data):
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True, ensure_ascii=False)
+    return quote_etag(hashlib.md5(body.encode('utf-8')).hexdigest())
+
+
+def _respond(request, data, etag):
+    client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in client_etags or '*' in client_etags:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    # Clients may keep the body but must revalidate, so they see whatever the server cache serves (see bump)
+    # 客户端可保存响应，但每次须带 If-None-Match 校验，看到的即服务端缓存当前的内容（失效范围见 bump）
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_response(endpoint, depends=()):
+    """
+    Cache the 200 responses of an APIView GET handler, with ETag / If-None-Match support.
+    缓存 APIView GET 方法的 200 响应，并支持 ETag / If-None-Match 条件请求。
+
+    Args:
+        endpoint: Name used for the TTL setting, the cache key and the hit statistics.
+        depends: Data names whose bump() invalidates the cached responses.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            ttl = RESPONSE_CACHE_TTL.get(endpoint, DEFAULT_TTL)
+            versions = ':'.join(f"{name}{_version(name)}" for name in depends)
+            params = '&'.join(f"{k}={v}" for k, v in sorted(request.query_params.items()))
+            path_args = ':'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
+            key = f"response_cache:{endpoint}:{versions}:{path_args}:{params}"
+
+            cached = cache.get(key)
+            if cached is None:
+                _record(endpoint, 'misses')
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cached = (response.data, _etag(response.data))
+                cache.set(key, cached, ttl)
+            else:
+                _record(endpoint, 'hits')
+
+            data, etag = cached
+            response = _respond(request, data, etag)
+            if response.status_code == status.HTTP_304_NOT_MODIFIED:
+                _record(endpoint, 'not_modified')
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    """
+    Per-endpoint hit ratios of this process and the configured backend.
+    当前进程各接口的缓存命中率，以及所用的缓存后端。
+    """
+    with _lock:
+        snapshot = {endpoint: dict(entry) for endpoint, entry in _stats.items()}
+    for entry in snapshot.values():
+        lookups = entry['hits'] + entry['misses']
+        entry['hit_ratio'] = round(entry['hits'] / lookups, 4) if lookups else 0.0
+    snapshot['backend'] = settings.CACHES['default']['BACKEND']
+    snapshot['ttl'] = RESPONSE_CACHE_TTL
+    return snapshot
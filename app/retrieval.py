@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from sklearn.feature_extraction.text import HashingVectorizer
+from .knowledge_service import KnowledgeService
+from .models import Product, UserProfile
+
+# 检索索引文件路径（由 build_retrieval_index 命令离线构建）/ Index file built by build_retrieval_index
+INDEX_PATH = str(getattr(settings, 'RETRIEVAL_INDEX_PATH', os.path.join(settings.BASE_DIR, 'kb_snapshots', 'retrieval.npz')))
+# 注入 Prompt 的知识库片段数、商品片段数与单个片段的最大字数 / Snippets per kind and their max length
+KB_TOP_K = getattr(settings, 'RETRIEVAL_KB_TOP_K', 2)
+PRODUCT_TOP_K = getattr(settings, 'RETRIEVAL_PRODUCT_TOP_K', 2)
+SNIPPET_CHARS = getattr(settings, 'RETRIEVAL_SNIPPET_CHARS', 120)
+# 检查索引文件更新的间隔（秒）/ How often the index file is checked for a rebuild (seconds)
+RELOAD_INTERVAL = getattr(settings, 'KNOWLEDGE_RELOAD_INTERVAL', 30)
+
+# BM25 parameters / BM25 参数
+K1, B = 1.5, 0.75
+# Character unigrams + bigrams work for Chinese without a word segmenter / 字 + 双字切分，无需中文分词器
+_vectorizer = HashingVectorizer(analyzer='char', ngram_range=(1, 2), n_features=2 ** 18,
+                                alternate_sign=False, norm=None)
+
+# Question filler words; rare in catalog text, so BM25 would otherwise over-weight them
+# 疑问/虚词：在商品文本中罕见，若不去除会被 BM25 赋予过高的 IDF 权重
+QUERY_STOPWORDS = re.compile(r'什么|怎么|怎样|如何|可以|能不能|有没有|是否|哪些|哪个|作用|效果|适合|推荐|请问|[吗呢吧啊的了是用有能和与及么]')
+
+SKIN_LABELS = dict(UserProfile.SKIN_TYPE_CHOICES, all='全部肤质')
+
+_lock = threading.Lock()
+_state = {'index': None, 'next_check': 0.0}
+_stats = {'searches': 0, 'total_ms': 0.0}
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def _skin_label(codes):
+    return '、'.join(SKIN_LABELS.get(c.strip(), c.strip()) for c in codes if c.strip())
+
+
+def _documents():
+    """
+    (kind, id, text) for every KB entry and product; the text is both indexed and shown.
+    为每个知识库条目与商品生成（类型, ID, 文本），该文本既用于检索也作为展示片段。
+    """
+    for i, entry in enumerate(KnowledgeService().iter_entries()):
+        aliases = '、'.join(entry.get('aliases', []))
+        snippet = (f"成分「{entry['name']}」" + (f"（又名{aliases}）" if aliases else '') +
+                   f"：{entry.get('benefits', '')}；风险：{entry.get('risks') or '无'}；"
+                   f"适合{_skin_label(entry.get('suitable_skin', [])) or '全部肤质'}")
+        unsuitable = _skin_label(entry.get('unsuitable_skin', []))
+        if unsuitable:
+            snippet += f"，不适合{unsuitable}"
+        yield 'kb', i, snippet
+
+    fields = ('id', 'title', 'brand', 'category', 'price', 'efficacy', 'ingredients', 'suitable_skin')
+    for p in Product.objects.only(*fields).order_by('id').iterator(chunk_size=2000):
+        snippet = (f"商品《{p.title}》（{p.brand}，{p.category}，¥{p.price}）：功效{p.efficacy}；"
+                   f"适用{_skin_label(p.suitable_skin.split(','))}；成分{p.ingredients}")
+        yield 'product', p.id, snippet
+
+
+def build_index(path=None):
+    """
+    Build the BM25 index over KB entries and products and publish it atomically.
+    构建覆盖知识库条目与商品的 BM25 索引，并原子替换索引文件。
+
+    Returns:
+        dict with document counts, file size and build time.
+    """
+    start = time.perf_counter()
+    path = path or INDEX_PATH
+    kinds, ids, texts, snippets = [], [], [], []
+    for kind, doc_id, text in _documents():
+        kinds.append(kind)
+        ids.append(doc_id)
+        texts.append(_normalize(text))
+        snippets.append(text[:SNIPPET_CHARS])
+
+    tf = _vectorizer.transform(texts).tocsr()
+    tf.sum_duplicates()
+    n_docs = tf.shape[0]
+    doc_len = np.asarray(tf.sum(axis=1)).ravel()
+    avg_len = doc_len.mean() if n_docs else 1.0
+    df = np.bincount(tf.indices, minlength=tf.shape[1])
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+    # Precompute the BM25 weight of every (doc, term) pair / 预先计算每个（文档, 词）对的 BM25 权重
+    rows = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+    weights = tf.data * (K1 + 1) / (tf.data + K1 * (1 - B + B * doc_len[rows] / avg_len)) * idf[tf.indices]
+    # Stored term-major so a query only touches the rows of its own terms / 按词存储，查询只读取命中词所在的行
+    term_docs = sp.csr_matrix((weights.astype(np.float32), tf.indices, tf.indptr), shape=tf.shape).T.tocsr()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, data=term_docs.data, indices=term_docs.indices, indptr=term_docs.indptr,
+                 shape=np.array(term_docs.shape), kinds=np.array(kinds), ids=np.array(ids, dtype=np.int64),
+                 snippets=np.array(snippets))
+    os.replace(tmp, path)
+    return {
+        'path': path, 'documents': n_docs, 'kb_entries': kinds.count('kb'), 'products': kinds.count('product'),
+        'nnz': int(term_docs.nnz), 'file_bytes': os.path.getsize(path),
+        'build_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+class RetrievalIndex:
+    """
+    Read-only BM25 index loaded from the .npz file.
+    从 .npz 文件加载的只读 BM25 索引。
+    """
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.term_docs = sp.csr_matrix((data['data'], data['indices'], data['indptr']),
+                                           shape=tuple(data['shape']))
+            self.kinds = data['kinds']
+            self.ids = data['ids']
+            self.snippets = data['snippets']
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.kind_rows = {kind: np.flatnonzero(self.kinds == kind) for kind in ('kb', 'product')}
+
+    def search(self, query, kb_k=KB_TOP_K, product_k=PRODUCT_TOP_K):
+        """
+        Best KB entries and best products, each with its own quota so neither kind crowds out the other.
+        分别返回最相关的知识库条目与商品，两类各有配额，避免数量更多的商品挤掉知识库内容。
+        """
+        terms = np.unique(_vectorizer.transform([QUERY_STOPWORDS.sub(' ', _normalize(query))]).indices)
+        if not len(terms) or not len(self.ids):
+            return []
+        scores = np.asarray(self.term_docs[terms].sum(axis=0)).ravel()
+        results = []
+        for kind, k in (('kb', kb_k), ('product', product_k)):
+            rows = self.kind_rows[kind]
+            k = min(k, len(rows))
+            if not k:
+                continue
+            top = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            results.extend({'kind': kind, 'id': int(self.ids[i]), 'snippet': str(self.snippets[i]),
+                            'score': round(float(scores[i]), 4)} for i in top if scores[i] > 0)
+        return results
+
+
+def get_index():
+    """
+    The current index, reloaded when the file is rebuilt; None if it has not been built yet.
+    返回当前索引，索引文件重建后自动重新加载；尚未构建时返回 None。
+    """
+    now = time.monotonic()
+    if now >= _state['next_check']:
+        with _lock:
+            _state['next_check'] = now + RELOAD_INTERVAL
+            index = _state['index']
+            try:
+                if os.path.exists(INDEX_PATH) and (index is None or os.path.getmtime(INDEX_PATH) != index.mtime):
+                    _state['index'] = RetrievalIndex(INDEX_PATH)
+            except Exception as e:
+                print(f"Error loading retrieval index {INDEX_PATH}: {e}")
+    return _state['index']
+
+
+def search(query, kb_k=KB_TOP_K, product_k=PRODUCT_TOP_K):
+    """
+    Top KB / product snippets for a query (empty if the index is not built).
+    返回与问题最相关的知识库/商品片段（索引未构建时返回空列表）。
+    """
+    index = get_index()
+    if index is None:
+        return []
+    start = time.perf_counter()
+    results = index.search(query, kb_k, product_k)
+    with _lock:
+        _stats['searches'] += 1
+        _stats['total_ms'] += (time.perf_counter() - start) * 1000
+    return results
+
+
+def context_snippets(query):
+    return [r['snippet'] for r in search(query)]
+
+
+def stats():
+    index = _state['index']
+    with _lock:
+        snapshot = dict(_stats)
+    snapshot['avg_ms'] = round(snapshot.pop('total_ms') / snapshot['searches'], 3) if snapshot['searches'] else 0.0
+    snapshot.update({'loaded': index is not None, 'path': INDEX_PATH,
+                     'documents': len(index.ids) if index is not None else 0,
+                     'kb_top_k': KB_TOP_K, 'product_top_k': PRODUCT_TOP_K})
+    return snapshot
@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import ChatLog, Product, UserInteraction, UserProfile
+from . import candidate_pools, item_similarity, metrics_rollup, response_cache
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_caches(sender, instance, **kwargs):
+    """
+    Rebuild the per-skin-type recall pools and drop cached product responses after any product change.
+    商品变更后使肤质候选池与商品相关的缓存响应失效，下次访问时重建。
+    """
+    candidate_pools.invalidate()
+    response_cache.bump('product')
+
+
+@receiver(post_save, sender=UserInteraction)
+@receiver(post_delete, sender=UserInteraction)
+def invalidate_interaction_responses(sender, instance, **kwargs):
+    """
+    Drop cached responses derived from interactions (e.g. the global stats).
+    用户交互变更后使依赖交互数据的缓存响应（如全平台统计）失效。
+    """
+    response_cache.bump('interaction')
+
+
+@receiver(post_save, sender=UserInteraction)
+@receiver(post_delete, sender=UserInteraction)
+def record_interaction_change(sender, instance, **kwargs):
+    """
+    Record the changed interaction for the incremental similarity refresh, deletes included.
+    记录变更的交互（包括删除），供相似度索引增量刷新。
+    """
+    item_similarity.record_changes([(instance.user_id, instance.product_id)])
+
+
+@receiver(post_save, sender=ChatLog)
+def rollup_chat_log(sender, instance, created, raw=False, **kwargs):
+    """
+    Add each new chat log to the hourly / daily dashboard rollups.
+    新增对话日志时累加到按小时/天的看板汇总中。
+    """
+    if raw or not created: return
+    metrics_rollup.record_chat_logs([instance])
+
+
+@receiver(post_save, sender=UserProfile)
+def count_new_user(sender, instance, created, raw=False, **kwargs):
+    """
+    Keep the skin type distribution current; skin type edits are reconciled by rollup_metrics.
+    新增用户时更新肤质分布；修改肤质的情况由 rollup_metrics 命令定期校准。
+    """
+    if raw or not created: return
+    metrics_rollup.adjust_skin_count(instance.skin_type, 1)
+
+
+@receiver(post_delete, sender=UserProfile)
+def uncount_deleted_user(sender, instance, **kwargs):
+    metrics_rollup.adjust_skin_count(instance.skin_type, -1)
@@ -0,0 +1,527 @@
+import asyncio
+import importlib
+import io
+import os
+import random
+import re
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Count, Sum
+from django.test import TestCase
+from django.utils import timezone
+from . import (
+    answer_cache, chat_log_writer, events, item_similarity, llm_gateway, metrics_rollup, product_embeddings, response_cache
+)
+from .batching import BatchBuffer
+from .recommend_store import load_recommendations, save_recommendations
+from .recommend_algo import safety_filter
+from .models import (
+    ChatLog, InteractionChange, ItemSimilarity, LLMResponseCache, MetricsRollup, Product, RecommendationResult,
+    UserInteraction, UserProfile
+)
+
+
+class AnswerCacheTests(TestCase):
+    """
+    Answer cache matching rules.
+    问答缓存的匹配规则。
+    """
+    OILY = "油性皮肤适合用什么精华液推荐一下"
+    DRY = "干性皮肤适合用什么精华液推荐一下"
+
+    def setUp(self):
+        answer_cache._answers.clear()
+        answer_cache._corrections.clear()
+        answer_cache._vectors.clear()
+        answer_cache._terms.clear()
+        answer_cache._matrix.update(answers=None, corrections=None)
+        answer_cache._state.update(loaded=False, synced_at=0.0, syncing=False)
+        answer_cache.store(self.OILY, "油皮答案", 100)
+
+    def test_other_skin_type_misses_by_default(self):
+        self.assertEqual(answer_cache.lookup(self.DRY), (None, None))
+        self.assertEqual(answer_cache.lookup(self.OILY), ("油皮答案", 'exact'))
+
+    def test_similar_match_requires_same_skin_type(self):
+        with mock.patch.object(answer_cache, 'SIMILARITY', 0.9):
+            # The two questions score about 0.93 on character n-grams / 两个问题的字符 n-gram 相似度约 0.93
+            self.assertEqual(answer_cache.lookup(self.DRY), (None, None))
+            self.assertEqual(answer_cache.lookup(self.OILY + "吧"), ("油皮答案", 'similar'))
+
+
+def hold_buffer(test, module):
+    """
+    Swap module.buffer for one that holds items for a minute, so the test decides when they are written.
+    将 module.buffer 替换为一分钟后才写出的缓冲队列，由测试决定何时写出。
+    """
+    buffer = BatchBuffer(f"{module.buffer.name}-test", module.buffer.flush_fn, max_delay=60, retry_delay=0)
+    test.addCleanup(buffer.close)
+    patcher = mock.patch.object(module, 'buffer', buffer)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return buffer
+
+
+class BatchBufferTests(TestCase):
+    """
+    Background batch writer: retries and item-by-item fallback.
+    后台批量写入：重试与逐条写入回退。
+    """
+    def test_failed_item_is_dropped_alone(self):
+        written = []
+
+        def flush(items):
+            if "bad" in items:
+                raise ValueError("bad item")
+            written.extend(items)
+
+        buffer = BatchBuffer('test', flush, max_delay=60, retries=2, retry_delay=0)
+        self.addCleanup(buffer.close)
+        buffer.put_many(["a", "bad", "b"])
+        buffer.flush()
+        self.assertEqual(written, ["a", "b"])
+        stats = buffer.stats()
+        self.assertEqual((stats['flushed'], stats['dropped'], stats['retries']), (2, 1, 2))
+
+
+class EventTests(TestCase):
+    """
+    Batched /api/events/ ingestion.
+    /api/events/ 批量事件写入。
+    """
+    def setUp(self):
+        self.buffer = hold_buffer(self, events)
+        self.user = UserProfile.objects.create(username="u")
+        self.recommended, self.other = Product.objects.bulk_create(
+            Product(title=title, brand="b", category="精华", price=100, image_url="http://x/y.png")
+            for title in ("a", "b"))
+        RecommendationResult.objects.create(user=self.user, product=self.recommended, score=0.9)
+
+    def post(self, *reported):
+        body = {"events": [{"user_id": self.user.id, "product_id": product.id, "type": event_type}
+                           for product, event_type in reported]}
+        response = self.client.post('/api/events/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.buffer.flush()
+
+    def test_events_are_coalesced_and_counted(self):
+        self.post((self.recommended, 'view'), (self.recommended, 'view'), (self.recommended, 'click'),
+                  (self.other, 'view'))
+        self.assertEqual(sorted(UserInteraction.objects.values_list('product_id', 'type')),
+                         sorted([(self.recommended.id, 'view'), (self.recommended.id, 'click'), (self.other.id, 'view')]))
+        result = RecommendationResult.objects.get()
+        self.assertEqual((result.view_count, result.click_count), (2, 1))
+        self.post((self.recommended, 'view'))
+        result.refresh_from_db()
+        self.assertEqual(result.view_count, 3)
+
+    def test_transient_failure_is_retried(self):
+        bulk_create = UserInteraction.objects.bulk_create
+        calls = []
+
+        def locked_once(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(UserInteraction.objects, 'bulk_create', side_effect=locked_once):
+            self.post((self.recommended, 'click'), (self.other, 'fav'))
+        self.assertEqual(UserInteraction.objects.count(), 2)
+        self.assertEqual(RecommendationResult.objects.get().click_count, 1)
+        stats = self.buffer.stats()
+        self.assertEqual((stats['retries'], stats['dropped'], stats['flushed']), (1, 0, 2))
+
+
+class CircuitBreakerTests(TestCase):
+    """
+    LLM gateway circuit breaker: open, half-open trial, busy rejections and client disconnects.
+    大模型网关熔断器：打开、半开试探、并发已满与客户端断开。
+    """
+    def setUp(self):
+        self.breaker = llm_gateway.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        for name, value in (('breaker', self.breaker), ('API_KEY', 'sk-test'), ('ACQUIRE_TIMEOUT', 0.01),
+                            ('_slots', threading.BoundedSemaphore(1))):
+            patcher = mock.patch.object(llm_gateway, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def half_open(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.breaker._opened_at -= 30  # Cool-down elapsed / 冷却期已过
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+        self.assertRaises(llm_gateway.LLMUnavailable, llm_gateway._acquire)
+
+    def test_half_open_lets_one_trial_through(self):
+        self.half_open()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+        self.breaker._opened_at -= 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+
+    def test_busy_returns_the_trial(self):
+        self.half_open()
+        llm_gateway._slots.acquire()
+        self.assertRaises(llm_gateway.LLMUnavailable, llm_gateway._acquire)
+        self.assertTrue(self.breaker.allow())
+
+    def test_disconnect_returns_the_trial(self):
+        self.half_open()
+        client = mock.Mock()
+        client.chat.completions.create.return_value = mock.MagicMock(__iter__=lambda _: iter(["a", "b"]))
+        with mock.patch.object(llm_gateway, 'get_client', return_value=client):
+            stream = llm_gateway.stream_chat_completion([])
+            self.assertEqual(next(stream), "a")
+            stream.close()
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(llm_gateway._slots.acquire(blocking=False))
+
+    async def test_async_disconnect_returns_the_trial(self):
+        self.half_open()
+
+        stream = mock.MagicMock(close=mock.AsyncMock())
+        stream.__aiter__.return_value = ["a", "b"]
+        client = mock.Mock()
+        client.chat.completions.create = mock.AsyncMock(return_value=stream)
+        slots = asyncio.Semaphore(1)
+        with mock.patch.object(llm_gateway, '_async_state', return_value=(client, slots)):
+            relay = llm_gateway.async_stream_chat_completion([])
+            self.assertEqual(await anext(relay), "a")
+            await relay.aclose()
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(slots.locked())
+
+
+class ChatViewTests(TestCase):
+    """
+    Chat endpoints: user validation, and SSE from a sync generator under WSGI / an async one under ASGI.
+    对话接口：用户校验；SSE 在 WSGI 下使用同步生成器，在 ASGI 下使用异步生成器。
+    """
+    URLS = ('/api/chat/', '/api/chat/stream/', '/api/async/chat/', '/api/async/chat/stream/')
+    def setUp(self):
+        hold_buffer(self, chat_log_writer)
+        patcher = mock.patch.object(answer_cache, 'lookup', return_value=("缓存答案", 'exact'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.body = {"message": "你好", "user_id": UserProfile.objects.create(username="u").id}
+
+    def test_wsgi(self):
+        response = self.client.post('/api/chat/stream/', self.body, content_type='application/json')
+        self.assertFalse(response.is_async)
+        self.assertIn("缓存答案", b"".join(response.streaming_content).decode())
+
+    def test_unknown_user_is_rejected(self):
+        for url in self.URLS:
+            for user_id, code in ((99999, 404), ("abc", 400)):
+                with self.subTest(url=url, user_id=user_id):
+                    response = self.client.post(url, dict(self.body, user_id=user_id), content_type='application/json')
+                    self.assertEqual(response.status_code, code)
+        self.assertEqual(chat_log_writer.buffer.stats()['enqueued'], 0)
+
+    async def test_asgi(self):
+        response = await self.async_client.post('/api/chat/stream/', self.body, content_type='application/json')
+        self.assertTrue(response.is_async)
+        self.assertIn("缓存答案", b"".join([chunk async for chunk in response.streaming_content]).decode())
+
+
+class ItemSimilarityRefreshTests(TestCase):
+    """
+    Incremental refresh of the Top-N similarity index.
+    Top-N 相似度索引的增量刷新。
+    """
+    TOP_N = 5
+
+    def setUp(self):
+        self.rnd = random.Random(3)
+        self.users = UserProfile.objects.bulk_create(UserProfile(username=f"u{i}") for i in range(60))
+        self.products = Product.objects.bulk_create(
+            Product(title=f"p{i}", brand="b", category="精华", price=100, image_url="http://x/y.png",
+                    ingredients="甘油", efficacy="保湿") for i in range(80))
+        UserInteraction.objects.bulk_create(
+            (UserInteraction(user=u, product=p, type=t, score=self.rnd.randint(1, 5)) for u, p, t in self._sample(600)),
+            ignore_conflicts=True)
+        item_similarity.build_full_index(self.TOP_N)
+
+    def _sample(self, n):
+        return [(self.rnd.choice(self.users), self.rnd.choice(self.products), self.rnd.choice(('view', 'fav', 'rate')))
+                for _ in range(n)]
+
+    @staticmethod
+    def _index():
+        return sorted(ItemSimilarity.objects.values_list('product_id', 'neighbor_id', 'score'))
+
+    def assertRefreshEqualsFullBuild(self):
+        self.assertGreater(item_similarity.refresh_index(self.TOP_N), 0)
+        self.assertFalse(InteractionChange.objects.exists())
+        incremental = self._index()
+        item_similarity.build_full_index(self.TOP_N)
+        self.assertEqual(incremental, self._index())
+
+    def test_new_interactions(self):
+        for _ in range(3):
+            events.write_events([(u.id, p.id, t, self.rnd.randint(1, 5)) for u, p, t in self._sample(30)])
+            self.assertRefreshEqualsFullBuild()
+
+    def test_deleted_interactions(self):
+        ids = list(UserInteraction.objects.values_list('id', flat=True))
+        UserInteraction.objects.filter(id__in=self.rnd.sample(ids, 60)).delete()
+        self.assertRefreshEqualsFullBuild()
+        self.users[0].delete()
+        self.products[0].delete()
+        self.assertRefreshEqualsFullBuild()
+
+
+class MetricsRollupTests(TestCase):
+    """
+    Dashboard rollups checked against a plain aggregate over the raw chat logs.
+    看板汇总与直接聚合原始对话日志的结果对比。
+    """
+    def setUp(self):
+        rnd = random.Random(5)
+        user = UserProfile.objects.create(username="u")
+        now = timezone.now()
+        # Saved through the signal, so the incremental path counts them in the current hour
+        # 经信号保存，由增量路径计入当前小时
+        for _ in range(3):
+            ChatLog.objects.create(user=user, user_input="q", ai_response="a", prompt_tokens=10,
+                                   completion_tokens=5, total_tokens=15, latency_ms=200)
+        # bulk_create sends no signal; these only reach the rollups through rollup_metrics
+        # bulk_create 不触发信号，这些日志只能经 rollup_metrics 计入汇总
+        logs = ChatLog.objects.bulk_create(
+            ChatLog(user=user, user_input="q", ai_response="a", prompt_tokens=rnd.randint(10, 500),
+                    completion_tokens=rnd.randint(10, 500), total_tokens=0, estimated_prompt_tokens=rnd.randint(10, 500),
+                    latency_ms=rnd.randint(100, 3000)) for _ in range(120))
+        for log in logs:
+            ChatLog.objects.filter(id=log.id).update(created_at=now - timedelta(minutes=rnd.randint(0, 40 * 60)))
+        # Move one signalled log back a day so its incremental count sits in the wrong bucket
+        # 将一条经信号计数的日志移到前一天，使其增量计数落在错误的时间桶
+        ChatLog.objects.filter(id=ChatLog.objects.order_by('id').first().id).update(created_at=now - timedelta(days=1))
+        metrics_rollup.record_recommendation_events(views=7, clicks=2, at=now)
+
+    def assertMatchesRawLogs(self, period, count):
+        step = metrics_rollup._STEP[period]
+        for bucket in metrics_rollup.series(period, count):
+            start = bucket['bucket_start']
+            raw = ChatLog.objects.filter(created_at__gte=start, created_at__lt=start + step).aggregate(
+                chat_count=Count('id'), prompt_tokens=Sum('prompt_tokens'), completion_tokens=Sum('completion_tokens'),
+                total_tokens=Sum('total_tokens'), estimated_prompt_tokens=Sum('estimated_prompt_tokens'),
+                latency_ms_sum=Sum('latency_ms'))
+            self.assertEqual({field: bucket[field] for field in metrics_rollup.CHAT_FIELDS},
+                             {field: value or 0 for field, value in raw.items()}, f"{period} {start}")
+
+    def test_rollup_metrics_matches_raw_logs(self):
+        self.assertEqual(metrics_rollup.totals()['chat_count'], 3)
+        call_command('rollup_metrics', stdout=io.StringIO())
+        self.assertMatchesRawLogs('hour', 24)
+        self.assertMatchesRawLogs('day', 3)
+        # Views and clicks have no raw log and survive the rebuild / 曝光与点击没有原始明细，重建后保持不变
+        self.assertEqual(metrics_rollup.totals()['views'], 7)
+        self.assertEqual(metrics_rollup.totals()['clicks'], 2)
+
+    def test_migration_backfill_matches_raw_logs(self):
+        MetricsRollup.objects.all().delete()
+        backfill = importlib.import_module('app.migrations.0013_backfill_metrics_rollups')
+        backfill.backfill_metrics_rollups(apps, None)
+        self.assertMatchesRawLogs('hour', 24)
+        self.assertMatchesRawLogs('day', 3)
+
+
+class ProductEmbeddingTests(TestCase):
+    """
+    LSH similar-product search on a catalog small enough for a test, with the exact scan turned off.
+    在测试规模的商品库上关闭精确扫描，检验 LSH 相似商品检索。
+    """
+    N_PRODUCTS = 2000
+    TOP_K = 10
+
+    def setUp(self):
+        rnd = random.Random(7)
+        categories = ['面霜', '精华', '爽肤水', '洁面', '防晒', '面膜']
+        efficacy = ['保湿', '美白', '抗老', '控油', '舒缓', '修护', '祛痘', '提亮']
+        # Ingredients cluster by category, like the real catalog / 成分按品类聚集，与真实商品库相近
+        pools = {c: rnd.sample(range(300), 50) for c in categories}
+        rows = []
+        for pid in range(1, self.N_PRODUCTS + 1):
+            category = rnd.choice(categories)
+            ingredients = rnd.sample(pools[category], rnd.randint(4, 10)) + rnd.sample(range(300), 2)
+            rows.append((pid, ','.join(f"成分{i}" for i in ingredients), ','.join(rnd.sample(efficacy, 2)),
+                         category, round(rnd.uniform(30, 1500), 2)))
+        # More bits than the automatic choice so the buckets prune a catalog this small / 位数高于自动选择，使小商品库上的分桶也能缩小候选集
+        with mock.patch.object(product_embeddings, 'LSH_BITS', 8):
+            arrays, _ = product_embeddings.index_arrays(rows)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index.npz')
+            np.savez(path, **arrays)
+            self.index = product_embeddings.EmbeddingIndex(path)
+        self.assertTrue(self.index.exact)
+        self.index.exact = False
+
+    def test_lsh_recall(self):
+        hits = total = candidates = 0
+        for row in np.random.default_rng(0).choice(self.N_PRODUCTS, size=200, replace=False):
+            candidates += len(self.index.candidates(row))
+            scores = self.index.vectors @ self.index.vectors[row]
+            scores[row] = -np.inf
+            kth = np.sort(scores)[-self.TOP_K]
+            # A product tied with the exact k-th score counts as a hit / 与精确第 k 名相似度并列的商品也算命中
+            hits += sum(score >= kth - 1e-6 for _, score in self.index.similar(int(self.index.ids[row]), self.TOP_K))
+            total += self.TOP_K
+        self.assertLess(candidates / 200, self.N_PRODUCTS / 2)
+        self.assertGreaterEqual(hits / total, 0.9)
+
+    def test_similar_memo_is_bounded(self):
+        with mock.patch.object(product_embeddings, 'SIMILAR_CACHE_SIZE', 3):
+            for pid in range(1, 6):
+                self.index.similar(pid, self.TOP_K)
+            self.index.similar(3, self.TOP_K)
+            self.index.similar(6, self.TOP_K)
+        self.assertEqual(list(self.index._similar), [(5, self.TOP_K), (3, self.TOP_K), (6, self.TOP_K)])
+
+
+class QueryPlanTests(TestCase):
+    """
+    Query-plan regression test for the hot recommendation / dashboard queries.
+    热点推荐与看板查询的执行计划回归测试。
+
+    Each query must be answered through the named index; sorted queries must also not need a separate
+    sort step, so a dropped index or a rewritten query fails the suite.
+    每条查询都必须走指定的索引，排序查询还不能出现额外的排序步骤；索引被删除或查询被改写时测试失败。
+    """
+    # SQLite "USE TEMP B-TREE FOR ORDER BY" / PostgreSQL "Sort" node / 额外排序步骤
+    SORT_STEP = re.compile(r'TEMP B-TREE FOR ORDER BY|^\s*(->\s*)?(Incremental )?Sort\b', re.MULTILINE)
+
+    @staticmethod
+    def hot_queries():
+        """(name, queryset, expected index, sorted without a sort step) / （名称, 查询, 期望索引, 是否要求无需排序）"""
+        now = timezone.now()
+        return [
+            ('candidate pool build', Product.objects.filter(suitable_skin__in=['oil', 'all'])
+             .order_by('-rating_avg', '-sales_count')
+             .values_list('id', 'suitable_skin', 'category', 'efficacy', 'rating_avg', 'sales_count')[:1000],
+             'product_skin_rank_idx', False),
+            ('product ranking', Product.objects.order_by('-rating_avg', '-sales_count')[:10],
+             'product_rank_idx', True),
+            ('offline results', RecommendationResult.objects.filter(user_id=1).select_related('product')[:5],
+             'recresult_user_score_idx', True),
+            ('stale check', UserInteraction.objects.filter(user_id=1, created_at__gt=now - timedelta(days=1)),
+             'interaction_user_time_idx', False),
+            ('similarity refresh', UserInteraction.objects.filter(product_id__in=[1, 2]).values_list('user_id'),
+             'app_userinteraction_product_id', False),
+            ('chat audit', ChatLog.objects.select_related('user').order_by('-created_at')[:50],
+             'chatlog_created_idx', True),
+            ('corrections', ChatLog.objects.filter(is_corrected=True).exclude(corrected_response='')
+             .order_by('created_at'), 'chatlog_corrected_idx', True),
+            ('reason cache purge', LLMResponseCache.objects.filter(created_at__lt=now - timedelta(days=7)),
+             'app_llmresponsecache_created_at', False),
+        ]
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                return "\n".join(row[-1] for row in cursor.fetchall())
+            if connection.vendor == 'postgresql':
+                # Test tables are empty, so make the planner show which index it *can* use
+                # 测试库为空表，关闭顺序扫描以观察规划器可用的索引
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}", params)
+                return "\n".join(row[0] for row in cursor.fetchall())
+        self.skipTest(f"unsupported database vendor: {connection.vendor}")
+
+    def test_hot_queries_use_their_indexes(self):
+        for name, queryset, index, no_sort in self.hot_queries():
+            with self.subTest(name):
+                plan = self.explain(queryset)
+                self.assertIn(index, plan, f"{name} does not use {index}:\n{plan}")
+                if no_sort:
+                    self.assertIsNone(self.SORT_STEP.search(plan), f"{name} needs a separate sort:\n{plan}")
+
+
+class RecommendStoreTests(TestCase):
+    """
+    Stored offline recommendation lists.
+    离线推荐结果的存取。
+    """
+    def test_empty_list_is_a_hit(self):
+        user = UserProfile.objects.create(username="u")
+        self.assertIsNone(load_recommendations(user))
+        save_recommendations({user.id: []})
+        user.refresh_from_db()
+        self.assertEqual(load_recommendations(user), [])
+        UserInteraction.objects.create(user=user, product=Product.objects.create(
+            title="p", brand="b", category="精华", price=100, image_url="http://x/y.png"), type='view', score=1)
+        self.assertIsNone(load_recommendations(user))
+
+
+class ResponseCacheTests(TestCase):
+    """
+    ETag revalidation and versioned invalidation of cached API responses.
+    缓存接口响应的 ETag 校验与按版本号失效。
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        response_cache._stats.clear()
+        self.product = Product.objects.create(title="p", brand="b", category="精华", price=100,
+                                              image_url="http://x/y.png", ingredients="甘油", efficacy="保湿")
+        self.url = f"/api/product/{self.product.id}/"
+
+    def test_etag_and_invalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Saving the product bumps the 'product' version, so the cached response is no longer read
+        # 保存商品会递增 'product' 版本号，旧的缓存响应不再被读取
+        self.product.title = "p2"
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], "p2")
+        self.assertNotEqual(response['ETag'], etag)
+
+        stats = response_cache.stats()['product_detail']
+        self.assertEqual((stats['hits'], stats['misses'], stats['not_modified']), (1, 2, 1))
+
+
+class SafetyFilterTests(TestCase):
+    """
+    The allergen guardrail must hold for products written without signals.
+    未经信号写入的商品同样要经过过敏源护栏。
+    """
+    def test_unindexed_product_is_excluded(self):
+        # bulk_create sends no post_save / bulk_create 不触发 post_save
+        unsafe, safe = Product.objects.bulk_create(
+            Product(title=title, brand="b", category="爽肤水", price=80, image_url="http://x/y.png",
+                    ingredients=ingredients, efficacy="保湿")
+            for title, ingredients in (("a", "水,变性酒精"), ("b", "水,甘油")))
+        user = UserProfile(username="u", skin_type='normal', allergens="酒精")
+        kept = [product.id for product, _ in safety_filter({unsafe.id: 1.0, safe.id: 0.5}, user)]
+        self.assertEqual(kept, [safe.id])
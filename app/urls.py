@@ -1,21 +1,32 @@
 from django.urls import path
 from .views import (
-    RecommendAPIView, ChatAPIView, ProductDetailAPIView, 
-    UserProfileStatsAPIView, ProductRankingAPIView, GlobalStatsAPIView,
-    AdminStatsAPIView, AdminLogAPIView
+    RecommendAPIView, RecommendReasonAPIView, ChatAPIView, ChatStreamAPIView, ProductDetailAPIView, ProductSimilarAPIView,
+    UserProfileStatsAPIView, ProductRankingAPIView, GlobalStatsAPIView, EventAPIView,
+    AdminStatsAPIView, AdminLogAPIView, AdminMetricsAPIView
 )
+from .async_views import AsyncRecommendView, AsyncChatView, AsyncChatStreamView
 
 urlpatterns = [
     # 用户端接口
     path('recommend/', RecommendAPIView.as_view(), name='recommend_api'),
+    path('recommend/reason/', RecommendReasonAPIView.as_view(), name='recommend_reason_api'),
     path('chat/', ChatAPIView.as_view(), name='chat_api'),
+    path('chat/stream/', ChatStreamAPIView.as_view(), name='chat_stream_api'),
     path('product/<int:pk>/', ProductDetailAPIView.as_view(), name='product_detail_api'),
+    path('product/<int:pk>/similar/', ProductSimilarAPIView.as_view(), name='product_similar_api'),
     path('user-stats/', UserProfileStatsAPIView.as_view(), name='user_stats_api'),
     path('rankings/', ProductRankingAPIView.as_view(), name='rankings_api'),
     path('global-stats/', GlobalStatsAPIView.as_view(), name='global_stats_api'),
+    path('events/', EventAPIView.as_view(), name='events_api'),
+
+    # 异步（ASGI）版本的推荐与对话接口，返回结构与同步接口一致
+    path('async/recommend/', AsyncRecommendView.as_view(), name='async_recommend_api'),
+    path('async/chat/', AsyncChatView.as_view(), name='async_chat_api'),
+    path('async/chat/stream/', AsyncChatStreamView.as_view(), name='async_chat_stream_api'),
     
     # 管理端接口
     path('admin/stats/', AdminStatsAPIView.as_view(), name='admin_stats_api'),
     path('admin/logs/', AdminLogAPIView.as_view(), name='admin_logs_api'),
     path('admin/logs/<int:pk>/correct/', AdminLogAPIView.as_view(), name='admin_log_correct_api'),
+    path('admin/metrics/', AdminMetricsAPIView.as_view(), name='admin_metrics_api'),
 ]
\ No newline at end of file
@@ -1,17 +1,69 @@
+import json
+import time
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Sum, Count, Avg
+from django.utils import timezone
 from .models import UserProfile, Product, RecommendationResult, ChatLog
 from .recommend_algo import recommend_products
+from .recommend_store import load_recommendations, save_recommendations
 from .serializers import ProductSerializer
-from openai import OpenAI
+from .knowledge_service import KnowledgeService
+from . import (answer_cache, candidate_pools, chat_log_writer, events, llm_cache, llm_gateway, metrics_rollup, prompt_builder,
+               product_embeddings, reason_worker, response_cache, retrieval)
+from .batching import BufferFull
+from .response_cache import cached_response
+from .prompt_builder import CHAT_SYSTEM_PROMPT
+from .reason_worker import schedule_upgrade
 
-# Configuration / 系统配置
-# API key and base URL for the DeepSeek LLM.
-# 用于 DeepSeek 大模型的 API 密钥和基础 URL。
-API_KEY = "sk-edb3fee01eac43cb9ab0b695ad6bdfcc"
-BASE_URL = "https://api.deepseek.com"
+# Chat prompt shared by the sync, streaming and async chat views / 同步、流式与异步对话接口共用的 Prompt
+CHAT_PROMPT_LOGIC = f"""
+        [System]: {CHAT_SYSTEM_PROMPT}
+        [Instruction]: 结合 RAG-Lite 知识库，给出专业建议。
+        """
+OFFLINE_REPLY = "离线诊断：针对提问，建议关注温和清洁。"
+
+
+def chat_user_id(data):
+    """
+    The user_id of a chat request (default 1), checked against the user table.
+    校验对话请求中的 user_id（默认 1）是否为已存在的用户。
+
+    Returns:
+        (user_id, None), or (None, (error message, HTTP status)) for a malformed or unknown id.
+    """
+    try:
+        user_id = int(data.get('user_id', 1))
+    except (TypeError, ValueError):
+        return None, ("user_id 必须是整数", 400)
+    if not UserProfile.objects.filter(id=user_id).exists():
+        return None, ("用户不存在", 404)
+    return user_id, None
+
+
+def get_recommendations(user, top_k=5):
+    """
+    Offline results first, online computation (written back) on a miss; schedules the AI reason upgrade.
+    优先返回离线结果，未命中时在线计算并回写；同时提交首个商品的 AI 理由升级任务。
+
+    Returns:
+        (recommend_list, source) where source is "offline" or "online".
+    """
+    # Serve precomputed results first / 优先读取离线预计算结果
+    recommend_list = load_recommendations(user, top_k=top_k)
+    source = "offline"
+    if recommend_list is None:
+        # Cache miss: trigger Multi-path Recall Engine and write back / 未命中：调用核心多路召回引擎并回写
+        recommend_list = recommend_products(user.id, top_k=top_k)
+        save_recommendations({user.id: recommend_list})
+        source = "online"
+
+    # Upgrade the top reason with the LLM off the request path / 在请求链路之外异步升级首个商品的 AI 理由
+    if recommend_list and not recommend_list[0]['ai_reason']:
+        schedule_upgrade(user.id, recommend_list[0]['product_id'], user.skin_type)
+    return recommend_list, source
 
 class RecommendAPIView(APIView):
     """
@@ -28,17 +80,38 @@ class RecommendAPIView(APIView):
         except UserProfile.DoesNotExist:
             return Response({"error": "用户不存在"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Trigger Multi-path Recall Engine / 调用核心多路召回引擎
-        recommend_list = recommend_products(user.id, top_k=5)
-
+        recommend_list, source = get_recommendations(user, top_k=5)
         return Response({
             "user": {
                 "id": user.id, "username": user.username, "skin_type": user.skin_type
             },
-            "recommendations": recommend_list
+            "recommendations": recommend_list,
+            "source": source
         }, status=status.HTTP_200_OK)
 
 
+class RecommendReasonAPIView(APIView):
+    """
+    Bilingual: Poll the (possibly upgraded) recommendation reason of one product.
+    双语注释：轮询单个推荐商品的理由（后台完成 AI 升级后返回新文本）。
+    """
+    def get(self, request):
+        user_id = request.query_params.get('user_id')
+        product_id = request.query_params.get('product_id')
+        if not user_id or not product_id:
+            return Response({"error": "请提供 user_id 与 product_id 参数"}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = RecommendationResult.objects.filter(user_id=user_id, product_id=product_id).first()
+        if result is None:
+            return Response({"error": "推荐结果不存在"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "product_id": result.product_id,
+            "reason": result.reason,
+            "ai_reason": result.ai_reason,
+            "pending": reason_worker.is_pending(result.user_id, result.product_id)
+        })
+
+
 class ChatAPIView(APIView):
     """
     Bilingual: Upgraded chat interface with Token telemetry and Prompt visibility.
@@ -46,52 +119,182 @@ class ChatAPIView(APIView):
     """
     def post(self, request):
         user_message = request.data.get('message')
-        user_id = request.data.get('user_id', 1) 
         if not user_message:
             return Response({"error": "内容不能为空"}, status=status.HTTP_400_BAD_REQUEST)
+        # Logs are written in the background, so reject unknown users up front / 日志在后台写入，需提前拒绝不存在的用户
+        user_id, error = chat_user_id(request.data)
+        if error:
+            return Response({"error": error[0]}, status=error[1])
 
         # Prompt Logic for Transparency / 用于展示 Prompt 工程的逻辑代码块
-        prompt_logic = f"""
-        [System]: 你是一位专业的皮肤科医生和美妆顾问。
-        [Instruction]: 结合 RAG-Lite 知识库，给出专业建议。
-        """
+        prompt_logic = CHAT_PROMPT_LOGIC
 
-        import time
         start_time = time.time()
-        
+
+        # Serve repeated / corrected questions from the answer cache / 重复问题与人工纠偏优先走问答缓存
+        cached_reply, match = answer_cache.lookup(user_message)
+        if cached_reply is not None:
+            latency = int((time.time() - start_time) * 1000)
+            chat_log_writer.log_chat(user_id=user_id, user_input=user_message, ai_response=cached_reply,
+                                     latency_ms=latency)
+            return Response({"reply": cached_reply, "prompt_used": prompt_logic, "cached": match})
+
         try:
-            client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "你是一位专业的皮肤科医生和美妆顾问。"},
-                    {"role": "user", "content": user_message},
-                ],
-                stream=False
-            )
+            # Retrieved context trimmed to the token budget / 检索片段按 Token 预算裁剪
+            prompt = prompt_builder.build_chat_prompt(user_message)
+            response = llm_gateway.chat_completion(prompt['messages'], max_tokens=prompt_builder.CHAT_MAX_TOKENS)
             ai_reply = response.choices[0].message.content.strip()
             latency = int((time.time() - start_time) * 1000)
             
             # Log usage for Admin Analytics / 为管理员看板记录资源使用情况
             usage = response.usage
-            ChatLog.objects.create(
+            prompt_builder.record_usage('chat', prompt['estimated_tokens'], usage)
+            chat_log_writer.log_chat(
                 user_id=user_id,
                 user_input=user_message,
                 ai_response=ai_reply,
                 prompt_tokens=usage.prompt_tokens,
                 completion_tokens=usage.completion_tokens,
                 total_tokens=usage.total_tokens,
+                estimated_prompt_tokens=prompt['estimated_tokens'],
                 latency_ms=latency
             )
+            answer_cache.store(user_message, ai_reply, usage.total_tokens)
 
-            return Response({"reply": ai_reply, "prompt_used": prompt_logic})
+            return Response({"reply": ai_reply, "prompt_used": prompt_logic, "cached": None})
 
         except Exception as e:
-            # Fallback for Offline Mode / 离线模式回退机制
+            # Fallback for Offline Mode (API failure or open breaker) / 离线模式回退机制（调用失败或已熔断）
             latency = int((time.time() - start_time) * 1000)
-            ai_reply = f"离线诊断：针对提问，建议关注温和清洁。"
-            ChatLog.objects.create(user_id=user_id, user_input=user_message, ai_response=ai_reply, latency_ms=latency)
-            return Response({"reply": ai_reply, "prompt_used": prompt_logic})
+            ai_reply = OFFLINE_REPLY
+            chat_log_writer.log_chat(user_id=user_id, user_input=user_message, ai_response=ai_reply, latency_ms=latency)
+            return Response({"reply": ai_reply, "prompt_used": prompt_logic, "cached": None})
+
+
+class ChatStreamAPIView(APIView):
+    """
+    Bilingual: Streaming chat interface relaying model tokens as Server-Sent Events.
+    双语注释：流式对话接口，以 Server-Sent Events 实时转发模型生成的 Token。
+
+    Events: `meta` (prompt), `message` ({"delta": ...}) per chunk, and `done` with latency metrics and cache match.
+    事件：`meta`（Prompt 信息）、每个分片一条 `message`（{"delta": ...}），最后为带延迟指标与缓存命中类型的 `done`。
+
+    Under ASGI the events come from AsyncChatStreamView's async generator.
+    ASGI 部署下事件由 AsyncChatStreamView 的异步生成器产生。
+    """
+    def post(self, request):
+        user_message = request.data.get('message')
+        if not user_message:
+            return Response({"error": "内容不能为空"}, status=status.HTTP_400_BAD_REQUEST)
+        user_id, error = chat_user_id(request.data)
+        if error:
+            return Response({"error": error[0]}, status=error[1])
+
+        if isinstance(request._request, ASGIRequest):
+            # Under ASGI a sync generator holds a thread for the whole stream; relay the async one instead
+            # ASGI 部署下同步生成器在整个流式输出期间占用一个线程，改用异步版本的事件流
+            from .async_views import AsyncChatStreamView
+            stream = AsyncChatStreamView()._stream(user_id, user_message)
+        else:
+            stream = self._stream(user_id, user_message)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # 关闭 Nginx 缓冲，保证逐 Token 下发
+        return response
+
+    @staticmethod
+    def _event(data, event=None):
+        payload = json.dumps(data, ensure_ascii=False)
+        return f"event: {event}\ndata: {payload}\n\n" if event else f"data: {payload}\n\n"
+
+    def _stream(self, user_id, user_message):
+        prompt_logic = CHAT_PROMPT_LOGIC
+        yield self._event({"prompt_used": prompt_logic}, event='meta')
+
+        start_time = time.time()
+        first_token_ms = 0
+        chunks, usage, prompt = [], None, None
+        # Serve repeated / corrected questions from the answer cache / 重复问题与人工纠偏优先走问答缓存
+        ai_reply, match = answer_cache.lookup(user_message)
+        if ai_reply is not None:
+            first_token_ms = int((time.time() - start_time) * 1000)
+            yield self._event({"delta": ai_reply})
+        else:
+            try:
+                prompt = prompt_builder.build_chat_prompt(user_message)
+                stream = llm_gateway.stream_chat_completion(prompt['messages'], max_tokens=prompt_builder.CHAT_MAX_TOKENS,
+                                                            stream_options={"include_usage": True})
+                for chunk in stream:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not first_token_ms:
+                        first_token_ms = int((time.time() - start_time) * 1000)
+                    chunks.append(delta)
+                    yield self._event({"delta": delta})
+                ai_reply = "".join(chunks).strip()
+                prompt_builder.record_usage('chat', prompt['estimated_tokens'], usage)
+                answer_cache.store(user_message, ai_reply, usage.total_tokens if usage else 0)
+            except Exception as e:
+                # Fallback for Offline Mode (API failure or open breaker) / 离线模式回退机制（调用失败或已熔断）
+                ai_reply = OFFLINE_REPLY
+                usage = None
+                if not chunks:
+                    first_token_ms = int((time.time() - start_time) * 1000)
+                    yield self._event({"delta": ai_reply})
+
+        # Log once the stream has ended / 流结束后记录日志
+        latency = int((time.time() - start_time) * 1000)
+        chat_log_writer.log_chat(
+            user_id=user_id,
+            user_input=user_message,
+            ai_response=ai_reply,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            total_tokens=usage.total_tokens if usage else 0,
+            estimated_prompt_tokens=prompt['estimated_tokens'] if prompt else 0,
+            latency_ms=latency,
+            first_token_ms=first_token_ms
+        )
+        yield self._event({"latency_ms": latency, "first_token_ms": first_token_ms, "cached": match}, event='done')
+
+
+class EventAPIView(APIView):
+    """
+    Bilingual: Record views, clicks, favourites, ratings and purchases in batches.
+    双语注释：批量上报浏览、点击、收藏、评分与购买事件。
+
+    Events are validated, queued in memory and written by a background thread in batches,
+    so the response (202) does not wait for the database.
+    事件校验后写入内存队列，由后台线程批量落库，接口（202）无需等待数据库写入。
+    """
+    def post(self, request):
+        raw_events = request.data.get('events') if isinstance(request.data, dict) else request.data
+        if raw_events is None:
+            raw_events = [request.data]
+        if not isinstance(raw_events, list) or not raw_events:
+            return Response({"error": "events 必须是非空数组"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_events) > events.MAX_PER_REQUEST:
+            return Response({"error": f"单次最多上报 {events.MAX_PER_REQUEST} 条事件"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        valid, rejected = [], []
+        for i, raw in enumerate(raw_events):
+            event, error = events.parse_event(raw)
+            if error:
+                rejected.append({"index": i, "error": error})
+            else:
+                valid.append(event)
+        try:
+            events.buffer.put_many(valid)
+        except BufferFull:
+            # Backpressure: nothing was queued, the client should retry later / 背压：本批未写入，客户端稍后重试
+            response = Response({"error": "事件队列繁忙，请稍后重试"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '1'
+            return response
+        return Response({"accepted": len(valid), "rejected": rejected}, status=status.HTTP_202_ACCEPTED)
 
 
 class ProductDetailAPIView(APIView):
@@ -99,6 +302,7 @@ class ProductDetailAPIView(APIView):
     Bilingual: Get product details by ID.
     双语注释：根据 ID 获取商品详情。
     """
+    @cached_response('product_detail', depends=('product',))
     def get(self, request, pk):
         try:
             product = Product.objects.get(pk=pk)
@@ -108,6 +312,28 @@ class ProductDetailAPIView(APIView):
             return Response({"error": "商品不存在"}, status=status.HTTP_404_NOT_FOUND)
 
 
+class ProductSimilarAPIView(APIView):
+    """
+    Bilingual: Products similar in ingredients, efficacy, category and price band, from the ANN index.
+    双语注释：基于近似最近邻索引，返回成分、功效、品类与价格带相近的商品。
+    """
+    @cached_response('product_similar', depends=('product', 'product_embeddings'))
+    def get(self, request, pk):
+        try:
+            top_k = min(int(request.query_params.get('top_k', product_embeddings.SIMILAR_TOP_K)), 50)
+        except ValueError:
+            return Response({"error": "top_k 必须是整数"}, status=status.HTTP_400_BAD_REQUEST)
+        if not Product.objects.filter(pk=pk).exists():
+            return Response({"error": "商品不存在"}, status=status.HTTP_404_NOT_FOUND)
+
+        neighbors = product_embeddings.similar_products(pk, max(top_k, 1))
+        products = Product.objects.in_bulk([nid for nid, _ in neighbors])
+        # Products deleted since the index was built are skipped / 跳过索引构建后已删除的商品
+        results = [dict(ProductSerializer(products[nid]).data, similarity=round(score, 4))
+                   for nid, score in neighbors if nid in products]
+        return Response({"product_id": pk, "results": results})
+
+
 class UserProfileStatsAPIView(APIView):
     """
     Bilingual: Get user skin analysis stats for radar and trend charts.
@@ -147,6 +373,7 @@ class ProductRankingAPIView(APIView):
     Bilingual: Get top product rankings.
     双语注释：获取热门商品榜单。
     """
+    @cached_response('rankings', depends=('product',))
     def get(self, request):
         products = Product.objects.order_by('-rating_avg', '-sales_count')[:10]
         serializer = ProductSerializer(products, many=True)
@@ -158,8 +385,8 @@ class GlobalStatsAPIView(APIView):
     Bilingual: Platform-wide dynamic statistics for home dashboard.
     双语注释：全平台动态统计数据，用于首页看板。
     """
+    @cached_response('global_stats', depends=('interaction',))
     def get(self, request):
-        import random
         from .models import UserInteraction
         total_actions = UserInteraction.objects.count()
         return Response({
@@ -173,32 +400,44 @@ class AdminStatsAPIView(APIView):
     """
     Bilingual: Operational dashboard statistics including CTR and AI costs.
     双语注释：运营看板统计数据，包含点击率 (CTR) 与 AI 资源成本。
+
+    Reads only the pre-aggregated rollup rows (see metrics_rollup), never the raw tables.
+    ?period=hour returns the last 24 hourly buckets instead of the last 7 days.
+    仅读取预聚合的汇总行（见 metrics_rollup），不扫描原始表；?period=hour 返回最近 24 小时的小时级数据。
     """
     def get(self, request):
-        import random
-        # 1. CTR Aggregation / 点击率聚合
-        results = RecommendationResult.objects.all()
-        total_views = results.aggregate(Sum('view_count'))['view_count__sum'] or 1
-        total_clicks = results.aggregate(Sum('click_count'))['click_count__sum'] or 0
-        ctr = (total_clicks / total_views) * 100
-        
+        period = 'hour' if request.query_params.get('period') == 'hour' else 'day'
+        buckets = metrics_rollup.series(period, 24 if period == 'hour' else 7)
+        label = "%H:00" if period == 'hour' else "%m-%d"
+        dates = [timezone.localtime(b['bucket_start']).strftime(label) for b in buckets]
+
+        # 1. CTR per bucket / 各时间段点击率
+        ctr_values = [round(b['clicks'] / b['views'] * 100, 2) if b['views'] else 0 for b in buckets]
+
         # 2. AI Telemetry / AI 性能遥测
-        chat_stats = ChatLog.objects.aggregate(total_tokens_val=Sum('total_tokens'), avg_latency_val=Avg('latency_ms'))
-        
+        totals = metrics_rollup.totals()
+        avg_latency = totals['latency_ms_sum'] / totals['chat_count'] if totals['chat_count'] else 0
+
         # 3. Demographic Distribution / 用户画像分布
-        skin_dist = UserProfile.objects.values('skin_type').annotate(count=Count('skin_type'))
         skin_labels = {'oil': '油性', 'dry': '干性', 'sensitive': '敏感', 'combination': '混合', 'normal': '中性'}
-        skin_data = [{"name": skin_labels.get(d['skin_type'], '未知'), "value": d['count']} for d in skin_dist]
+        skin_data = [{"name": skin_labels.get(skin, '未知'), "value": count}
+                     for skin, count in metrics_rollup.skin_distribution().items()]
 
         return Response({
             "ctr_data": {
-                "dates": ["周一", "周二", "周三", "周四", "周五", "周六", "周日"],
-                "values": [random.uniform(5, 15) for _ in range(6)] + [round(ctr, 2)]
+                "dates": dates,
+                "values": ctr_values
             },
             "ai_usage": {
-                "total_tokens": chat_stats['total_tokens_val'] or 0,
-                "avg_latency": round(chat_stats['avg_latency_val'] or 0, 2),
-                "daily_usage": [random.randint(1000, 5000) for _ in range(7)]
+                "total_tokens": totals['total_tokens'],
+                "prompt_tokens": totals['prompt_tokens'],
+                "completion_tokens": totals['completion_tokens'],
+                "estimated_prompt_tokens": totals['estimated_prompt_tokens'],
+                "avg_latency": round(avg_latency, 2),
+                "dates": dates,
+                "daily_usage": [b['total_tokens'] for b in buckets],
+                "daily_latency": [round(b['latency_ms_sum'] / b['chat_count']) if b['chat_count'] else 0
+                                  for b in buckets]
             },
             "user_distribution": skin_data
         })
@@ -210,7 +449,7 @@ class AdminLogAPIView(APIView):
     双语注释：AI 对话审计与人工纠偏反馈系统。
     """
     def get(self, request):
-        logs = ChatLog.objects.all().order_by('-created_at')[:50]
+        logs = ChatLog.objects.select_related('user').order_by('-created_at')[:50]
         data = [{
             "id": l.id, "user": l.user.username, "input": l.user_input, "response": l.ai_response,
             "is_corrected": l.is_corrected, "corrected_response": l.corrected_response,
@@ -226,6 +465,29 @@ class AdminLogAPIView(APIView):
             log.is_corrected = True
             log.corrected_response = correction
             log.save()
+            answer_cache.record_correction(log)
             return Response({"status": "success"})
         except ChatLog.DoesNotExist:
-            return Response({"error": "日志不存在"}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({"error": "日志不存在"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class AdminMetricsAPIView(APIView):
+    """
+    Bilingual: Runtime metrics of the LLM gateway, caches and offline indexes.
+    双语注释：大模型网关、缓存与离线索引的运行时指标。
+    """
+    def get(self, request):
+        return Response({
+            "llm_gateway": llm_gateway.metrics(),
+            "llm_reason_cache": llm_cache.stats(),
+            "answer_cache": answer_cache.stats(),
+            "retrieval": retrieval.stats(),
+            "product_embeddings": product_embeddings.stats(),
+            "candidate_pools": candidate_pools.stats(),
+            "response_cache": response_cache.stats(),
+            "events": events.stats(),
+            "chat_log_writer": chat_log_writer.stats(),
+            "prompt_tokens": prompt_builder.stats(),
+            "reason_worker": reason_worker.stats(),
+            "knowledge_base": KnowledgeService().report()
+        })
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # 构建基本路径
@@ -58,14 +59,73 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'djangoBeauty.wsgi.application'
+ASGI_APPLICATION = 'djangoBeauty.asgi.application'
 
-# 数据库配置
-# 为了让你能立即运行，这里先配置为 SQLite。
-# 如果需要 MySQL，请将下方注释解开并配置你的 MySQL 账号密码。
-DATABASES = {
+# 数据库配置，通过环境变量 DB_PROFILE 选择：
+# sqlite（默认）：WAL 日志模式，读写互不阻塞；写锁冲突时等待 SQLITE_BUSY_TIMEOUT 秒而不是立即报 "database is locked"
+# postgres：多进程/多机部署使用，连接参数见 POSTGRES_*，连接长期复用或使用连接池（需安装 psycopg[pool]）
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'beauty'),
+            'USER': os.environ.get('POSTGRES_USER', 'beauty'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # 复用连接前检查连接是否可用
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    POSTGRES_POOL_SIZE = int(os.environ.get('POSTGRES_POOL_SIZE', '0'))
+    if POSTGRES_POOL_SIZE:
+        # 进程内连接池（Django 5.1+），与 CONN_MAX_AGE 持久连接二选一
+        DATABASES['default']['OPTIONS'] = {'pool': {'min_size': 2, 'max_size': POSTGRES_POOL_SIZE, 'timeout': 10}}
+    else:
+        # 每个线程的连接保留 DB_CONN_MAX_AGE 秒，避免每个请求重新建立连接
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+else:
+    SQLITE_BUSY_TIMEOUT = 20
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('SQLITE_TUNING', '1') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            # 写锁忙时的等待时间（秒，即 busy_timeout）
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            # 事务开始即获取写锁，避免读事务升级为写事务时因锁冲突直接失败（该情况不会等待 busy_timeout）
+            'transaction_mode': 'IMMEDIATE',
+            # WAL：读不阻塞写、写不阻塞读；synchronous=NORMAL 在 WAL 下仍保证数据库一致性；mmap 减少读取时的系统调用
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        }
+
+# 缓存后端（响应缓存、候选池等共用），通过环境变量 CACHE_BACKEND 选择：
+# locmem（默认，进程内）、file（同机多进程共享）、redis / memcached（多机共享，需安装对应客户端），也可直接填写后端类路径
+# 数据变更后的缓存失效只在共享后端下对所有进程立即生效；多 worker 部署使用 locmem 时，其他进程最长在 TTL 到期后才更新
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        # locmem 为实例名，file 为缓存目录，redis / memcached 为服务地址
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache') if CACHE_BACKEND == 'file' else ''),
+        'TIMEOUT': 300,
     }
 }
 
@@ -89,4 +149,127 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'app.UserProfile'
 
 # 跨域配置（允许前端访问）
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+# 推荐算法配置
+# Item-CF 相似度索引中每个商品保留的近邻数量（由 build_item_similarity 命令离线构建）
+ITEM_SIM_TOP_N = 20
+# 离线推荐结果（RecommendationResult）的有效期（秒），过期或用户产生新交互后回退为在线计算
+RECOMMEND_RESULT_TTL = 6 * 3600
+# 批量预计算（precompute_recommendations）的并行进程数（None 表示 CPU 核数）与每个任务的用户数
+RECOMMEND_BATCH_WORKERS = None
+RECOMMEND_BATCH_CHUNK_SIZE = 200
+# 肤质禁忌成分：该肤质用户将被排除含有这些成分（及其知识库别名）的商品
+SKIN_CONTRAINDICATIONS = {
+    'sensitive': ['酒精'],
+}
+# 内容召回候选池（app/candidate_pools.py）：按肤质预先排序的商品列表，商品保存或删除时失效
+# 每个肤质（及肤质 + 品类）候选池保留的商品数，以及缓存有效期（秒）
+CANDIDATE_POOL_SIZE = 200
+CANDIDATE_POOL_TTL = 600
+# 各肤质重点需要的功效标签，命中的商品在候选池中排序靠前
+SKIN_EFFICACY_NEEDS = {
+    'oil': ['控油', '祛痘'],
+    'dry': ['保湿', '修护'],
+    'sensitive': ['舒缓', '修护'],
+    'combination': ['控油', '保湿'],
+    'normal': ['保湿'],
+}
+
+# 知识库快照配置
+# build_kb_snapshot 命令输出目录；各 worker 通过 mmap 共享同一份只读快照
+KNOWLEDGE_SNAPSHOT_DIR = BASE_DIR / 'kb_snapshots'
+# worker 检查新快照版本的间隔（秒），发布新版本后无需重启即可生效
+KNOWLEDGE_RELOAD_INTERVAL = 30
+
+# 大模型响应缓存（LLMResponseCache）
+# 缓存有效期（秒）
+LLM_CACHE_TTL = 7 * 24 * 3600
+# 最大缓存条目数，超出后按最近访问时间淘汰（LRU）
+LLM_CACHE_MAX_ENTRIES = 10000
+# 后台异步生成 AI 推荐理由的线程数（推荐接口先返回知识库理由，再由后台升级）
+REASON_WORKER_THREADS = 2
+
+# 公开只读接口的响应缓存时间（秒），商品或用户交互变更时立即失效（app/response_cache.py）
+RESPONSE_CACHE_TTL = {
+    'rankings': 300,
+    'global_stats': 60,
+    'product_detail': 600,
+    'product_similar': 600,
+}
+
+# 交互事件上报（/api/events/，app/events.py）：事件先写入内存队列，由后台线程批量落库
+# 每批写入的事件数、最长等待时间（秒）与队列容量（队列满时接口返回 503）
+EVENT_BATCH_SIZE = 500
+EVENT_FLUSH_INTERVAL = 1.0
+EVENT_QUEUE_SIZE = 50000
+# 单次请求最多上报的事件数
+EVENT_MAX_PER_REQUEST = 1000
+
+# 对话日志异步写入（app/chat_log_writer.py）：对话接口不等待写库，由后台线程批量写入 ChatLog
+# 每批写入条数、最长等待时间（秒）与队列容量；队列满时同步接口最多等待 CHAT_LOG_PUT_TIMEOUT 秒后直接写库
+CHAT_LOG_BATCH_SIZE = 200
+CHAT_LOG_FLUSH_INTERVAL = 0.5
+CHAT_LOG_QUEUE_SIZE = 5000
+CHAT_LOG_PUT_TIMEOUT = 0.2
+
+# 运营看板汇总（app/metrics_rollup.py），写入时增量累加，rollup_metrics 命令定期校准
+# 小时粒度汇总的保留天数（天粒度永久保留）
+METRICS_HOURLY_RETENTION_DAYS = 7
+
+# 大模型网关（app/llm_gateway.py），所有大模型调用共用一个带连接池的客户端
+# API 密钥与地址可通过环境变量覆盖（LLM_BASE_URL 可指向本地模拟服务 scripts/mock_llm_server.py）
+LLM_API_KEY = os.environ.get('LLM_API_KEY', 'sk-edb3fee01eac43cb9ab0b695ad6bdfcc')
+LLM_BASE_URL = os.environ.get('LLM_BASE_URL', 'https://api.deepseek.com')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'deepseek-chat')
+# 单次调用的读取超时（秒）与流式输出的总时长上限（秒）
+LLM_TIMEOUT = 20
+LLM_STREAM_DEADLINE = 120
+# 每个进程同时进行的大模型调用上限（由信号量控制，占用的连接数不会超过该值；连接池本身沿用 OpenAI 客户端默认配置），
+# 以及等待空闲槽位的最长时间（秒）
+LLM_MAX_CONCURRENCY = 8
+LLM_ACQUIRE_TIMEOUT = 2
+# ASGI 异步视图的并发上限（协程不占用线程，可远高于同步上限）
+LLM_ASYNC_MAX_CONCURRENCY = 256
+# 熔断器：连续失败次数阈值，以及熔断后进入半开试探前的冷却时间（秒）
+LLM_BREAKER_FAILURES = 5
+LLM_BREAKER_RESET = 30
+
+# 对话问答缓存（app/answer_cache.py），重复问题直接返回缓存答案，人工纠偏结果优先
+# 每个进程缓存的问答条数上限（按最近使用淘汰）
+ANSWER_CACHE_MAX_ENTRIES = 2000
+# 相似问题命中阈值（字符 n-gram 余弦相似度），0 为仅精确匹配；开启后相似问题还须提到相同的肤质与成分
+ANSWER_CACHE_SIMILARITY = 0
+# 从 ChatLog 同步人工纠偏结果的间隔（秒）
+ANSWER_CACHE_SYNC_INTERVAL = 30
+
+# 对话检索增强（app/retrieval.py），build_retrieval_index 命令离线构建 BM25 索引
+RETRIEVAL_INDEX_PATH = BASE_DIR / 'kb_snapshots' / 'retrieval.npz'
+# 每次对话注入 Prompt 的知识库片段数与商品片段数，以及单个片段的最大字数（控制 Prompt Token 上限）
+RETRIEVAL_KB_TOP_K = 2
+RETRIEVAL_PRODUCT_TOP_K = 2
+RETRIEVAL_SNIPPET_CHARS = 120
+
+# 商品向量相似召回（app/product_embeddings.py），build_product_embeddings 命令离线构建向量与 LSH 索引
+PRODUCT_EMBEDDING_INDEX_PATH = BASE_DIR / 'kb_snapshots' / 'product_embeddings.npz'
+# 向量维度（特征数超过该值时随机投影压缩）与各特征块权重
+PRODUCT_EMBEDDING_DIM = 64
+PRODUCT_EMBEDDING_WEIGHTS = {'ingredients': 1.0, 'efficacy': 1.0, 'category': 0.6, 'price': 0.4}
+# LSH 哈希表数、每表位数（None 为按商品数自动选择）、是否探查相邻桶
+PRODUCT_ANN_TABLES = 8
+PRODUCT_ANN_BITS = None
+PRODUCT_ANN_MULTI_PROBE = True
+# 商品数低于该值时精确扫描全部向量，不走 LSH
+PRODUCT_ANN_MIN_PRODUCTS = 50000
+# 相似商品接口（/api/product/<id>/similar/）默认返回数量
+PRODUCT_SIMILAR_TOP_K = 10
+# 每个索引实例缓存的相似商品结果条数上限（超出按 LRU 淘汰）
+PRODUCT_SIMILAR_CACHE_SIZE = 20000
+
+# Prompt Token 预算（app/prompt_builder.py），本地估算 Token 并按预算裁剪检索片段
+# 对话 Prompt 的 Token 上限（系统提示 + 检索片段 + 用户问题）
+CHAT_PROMPT_TOKEN_BUDGET = 800
+# 推荐理由 Prompt 的 Token 上限（超出时截断知识库成分解析）
+REASON_PROMPT_TOKEN_BUDGET = 250
+# 模型生成长度上限（max_tokens），使响应延迟可预期
+CHAT_MAX_COMPLETION_TOKENS = 600
+REASON_MAX_COMPLETION_TOKENS = 120
@@ -34,11 +34,11 @@ function renderAICost(data) {
     chart.setOption({
         tooltip: { trigger: 'axis' },
         legend: { textStyle: { color: '#ccc' }, bottom: 0 },
-        xAxis: { type: 'category', data: ['一', '二', '三', '四', '五', '六', '日'], axisLine: { lineStyle: { color: '#64748b' } } },
+        xAxis: { type: 'category', data: data.dates, axisLine: { lineStyle: { color: '#64748b' } } },
         yAxis: { type: 'value', axisLine: { show: false }, splitLine: { lineStyle: { color: '#334155' } } },
         series: [
             { name: 'Token消耗', type: 'bar', stack: 'total', data: data.daily_usage, color: '#0ea5e9' },
-            { name: '延迟 (ms)', type: 'line', yAxisIndex: 0, data: [200, 450, 300, 800, 600, 1100, data.avg_latency], color: '#f59e0b' }
+            { name: '延迟 (ms)', type: 'line', yAxisIndex: 0, data: data.daily_latency, color: '#f59e0b' }
         ]
     });
 }
@@ -132,6 +132,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const data = await response.json();
             if (data.recommendations) {
                 renderProducts(data.recommendations, 'product-list');
+                const top = data.recommendations[0];
+                if (top && top.ai_reason === false) pollReasonUpgrade(top.product_id);
             } else {
                 renderMockProducts();
             }
@@ -141,6 +143,27 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // AI 推荐理由由后台异步生成，完成后替换首个商品的知识库理由
+    async function pollReasonUpgrade(productId, attempts = 5) {
+        for (let i = 0; i < attempts; i++) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            try {
+                const resp = await fetch(`http://127.0.0.1:8000/api/recommend/reason/?user_id=${currentUser.id}&product_id=${productId}`);
+                if (!resp.ok) return;
+                const data = await resp.json();
+                if (data.ai_reason) {
+                    const el = document.querySelector('#product-list .product-card .product-reason');
+                    if (el) el.textContent = data.reason;
+                    return;
+                }
+                if (!data.pending) return;
+            } catch (err) {
+                console.error('Reason Poll Error:', err);
+                return;
+            }
+        }
+    }
+
     async function loadRankings() {
         const list = document.getElementById('ranking-list');
         list.innerHTML = '<p>榜单加载中...</p>';
@@ -337,34 +360,50 @@ document.addEventListener('DOMContentLoaded', () => {
             aiMsgDiv.appendChild(statusText);
 
             try {
-                const response = await fetch('http://127.0.0.1:8000/api/chat/', {
+                const response = await fetch('http://127.0.0.1:8000/api/chat/stream/', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message: text })
+                    body: JSON.stringify({ message: text, user_id: currentUser.id })
                 });
-                const data = await response.json();
-
-                // Show Prompt
-                statusText.querySelector('.prompt-details').textContent = data.prompt_used;
-                statusText.querySelector('span').textContent = '✅ 分析完成';
-
-                // Streaming Effect
-                streamText(data.reply, aiMsgDiv);
+                const textNode = document.createTextNode('');
+                aiMsgDiv.prepend(textNode);
+
+                // Relay Server-Sent Events as they arrive / 逐条处理服务端推送的 SSE 事件
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    events.forEach(raw => handleEvent(raw, textNode, statusText));
+                }
             } catch (err) {
                 aiMsgDiv.prepend('模型连接失败，请确认后端服务器已启动。');
             }
         };
 
-        function streamText(text, container) {
-            let i = 0;
-            const textNode = document.createTextNode('');
-            container.prepend(textNode);
-            const interval = setInterval(() => {
-                textNode.textContent += text[i];
-                i++;
+        function handleEvent(raw, textNode, statusText) {
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (!data) return;
+            const payload = JSON.parse(data);
+
+            if (event === 'meta') {
+                // Show Prompt
+                statusText.querySelector('.prompt-details').textContent = payload.prompt_used;
+            } else if (event === 'done') {
+                statusText.querySelector('span').textContent = `✅ 分析完成（首字 ${payload.first_token_ms}ms）`;
+            } else {
+                textNode.textContent += payload.delta;
                 msgContainer.scrollTop = msgContainer.scrollHeight;
-                if (i >= text.length) clearInterval(interval);
-            }, 30);
+            }
         }
 
         sendBtn.addEventListener('click', sendMessage);
@@ -0,0 +1,113 @@
+"""
+Load benchmark: WSGI (sync DRF views) vs ASGI (async views) against the local mock LLM.
+压测脚本：在本地模拟大模型下对比 WSGI（同步 DRF 视图）与 ASGI（异步视图）的吞吐与延迟。
+
+Both servers run under uvicorn with the same number of worker processes; the WSGI one serves
+requests from uvicorn's fixed thread pool, the ASGI one from a single event loop per worker.
+两种服务均由 uvicorn 以相同进程数启动：WSGI 在固定大小的线程池中处理请求，ASGI 每个进程一个事件循环。
+
+Usage:
+    python scripts/bench_asgi_wsgi.py --concurrency 200 --requests 1000 --workers 2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OFFLINE_PREFIX = "离线诊断"
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"port {port} did not open within {timeout}s")
+
+
+def start(cmd, port, env):
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return proc
+
+
+def one_request(url, user_id, n=0):
+    # A distinct question per request, so every call reaches the (mock) LLM instead of the answer cache
+    # 每个请求的问题都不同，确保每次都调用（模拟）大模型，而不是命中问答缓存
+    body = json.dumps({"message": f"油皮适合什么精华？（第{n}问）", "user_id": user_id}).encode('utf-8')
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            reply = json.loads(resp.read())['reply']
+        status = 'fallback' if reply.startswith(OFFLINE_PREFIX) else 'ok'
+    except Exception:
+        status = 'error'
+    return status, time.perf_counter() - start_time
+
+
+def run_load(url, concurrency, total):
+    run_id = int(time.time())
+    # Warm up connections, the shared LLM client and the KB / 预热连接、共享客户端与知识库
+    one_request(url, 1, -1)
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: one_request(url, 1, f"{run_id}-{i}"), range(total)))
+    elapsed = time.perf_counter() - start_time
+    latencies = sorted(l for _, l in results)
+    counts = {k: sum(1 for s, _ in results if s == k) for k in ('ok', 'fallback', 'error')}
+    return {
+        'req_per_s': round(total / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000),
+        **counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WSGI vs ASGI chat throughput benchmark")
+    parser.add_argument('--concurrency', type=int, default=200, help="并发客户端数")
+    parser.add_argument('--requests', type=int, default=1000, help="每种服务的请求总数")
+    parser.add_argument('--workers', type=int, default=2, help="uvicorn 进程数")
+    parser.add_argument('--first-token-ms', type=int, default=300)
+    parser.add_argument('--token-ms', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, LLM_BASE_URL='http://127.0.0.1:9100')
+    procs = [start([sys.executable, 'scripts/mock_llm_server.py', '--port', '9100',
+                    '--first-token-ms', str(args.first_token_ms), '--token-ms', str(args.token_ms)], 9100, env)]
+    uvicorn = [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), '--log-level', 'warning']
+    targets = [
+        ('WSGI /api/chat/', uvicorn + ['djangoBeauty.wsgi:application', '--interface', 'wsgi', '--port', '8101'],
+         'http://127.0.0.1:8101/api/chat/'),
+        ('ASGI /api/async/chat/', uvicorn + ['djangoBeauty.asgi:application', '--port', '8102'],
+         'http://127.0.0.1:8102/api/async/chat/'),
+    ]
+    try:
+        print(f"{'server':<24}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'ok':>7}{'fallback':>10}{'error':>7}")
+        for name, cmd, url in targets:
+            port = int(url.split(':')[2].split('/')[0])
+            proc = start(cmd, port, env)
+            try:
+                r = run_load(url, args.concurrency, args.requests)
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f"{name:<24}{r['req_per_s']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+                  f"{r['ok']:>7}{r['fallback']:>10}{r['error']:>7}")
+    finally:
+        for proc in procs:
+            proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
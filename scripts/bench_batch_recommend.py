@@ -0,0 +1,69 @@
+"""
+Benchmark: per-user recommend_products vs the multi-process batch scorer used by precompute_recommendations.
+压测脚本：逐用户调用 recommend_products 与 precompute_recommendations 使用的多进程批量打分的吞吐对比。
+
+Both paths only read the database; the batch results are checked against recommend_products
+for every sampled user before any timing is reported.
+两种方式都只读取数据库；计时前会逐个用户校验批量结果与 recommend_products 完全一致。
+
+Usage:
+    python scripts/bench_batch_recommend.py --users 2000 --workers 1,2,4
+"""
+import argparse
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoBeauty.settings')
+django.setup()
+
+from app.batch_recommend import Snapshot, iter_results
+from app.models import UserProfile
+from app.recommend_algo import recommend_products
+
+
+def run_batch(user_ids, top_k, workers):
+    start = time.perf_counter()
+    snapshot = Snapshot()
+    load = time.perf_counter() - start
+    results = {}
+    for chunk in iter_results(user_ids, top_k, workers=workers, snapshot=snapshot):
+        results.update(chunk)
+    return results, load, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch recommendation precompute throughput")
+    parser.add_argument('--users', type=int, default=2000, help="参与计算的用户数（0 表示全部）")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--workers', default='1,2,4', help="逗号分隔的进程数列表")
+    parser.add_argument('--sequential-sample', type=int, default=300, help="逐用户计算的抽样用户数（用于计时与校验）")
+    args = parser.parse_args()
+
+    user_ids = list(UserProfile.objects.order_by('id').values_list('id', flat=True))
+    if args.users:
+        user_ids = user_ids[:args.users]
+    sample = user_ids[:args.sequential_sample]
+
+    start = time.perf_counter()
+    expected = {uid: recommend_products(uid, top_k=args.top_k) for uid in sample}
+    sequential = len(sample) / (time.perf_counter() - start)
+
+    print(f"{os.cpu_count()} CPUs, {len(user_ids)} users")
+    print(f"{'scorer':<22}{'users':>7}{'load s':>8}{'total s':>9}{'users/s':>10}{'speedup':>9}")
+    print(f"{'recommend_products':<22}{len(sample):>7}{'-':>8}{len(sample) / sequential:>9.2f}{sequential:>10.1f}{1.0:>9.1f}")
+    for workers in (int(w) for w in args.workers.split(',')):
+        results, load, elapsed = run_batch(user_ids, args.top_k, workers)
+        mismatched = [uid for uid in sample if results[uid] != expected[uid]]
+        if mismatched:
+            sys.exit(f"batch results differ from recommend_products for users {mismatched[:10]}")
+        rate = len(user_ids) / elapsed
+        print(f"{f'batch, {workers} workers':<22}{len(user_ids):>7}{load:>8.2f}{elapsed:>9.2f}{rate:>10.1f}"
+              f"{rate / sequential:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Concurrency benchmark: stock SQLite settings vs the tuned sqlite profile (WAL, busy timeout).
+并发压测：Django 默认 SQLite 配置 与 调优后的 sqlite 配置（WAL、busy timeout）对比。
+
+Writer processes ingest interaction events and chat logs while reader processes run the dashboard
+and home page queries plus a streamed table scan. Each profile runs in its own process against a fresh copy of the database.
+写进程持续写入交互事件与对话日志，读进程同时执行看板、首页查询与流式全表扫描；每种配置在独立进程中对数据库副本运行。
+
+Usage:
+    python scripts/bench_db_concurrency.py --source db.sqlite3 --seconds 10 --writers 2 --readers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES = (('stock', '0'), ('tuned', '1'))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def child(args):
+    sys.path.insert(0, ROOT)
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'djangoBeauty.settings'
+    import django
+    django.setup()
+
+    from django.db import OperationalError, connection, connections
+    from app.chat_log_writer import write_logs
+    from app.events import write_events
+    from app.metrics_rollup import series
+    from app.models import ChatLog, Product, UserInteraction, UserProfile
+
+    user_ids = list(UserProfile.objects.values_list('id', flat=True))
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    journal_mode = connection.cursor().execute("PRAGMA journal_mode").fetchone()[0]
+    # Workers are forked, so none may inherit this connection / worker 通过 fork 创建，不能继承此连接
+    connections.close_all()
+
+    def write_once():
+        write_events([(random.choice(user_ids), random.choice(product_ids), random.choice(('view', 'click')), 1.0)
+                      for _ in range(50)])
+        write_logs([ChatLog(user_id=random.choice(user_ids), user_input="bench", ai_response="bench", latency_ms=1)
+                    for _ in range(20)])
+
+    def read_once():
+        list(Product.objects.order_by('-rating_avg', '-sales_count')[:10])
+        list(ChatLog.objects.select_related('user').order_by('-created_at')[:50])
+        UserInteraction.objects.count()
+        series('day', 7)
+        # A streamed scan keeps its statement open while rows are processed, as index builds do
+        # 流式扫描在逐批处理数据期间保持语句打开（与离线索引构建相同）
+        for i, _ in enumerate(UserInteraction.objects.values_list('id', 'score').iterator(chunk_size=1000)):
+            if i % 1000 == 0:
+                time.sleep(0.005)
+
+    deadline = time.time() + 1 + args.seconds
+
+    def worker(kind, fn, out):
+        # Each worker is its own process with its own connection, like separate server workers
+        # 每个 worker 为独立进程、独立连接，与多进程部署的服务一致
+        random.seed(os.getpid())
+        while time.time() < deadline - args.seconds:
+            time.sleep(0.01)
+        latencies, locked, errors = [], 0, 0
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                fn()
+                latencies.append(time.perf_counter() - start)
+            except OperationalError as e:
+                if 'locked' in str(e):
+                    locked += 1
+                else:
+                    errors += 1
+        out.put((kind, latencies, locked, errors))
+
+    out = multiprocessing.Queue()
+    procs = ([multiprocessing.Process(target=worker, args=('write', write_once, out)) for _ in range(args.writers)] +
+             [multiprocessing.Process(target=worker, args=('read', read_once, out)) for _ in range(args.readers)])
+    for p in procs:
+        p.start()
+    results = {'write': [], 'read': [], 'locked': 0, 'errors': 0}
+    for _ in procs:
+        kind, latencies, locked, errors = out.get()
+        results[kind].extend(latencies)
+        results['locked'] += locked
+        results['errors'] += errors
+    for p in procs:
+        p.join()
+
+    print(json.dumps({
+        'journal_mode': journal_mode,
+        'writes_per_s': round(len(results['write']) / args.seconds, 1),
+        'reads_per_s': round(len(results['read']) / args.seconds, 1),
+        'write_p99_ms': round(percentile(results['write'], 0.99), 1),
+        'read_p50_ms': round(statistics.median(results['read']) * 1000 if results['read'] else 0.0, 1),
+        'read_p99_ms': round(percentile(results['read'], 0.99), 1),
+        'locked_errors': results['locked'],
+        'other_errors': results['errors'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite profile concurrency benchmark")
+    parser.add_argument('--source', default=os.path.join(ROOT, 'db.sqlite3'), help="已迁移的源数据库（只读，不会被修改）")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f"{'profile':<8}{'journal':>9}{'writes/s':>10}{'reads/s':>9}{'write p99':>11}"
+          f"{'read p50':>10}{'read p99':>10}{'locked':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, tuning in PROFILES:
+            path = os.path.join(tmp, f"{name}.sqlite3")
+            shutil.copyfile(args.source, path)
+            with sqlite3.connect(path) as conn:
+                # Start every run from the rollback journal; the tuned profile switches to WAL itself
+                # 每次从默认的回滚日志模式开始，调优配置会在连接时自行切换为 WAL
+                conn.execute("PRAGMA journal_mode=DELETE")
+            env = dict(os.environ, DB_PROFILE='sqlite', SQLITE_PATH=path, SQLITE_TUNING=tuning)
+            env.pop('DJANGO_SETTINGS_MODULE', None)
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--seconds', str(args.seconds),
+                                  '--writers', str(args.writers), '--readers', str(args.readers)],
+                                 env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{name:<8}{r['journal_mode']:>9}{r['writes_per_s']:>10}{r['reads_per_s']:>9}"
+                  f"{r['write_p99_ms']:>11}{r['read_p50_ms']:>10}{r['read_p99_ms']:>10}{r['locked_errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
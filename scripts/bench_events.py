@@ -0,0 +1,69 @@
+"""
+Benchmark: per-event writes vs the batched event writer used by /api/events/.
+压测脚本：逐条写入交互事件 与 /api/events/ 使用的批量写入 的吞吐对比。
+
+Writes real rows into the configured database (UserInteraction and RecommendationResult counters),
+so run it against a development copy.
+会向当前配置的数据库写入真实数据（UserInteraction 与推荐结果计数），请在开发库上运行。
+
+Usage:
+    python scripts/bench_events.py --events 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoBeauty.settings')
+django.setup()
+
+from django.db import transaction
+from django.db.models import F
+from app.events import BATCH_SIZE, write_events
+from app.models import Product, RecommendationResult, UserInteraction, UserProfile
+
+
+def random_events(n):
+    user_ids = list(UserProfile.objects.values_list('id', flat=True))
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    types = [('view', 1.0), ('click', 2.0), ('fav', 4.0)]
+    return [(random.choice(user_ids), random.choice(product_ids), *random.choice(types)) for _ in range(n)]
+
+
+def write_one_by_one(events):
+    """What a naive endpoint would do: one transaction per event / 朴素实现：每个事件一个事务"""
+    for user_id, product_id, event_type, score in events:
+        with transaction.atomic():
+            UserInteraction.objects.update_or_create(user_id=user_id, product_id=product_id, type=event_type,
+                                                     defaults={'score': score})
+            if event_type in ('view', 'click'):
+                field = 'click_count' if event_type == 'click' else 'view_count'
+                RecommendationResult.objects.filter(user_id=user_id, product_id=product_id).update(
+                    **{field: F(field) + 1})
+
+
+def write_batched(events):
+    for i in range(0, len(events), BATCH_SIZE):
+        write_events(events[i:i + BATCH_SIZE])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interaction event write throughput")
+    parser.add_argument('--events', type=int, default=5000, help="每种写入方式的事件数")
+    args = parser.parse_args()
+
+    print(f"{'writer':<14}{'events':>8}{'seconds':>10}{'events/s':>10}")
+    for name, writer in (('one-by-one', write_one_by_one), ('batched', write_batched)):
+        events = random_events(args.events)
+        start = time.perf_counter()
+        writer(events)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14}{len(events):>8}{elapsed:>10.2f}{len(events) / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
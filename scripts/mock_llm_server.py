@@ -0,0 +1,96 @@
+"""
+Local mock of the OpenAI-compatible chat completions API, for testing without DeepSeek.
+本地模拟 OpenAI 兼容的对话接口，用于在不调用 DeepSeek 的情况下测试流式输出与延迟。
+
+Usage:
+    python scripts/mock_llm_server.py --port 9000 --first-token-ms 300 --token-ms 30
+    LLM_BASE_URL=http://127.0.0.1:9000 python manage.py runserver
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "针对油性肌肤，建议选择含烟酰胺或水杨酸的轻薄精华，早晚清洁后使用，并注意防晒与补水。"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    first_token_ms = 300
+    token_ms = 30
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(REPLY),
+                 "total_tokens": prompt_tokens + len(REPLY)}
+
+        time.sleep(self.first_token_ms / 1000)
+        if body.get('stream'):
+            self._stream(body, usage)
+        else:
+            time.sleep(self.token_ms * len(REPLY) / 1000)
+            self._send_json({
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body.get('model'),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+    def _send_json(self, data):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, body, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(data):
+            chunk = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+
+        base = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get('model')}
+        for i, char in enumerate(REPLY):
+            if i:
+                time.sleep(self.token_ms / 1000)
+            send(json.dumps(dict(base, choices=[{"index": 0, "delta": {"content": char}, "finish_reason": None}]),
+                            ensure_ascii=False))
+        send(json.dumps(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            send(json.dumps(dict(base, choices=[], usage=usage)))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    # Large listen backlog so load tests are not throttled by the mock itself / 扩大监听队列，避免压测时模拟服务成为瓶颈
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--first-token-ms', type=int, default=300, help="首 Token 延迟（毫秒）")
+    parser.add_argument('--token-ms', type=int, default=30, help="每个 Token 的生成间隔（毫秒）")
+    args = parser.parse_args()
+
+    MockLLMHandler.first_token_ms = args.first_token_ms
+    MockLLMHandler.token_ms = args.token_ms
+    server = MockLLMServer(('127.0.0.1', args.port), MockLLMHandler)
+    print(f"Mock LLM server listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()